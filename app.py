@@ -1,44 +1,180 @@
+import gc
+import sys
+import threading
+import time
 from flask import Flask
 from flask_cors import CORS
-import firebase_admin
-from firebase_admin import credentials, storage, firestore
-
-try:
-    cred = credentials.Certificate("serviceAccountKey.json")
-    firebase_admin.initialize_app(cred, {
-        'storageBucket': 'inguide-se953499.firebasestorage.app'
-    })
-    print("Firebase Admin SDK initialized successfully!")
-except Exception as e:
-    print(f"Error initializing Firebase Admin SDK: {e}")
-
-db = firestore.client()
-bucket = storage.bucket()
-
-app = Flask(__name__)
-CORS(app)
-
-# Blueprints
-from blueprints.model import model_bp
-from blueprints.beacon import beacons_bp
-from blueprints.floors import floors_bp
-from blueprints.POIs import POIs_bp
-from blueprints.building import building_bp
-from blueprints.paths import paths_bp
-from blueprints.image import image_bp
-from blueprints.nav_graph import nav_graph_bp
-
-app.register_blueprint(model_bp, url_prefix='/model')
-app.register_blueprint(beacons_bp, url_prefix='/beacon')
-app.register_blueprint(floors_bp, url_prefix='/buildings')
-app.register_blueprint(POIs_bp, url_prefix='/POIs')
-app.register_blueprint(building_bp, url_prefix='/buildings')
-app.register_blueprint(paths_bp, url_prefix='/paths')
-app.register_blueprint(image_bp, url_prefix='/uploadImage')
-app.register_blueprint(nav_graph_bp, url_prefix='/navigations')
+from lazy_client import LazyClient
+from snapshot_cache import create_snapshot_cache
+from responses import FastJSONProvider, compress_response
+
+SERVICE_ACCOUNT_KEY = "serviceAccountKey.json"
+STORAGE_BUCKET = 'inguide-se953499.firebasestorage.app'
+
+_firebase_lock = threading.Lock()
+_firebase_initialized = False
+
+
+def init_firebase():
+    """
+    Initializes the Firebase Admin SDK once. Only reads the credentials; no connection is made
+    until a client is used, so it is safe to call before forking workers.
+    """
+    global _firebase_initialized
+    with _firebase_lock:
+        if _firebase_initialized:
+            return
+        import firebase_admin
+        from firebase_admin import credentials
+        try:
+            cred = credentials.Certificate(SERVICE_ACCOUNT_KEY)
+            firebase_admin.initialize_app(cred, {
+                'storageBucket': STORAGE_BUCKET
+            })
+            print("Firebase Admin SDK initialized successfully!")
+        except Exception as e:
+            print(f"Error initializing Firebase Admin SDK: {e}")
+        _firebase_initialized = True
+
+
+def create_firestore_client():
+    init_firebase()
+    from firebase_admin import firestore
+    return firestore.client()
+
+
+def create_storage_bucket():
+    init_firebase()
+    from firebase_admin import storage
+    return storage.bucket()
+
+
+# created on first use in each process; blueprints import these proxies and use them as the clients
+db = LazyClient(create_firestore_client, 'Firestore client')
+bucket = LazyClient(create_storage_bucket, 'storage bucket')
+
+# read-through cache of per-building snapshots, invalidated by the write handlers
+cache = create_snapshot_cache()
+
+
+# which blueprints each kind of server runs; see gunicorn.conf.py
+POOLS = ('all', 'api', 'model')
+
+
+def create_app(pool='all'):
+    """
+    The application with the blueprints of ``pool``: 'all', 'api' (everything, for the I/O-bound
+    Firestore endpoints) or 'model' (only /model, for a server dedicated to inference).
+    """
+    if pool not in POOLS:
+        raise ValueError(f"pool must be one of {', '.join(POOLS)}, not {pool!r}")
+
+    flask_app = Flask(__name__)
+    flask_app.json = FastJSONProvider(flask_app)
+    flask_app.after_request(compress_response)
+    CORS(flask_app)
+
+    # Blueprints
+    from blueprints.model import model_bp
+    flask_app.register_blueprint(model_bp, url_prefix='/model')
+    if pool == 'model':
+        return flask_app
+
+    from blueprints.beacon import beacons_bp
+    from blueprints.floors import floors_bp
+    from blueprints.POIs import POIs_bp
+    from blueprints.building import building_bp
+    from blueprints.paths import paths_bp
+    from blueprints.image import image_bp
+    from blueprints.nav_graph import nav_graph_bp
+    from blueprints.cache import cache_bp
+    from blueprints.spatial import spatial_bp
+    from blueprints.position import position_bp
+    from blueprints.jobs import jobs_bp
+    from blueprints.sync import sync_bp
+    from blueprints.gps_logs import gps_logs_bp
+
+    flask_app.register_blueprint(beacons_bp, url_prefix='/beacon')
+    flask_app.register_blueprint(floors_bp, url_prefix='/buildings')
+    flask_app.register_blueprint(POIs_bp, url_prefix='/POIs')
+    flask_app.register_blueprint(building_bp, url_prefix='/buildings')
+    flask_app.register_blueprint(paths_bp, url_prefix='/paths')
+    flask_app.register_blueprint(image_bp, url_prefix='/uploadImage')
+    flask_app.register_blueprint(nav_graph_bp, url_prefix='/navigations')
+    flask_app.register_blueprint(cache_bp, url_prefix='/cache')
+    flask_app.register_blueprint(spatial_bp, url_prefix='/spatial')
+    flask_app.register_blueprint(position_bp, url_prefix='/position')
+    flask_app.register_blueprint(jobs_bp, url_prefix='/jobs')
+    flask_app.register_blueprint(sync_bp, url_prefix='/sync')
+    flask_app.register_blueprint(gps_logs_bp, url_prefix='/gps_logs')
+    return flask_app
+
+
+_app = None
+_app_lock = threading.Lock()
+
+
+def get_app(pool='all'):
+    """
+    The process's application, created on first call with the blueprints of ``pool``.
+    """
+    global _app
+    with _app_lock:
+        if _app is None:
+            _app = create_app(pool)
+        return _app
+
+
+def preload(pool='all', models=None):
+    """
+    The start-up work that is safe to share with forked workers, done once (e.g. in a gunicorn
+    master with preload_app): every module imported, the app built, Firebase credentials read
+    and, unless this is an 'api' server, the routed model versions unpickled. The Firestore and
+    Storage clients are left for each worker to create on first use.
+    """
+    flask_app = get_app(pool)
+    init_firebase()
+    if models is None:
+        models = pool != 'api'
+    if models:
+        from blueprints.model import registry
+        registry.preload()
+    # keep the collector from touching the preloaded objects, so their pages stay shared after fork
+    gc.freeze()
+    return flask_app
+
+
+def shutdown(timeout=30.0):
+    """
+    Called as a worker exits (gunicorn's worker_exit hook): queued gps log readings are written
+    out, or spilled to disk for the next worker to replay, and running background jobs get until
+    ``timeout`` to finish.
+    """
+    deadline = time.monotonic() + timeout
+    # only modules the worker actually imported have anything to flush
+    beacon = sys.modules.get('blueprints.beacon')
+    if beacon is not None:
+        beacon.gps_log_writer.stop(max(deadline - time.monotonic(), 0))
+
+    cascade_delete = sys.modules.get('cascade_delete')
+    if cascade_delete is not None:
+        running = cascade_delete.running_jobs()
+        while running and time.monotonic() < deadline:
+            time.sleep(0.1)
+            running = cascade_delete.running_jobs()
+        if running:
+            print(f"Exiting with {len(running)} background job(s) unfinished: {', '.join(j.id for j in running)}")
+
+
+def __getattr__(name):
+    # `app.app` (and gunicorn's "app:app") builds the application on first access
+    if name == 'app':
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 if __name__ == '__main__':
-    app.run(
+    get_app().run(
         host='0.0.0.0',
         port=8080,
         ssl_context=('localhost+4.pem', 'localhost+4-key.pem'),
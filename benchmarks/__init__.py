@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+
+SENSOR_COLUMNS = ['acc_x', 'acc_y', 'acc_z', 'acc_gx', 'acc_gy', 'acc_gz',
+                  'gyro_x', 'gyro_y', 'gyro_z', 'gps_lat', 'gps_lon']
+
+
+def random_sensor_window(num_points, seed=0):
+    """
+    Builds a random sensor window shaped like the /model/predictMovement payload.
+
+    Args:
+        num_points (int): The number of samples in the window.
+        seed (int): Seed for the random generator.
+
+    Returns:
+        pd.DataFrame: One row per sample with the columns in SENSOR_COLUMNS.
+    """
+    rng = np.random.default_rng(seed)
+    window = pd.DataFrame({
+        'acc_x': rng.normal(0.0, 1.0, num_points),
+        'acc_y': rng.normal(0.0, 1.0, num_points),
+        'acc_z': rng.normal(0.0, 1.0, num_points),
+        'acc_gx': rng.normal(0.0, 1.0, num_points),
+        'acc_gy': rng.normal(0.0, 1.0, num_points),
+        'acc_gz': rng.normal(9.8, 0.5, num_points),
+        'gyro_x': rng.uniform(0.0, 360.0, num_points),
+        'gyro_y': rng.uniform(-180.0, 180.0, num_points),
+        'gyro_z': rng.uniform(-90.0, 90.0, num_points),
+        'gps_lat': 18.7953 + np.cumsum(rng.normal(0.0, 1e-6, num_points)),
+        'gps_lon': 98.9526 + np.cumsum(rng.normal(0.0, 1e-6, num_points)),
+    })
+    return window[SENSOR_COLUMNS]
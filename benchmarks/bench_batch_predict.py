@@ -0,0 +1,36 @@
+import json
+import time
+
+from flask import Flask
+
+from benchmarks import random_sensor_window
+from blueprints.model import model_bp
+
+
+def build_client():
+    app = Flask(__name__)
+    app.register_blueprint(model_bp, url_prefix='/model')
+    return app.test_client()
+
+
+if __name__ == "__main__":
+    client = build_client()
+    window_size = 10
+
+    for n_windows in (1, 10, 100, 500):
+        windows = [random_sensor_window(window_size, seed=i).to_dict('records') for i in range(n_windows)]
+        single_bodies = [json.dumps({"interval": 500, "data": w}) for w in windows]
+        batch_body = json.dumps({"interval": 500, "windows": windows})
+
+        start = time.perf_counter()
+        singles = [client.post('/model/predictMovement', data=body, content_type='application/json').get_json()
+                   for body in single_bodies]
+        single_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch = client.post('/model/predictMovementBatch', data=batch_body, content_type='application/json').get_json()
+        batch_time = time.perf_counter() - start
+
+        assert [p['prediction'] for p in singles] == [p['prediction'] for p in batch['predictions']]
+        print(f"windows={n_windows:4d}  single {n_windows / single_time:9.1f} win/s  "
+              f"batch {n_windows / batch_time:9.1f} win/s  speedup {single_time / batch_time:6.1f}x")
@@ -0,0 +1,55 @@
+import time
+
+from benchmarks import fake_firestore
+
+LATENCY = 0.01  # seconds per Firestore round trip
+
+db, bucket = fake_firestore.install(LATENCY)
+
+import app  # noqa: E402  (imported after the fake is installed)
+
+client = app.app.test_client()
+
+
+def poi(i):
+    return {"id": f"poi{i}", "name": f"POI {i}", "location": [18.79 + i * 1e-6, 98.95]}
+
+
+def beacon(i):
+    return {"beaconId": f"beacon{i}", "name": f"Beacon {i}", "latLng": [18.79 + i * 1e-6, 98.95]}
+
+
+def single_item(count):
+    start = time.perf_counter()
+    for i in range(count):
+        client.post('/POIs/bench/f1', json=poi(i))
+    for i in range(count):
+        client.patch(f'/POIs/bench/f1/poi{i}', json={"location": [18.8, 98.9]})
+    for i in range(count):
+        client.post('/beacon/bench/f1', json=beacon(i))
+    return time.perf_counter() - start
+
+
+def bulk(count):
+    start = time.perf_counter()
+    responses = [
+        client.post('/POIs/bench/f2/bulk', json={"create": [poi(i) for i in range(count)]}),
+        client.post('/POIs/bench/f2/bulk',
+                    json={"update": [{"id": f"poi{i}", "location": [18.8, 98.9]} for i in range(count)]}),
+        client.post('/beacon/bench/f2/bulk', json={"create": [beacon(i) for i in range(count)]}),
+    ]
+    elapsed = time.perf_counter() - start
+    assert all(r.status_code == 200 for r in responses), [r.json for r in responses]
+    return elapsed
+
+
+if __name__ == "__main__":
+    print(f"simulated round trip: {LATENCY * 1e3:.0f} ms; each run creates and updates N POIs and creates N beacons")
+    for count in (100, 1000, 5000):
+        # the single-item path is linear in round trips, time a sample and scale it
+        sample = min(count, 100)
+        single = single_item(sample) * count / sample
+        batched = bulk(count)
+        items = 3 * count
+        print(f"N={count:5d}  single-item {single:7.2f} s ({items / single:7.0f} items/s)  "
+              f"bulk {batched:6.2f} s ({items / batched:7.0f} items/s)  {single / batched:5.1f}x")
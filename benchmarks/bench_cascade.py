@@ -0,0 +1,60 @@
+import time
+
+from benchmarks import fake_firestore
+
+LATENCY = 0.01  # seconds per Firestore round trip
+
+db, bucket = fake_firestore.install(LATENCY)
+
+import app  # noqa: E402  (imported after the fake is installed)
+
+client = app.app.test_client()
+
+
+def seed_building(building_id, n_floors, pois=200, beacons=50, nodes=500):
+    db.latency = 0
+    building_ref = db.collection('buildings').document(building_id)
+    building_ref.set({'name': building_id})
+    for f in range(n_floors):
+        floor_ref = building_ref.collection('floors').document(f'f{f}')
+        floor_ref.set({'floor': f + 1})
+        for i in range(pois):
+            image = f'pois/{building_id}-{f}-{i}.jpg'
+            bucket.blob(image).upload_from_string(b'jpg')
+            floor_ref.collection('POIs').document(f'p{i}').set(
+                {'name': f'POI {i}', 'images': [f'https://storage.googleapis.com/fake/{image}']})
+        for i in range(beacons):
+            floor_ref.collection('beacons').document(f'{building_id}-b{f}-{i}').set({'name': f'Beacon {i}'})
+            db.collection('beacon_index').document(f'{building_id}-b{f}-{i}').set(
+                {'buildingId': building_id, 'floorId': f'f{f}'})
+        for i in range(nodes):
+            floor_ref.collection('path_nodes').document(f'n{i}').set({'adjacencyList': []})
+    db.latency = LATENCY
+    return sum(1 for path in db.docs if path.startswith(f'buildings/{building_id}'))
+
+
+def wait_for(job_id):
+    while True:
+        status = client.get(f'/jobs/{job_id}').json
+        if status['status'] in ('done', 'failed'):
+            return status
+        time.sleep(0.05)
+
+
+if __name__ == "__main__":
+    print(f"simulated round trip: {LATENCY * 1e3:.0f} ms")
+    for n_floors in (5, 20, 50):
+        building_id = f'bench{n_floors}'
+        documents = seed_building(building_id, n_floors)
+        # the previous floor delete issued one delete() round trip per document
+        sequential = documents * 2 * LATENCY
+
+        start = time.perf_counter()
+        job = client.delete(f'/buildings/{building_id}').json
+        status = wait_for(job['jobId'])
+        elapsed = time.perf_counter() - start
+
+        left = sum(1 for path in db.docs if path.startswith(f'buildings/{building_id}'))
+        assert status['status'] == 'done' and left == 0, status
+        print(f"floors={n_floors:3d}  documents={documents:6d}  images={status['imagesDeleted']:6d}  "
+              f"one-by-one ~{sequential:7.1f} s  cascade job {elapsed:6.2f} s")
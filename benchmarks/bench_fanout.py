@@ -0,0 +1,57 @@
+import time
+
+from benchmarks import fake_firestore
+
+LATENCY = 0.01  # seconds per Firestore round trip
+
+db, bucket = fake_firestore.install(LATENCY)
+
+import app  # noqa: E402,F401  (imported after the fake is installed, and before the blueprints)
+from blueprints.POIs import load_building_POIs  # noqa: E402
+from blueprints.beacon import load_building_beacons  # noqa: E402
+
+
+def seed_building(building_id, n_floors, per_floor=20):
+    db.latency = 0
+    for f in range(n_floors):
+        floor_ref = db.collection('buildings').document(building_id).collection('floors').document(f'f{f}')
+        floor_ref.set({'floor': f + 1})
+        for i in range(per_floor):
+            floor_ref.collection('POIs').document(f'p{f}_{i}').set({'name': f'POI {i}', 'recommended': i % 5 == 0})
+            floor_ref.collection('beacons').document(f'b{f}_{i}').set({'name': f'Beacon {i}'})
+    db.latency = LATENCY
+
+
+def load_building_POIs_sequential(building_id):
+    """
+    The previous one-floor-after-another version, kept as the baseline.
+    """
+    POIs = []
+    for floor_doc in db.collection('buildings').document(building_id).collection('floors').stream():
+        for poi_doc in floor_doc.reference.collection('POIs').stream():
+            poi_data = poi_doc.to_dict()
+            poi_data['id'] = poi_doc.id
+            poi_data['floor'] = floor_doc.get('floor')
+            POIs.append(poi_data)
+    return POIs
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    print(f"simulated round trip: {LATENCY * 1e3:.0f} ms")
+    for n_floors in (1, 5, 10, 25, 50):
+        building_id = f'bench-{n_floors}'
+        seed_building(building_id, n_floors)
+
+        expected, sequential = timed(load_building_POIs_sequential, building_id)
+        actual, concurrent = timed(load_building_POIs, building_id)
+        _, beacons = timed(load_building_beacons, building_id)
+        assert actual == expected, "concurrent fetch changed the result"
+
+        print(f"floors={n_floors:3d}  sequential POIs {sequential * 1e3:7.1f} ms  "
+              f"concurrent POIs {concurrent * 1e3:7.1f} ms  concurrent beacons {beacons * 1e3:7.1f} ms")
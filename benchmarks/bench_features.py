@@ -0,0 +1,47 @@
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import random_sensor_window
+from preprocess import FEATURES, compute_frequency_domain, preprocess, rotate_accelerometer_to_world_frame, \
+    window_to_array
+
+
+def preprocess_pandas(data, data_interval=500):
+    """
+    The original per-Series feature computation, kept here as the parity and speed reference.
+    """
+    rotated_df = rotate_accelerometer_to_world_frame(data)
+
+    row = []
+    for axis in ('x', 'y', 'z'):
+        acc = rotated_df[f'acc_{axis}']
+        row += [acc.mean(), acc.median(), acc.std(), acc.min(), acc.max(), acc.abs().mean()]
+    row += [rotated_df['acc_gx'].mean(), rotated_df['acc_gy'].mean(), rotated_df['acc_gz'].mean()]
+
+    gyro_z = data['gyro_z']
+    row += [gyro_z.mean(), gyro_z.std(), gyro_z.max(), gyro_z.min()]
+
+    row += [rotated_df['mean_magnitude'].mean(), np.sum(np.abs([row[0], row[6], row[12]]))]
+    for axis in ('x', 'y', 'z'):
+        row += list(compute_frequency_domain(rotated_df[f'acc_{axis}'], data_interval))
+
+    lats = list(data['gps_lat'])
+    lons = list(data['gps_lon'])
+    row += [lats[0] - lats[-1], lons[0] - lons[-1]]
+
+    result_df = pd.DataFrame(columns=FEATURES)
+    return pd.concat([result_df, pd.DataFrame([row], columns=FEATURES)], ignore_index=True).astype(float)
+
+
+if __name__ == "__main__":
+    for n in (10, 100, 1000):
+        window = random_sensor_window(n)
+        records = window.to_dict('records')
+        # parity with preprocess_pandas is checked in tests/test_parity.py
+
+        repeats = max(5, 2000 // n)
+        old = min(timeit.repeat(lambda: preprocess_pandas(pd.DataFrame(records)), number=1, repeat=repeats))
+        new = min(timeit.repeat(lambda: preprocess(window_to_array(records)), number=1, repeat=repeats))
+        print(f"n={n:5d}  pandas {old * 1e3:8.3f} ms  numpy {new * 1e3:8.3f} ms  speedup {old / new:6.1f}x")
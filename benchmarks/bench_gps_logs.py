@@ -0,0 +1,104 @@
+import time
+
+import numpy as np
+
+from benchmarks import fake_firestore
+
+LATENCY = 0.01  # seconds per Firestore round trip
+
+db, bucket = fake_firestore.install(0)
+
+import app  # noqa: E402  (imported after the fake is installed)
+from gps_log_store import GPS_LOG_BUCKETS, LEGACY_GPS_LOGS, bucket_writes, to_datetime  # noqa: E402
+
+client = app.app.test_client()
+
+SENSORS = 10
+DAYS = 2
+PERIOD = 10  # seconds between a sensor's readings
+END = int(time.time()) // 86400 * 86400
+START = END - DAYS * 86400
+
+
+def readings(sensor):
+    rng = np.random.default_rng(sensor)
+    t = np.arange(START, END, PERIOD) + rng.uniform(0, 1, (END - START) // PERIOD)
+    lat = 18.79 + np.cumsum(rng.normal(0, 1e-5, len(t)))
+    lon = 98.95 + np.cumsum(rng.normal(0, 1e-5, len(t)))
+    return [{"id": f"s{sensor}r{i}", "sensor_id": f"sensor{sensor}", "timestamp": float(t[i]),
+             "latitude": float(lat[i]), "longitude": float(lon[i])} for i in range(len(t))]
+
+
+def seed():
+    for sensor in range(SENSORS):
+        records = readings(sensor)
+        for lo in range(0, len(records), 500):
+            batch = db.batch()
+            chunk = records[lo:lo + 500]
+            # the buckets as the batched writer stores them
+            for _, ref, data in bucket_writes(db, chunk):
+                batch.set(ref, data, merge=True)
+            batch.commit()
+            # and one document per reading, as /beaconLog used to
+            batch = db.batch()
+            for r in chunk:
+                batch.set(db.collection(LEGACY_GPS_LOGS).document(r['id']), {
+                    'sensor_id': r['sensor_id'], 'latitude': r['latitude'], 'longitude': r['longitude'],
+                    'timestamp': to_datetime(r['timestamp'])})
+            batch.commit()
+
+
+def measure(fn):
+    reads, rpcs = db.stats.reads, db.stats.rpcs
+    start = time.perf_counter()
+    result = fn()
+    return result, db.stats.reads - reads, db.stats.rpcs - rpcs, time.perf_counter() - start
+
+
+def flat_query(sensor_id, start, end):
+    query = db.collection(LEGACY_GPS_LOGS).where('timestamp', '>=', to_datetime(start)) \
+        .where('timestamp', '<', to_datetime(end))
+    if sensor_id:
+        query = query.where('sensor_id', '==', sensor_id)
+    return list(query.stream())
+
+
+def report(label, flat, bucketed):
+    print(f"{label:<34} flat {flat[1]:7d} reads {flat[3] * 1e3:7.0f} ms   "
+          f"buckets {bucketed[1]:5d} reads {bucketed[3] * 1e3:6.0f} ms   ({flat[1] / max(bucketed[1], 1):.0f}x fewer)")
+
+
+if __name__ == "__main__":
+    seed()
+    print(f"{SENSORS} sensors, one reading per {PERIOD} s for {DAYS} days: "
+          f"{len(db.docs.under(LEGACY_GPS_LOGS + '/'))} flat documents, {len(db.docs.under(GPS_LOG_BUCKETS + '/'))} buckets")
+    db.latency = LATENCY
+
+    day = (END - 86400, END)
+    flat = measure(lambda: flat_query('sensor3', *day))
+    bucketed = measure(lambda: client.get(f'/gps_logs/sensor3/track?start={day[0]}&end={day[1]}').get_json())
+    assert len(bucketed[0]['points']) == len(flat[0])
+    report("one sensor's track, 1 day", flat, bucketed)
+
+    flat = measure(lambda: flat_query('sensor3', START, END))
+    bucketed = measure(lambda: client.get(f'/gps_logs/sensor3/rollup?start={START}&end={END}&interval=hour').get_json())
+    assert sum(r['count'] for r in bucketed[0]['rollups']) == len(flat[0])
+    report(f"hourly rollup, {DAYS} days", flat, bucketed)
+
+    hour = (END - 3600, END)
+    flat = measure(lambda: flat_query(None, *hour))
+    bucketed = measure(lambda: client.get(f'/gps_logs/rollup?start={hour[0]}&end={hour[1]}').get_json())
+    assert sum(s['count'] for s in bucketed[0]['sensors'].values()) == len(flat[0])
+    report("all sensors' rollup, last hour", flat, bucketed)
+
+    # downsample everything older than a day (the legacy copies are dropped first, they hold the same readings)
+    db.latency = 0
+    for path in list(db.docs.under(LEGACY_GPS_LOGS + '/')):
+        db.docs.pop(path)
+    job_id = client.post('/gps_logs/compact', json={'rawDays': 1, 'retentionDays': 365}).get_json()['jobId']
+    while (status := client.get(f'/jobs/{job_id}').get_json())['status'] not in ('done', 'failed'):
+        time.sleep(0.05)
+    print(f"compaction, raw for 1 day: {status['bucketsCompacted']} buckets, "
+          f"{status['pointsBefore']} points -> {status['pointsAfter']} ({status['status']})")
+    old_day = client.get(f'/gps_logs/sensor3/rollup?start={START}&end={START + 86400}&interval=day').get_json()
+    print(f"  rollup of the compacted day still counts {old_day['rollups'][0]['count']} readings")
@@ -0,0 +1,77 @@
+import json
+import time
+
+from google.cloud.firestore import GeoPoint
+
+from benchmarks import fake_firestore
+from benchmarks.bench_routing import synthetic_building
+
+LATENCY = 0.01  # seconds per Firestore round trip
+FIRESTORE_DOC_LIMIT = 1024 * 1024
+
+db, bucket = fake_firestore.install(LATENCY)
+
+import app  # noqa: E402  (imported after the fake is installed)
+from graph_store import decode_graph, encode_graph  # noqa: E402
+
+client = app.app.test_client()
+
+
+def timed(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def seed_legacy(building_id, graph):
+    db.latency = 0
+    floor_ref = db.collection('buildings').document(building_id).collection('floors').document('f1')
+    floor_ref.set({'floor': 1, 'graph': graph})
+    for node in graph["nodes"]:
+        floor_ref.collection('path_nodes').document(node["id"]).set({
+            'coordinates': GeoPoint(*node["coordinates"]),
+            'adjacencyList': graph["adjacencyList"][node["id"]],
+            'portalGroup': node.get("portalGroup")
+        })
+    db.latency = LATENCY
+
+
+def get(url):
+    app.cache.invalidate(url.split('/')[2])  # measure the Firestore read, not the snapshot cache
+    response = client.get(url)
+    assert response.status_code == 200, response.json
+    return response
+
+
+if __name__ == "__main__":
+    print(f"simulated round trip: {LATENCY * 1e3:.0f} ms")
+    for num_nodes in (2500, 10000, 25000):
+        graph = synthetic_building(num_nodes, num_floors=1, seed=0)[0]["graph"]
+        building_id = f'bench{num_nodes}'
+        seed_legacy(building_id, graph)
+
+        as_json = json.dumps(graph).encode()
+        encoded, encode_time = timed(lambda: encode_graph(graph))
+        _, json_parse = timed(lambda: json.loads(as_json))
+        _, decode_time = timed(lambda: decode_graph(encoded))
+        over = " (over the 1 MiB document limit)" if len(as_json) > FIRESTORE_DOC_LIMIT else ""
+        print(f"nodes={len(graph['nodes']):6d}  graph field {len(as_json) / 1024:7.0f} KiB{over}  "
+              f"store {len(encoded) / 1024:6.0f} KiB ({len(as_json) / len(encoded):4.1f}x smaller)  "
+              f"encode {encode_time * 1e3:5.1f} ms  decode {decode_time * 1e3:5.1f} ms "
+              f"(json.loads {json_parse * 1e3:5.1f} ms)")
+
+        _, legacy_path = timed(lambda: get(f'/paths/{building_id}/f1'), 3)
+        _, legacy_nav = timed(lambda: get(f'/navigations/{building_id}/f1'), 3)
+        floors_before = len(get(f'/buildings/{building_id}/floors').data)
+
+        client.post(f'/navigations/{building_id}/migrate-graphs')
+        _, store_path = timed(lambda: get(f'/paths/{building_id}/f1'), 3)
+        _, store_nav = timed(lambda: get(f'/navigations/{building_id}/f1'), 3)
+        floors_after = len(get(f'/buildings/{building_id}/floors').data)
+
+        print(f"{'':13s}GET /paths       path_nodes {legacy_path * 1e3:6.0f} ms -> store {store_path * 1e3:6.0f} ms")
+        print(f"{'':13s}GET /navigations graph field {legacy_nav * 1e3:5.0f} ms -> store {store_nav * 1e3:6.0f} ms")
+        print(f"{'':13s}GET floors list  {floors_before / 1024:8.0f} KiB -> {floors_after / 1024:.1f} KiB")
@@ -0,0 +1,25 @@
+import pickle
+import timeit
+
+import pandas as pd
+
+from benchmarks import random_sensor_window
+from inference import NativePredictor
+from preprocess import FEATURES, extract_features_batch, sliding_windows, window_to_array
+
+if __name__ == "__main__":
+    with open('Models/lightGBM-model_v4.pkl', 'rb') as f:
+        model = pickle.load(f)
+    predictor = NativePredictor(model)
+
+    # parity with the pickle is checked in tests/test_parity.py
+    features = extract_features_batch(sliding_windows(window_to_array(random_sensor_window(5000)), 20, 5))
+
+    for n_rows in (1, 10, 100, 1000):
+        rows = features[:n_rows]
+        number = max(10, 2000 // n_rows)
+        wrapper = min(timeit.repeat(lambda: model.predict_proba(pd.DataFrame(rows, columns=FEATURES)),
+                                    number=number, repeat=5)) / number
+        native = min(timeit.repeat(lambda: predictor.predict_proba(rows), number=number, repeat=5)) / number
+        print(f"rows={n_rows:5d}  wrapper {wrapper / n_rows * 1e6:8.1f} us/row  "
+              f"native {native / n_rows * 1e6:8.1f} us/row  speedup {wrapper / native:6.1f}x")
@@ -0,0 +1,79 @@
+import datetime
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import fake_firestore
+
+LATENCY = 0.02  # seconds per Firestore round trip
+
+db, bucket = fake_firestore.install(LATENCY)
+
+import app  # noqa: E402  (imported after the fake is installed)
+from blueprints.beacon import gps_log_writer  # noqa: E402
+
+gps_log_writer.spill_dir = tempfile.mkdtemp(prefix='bench_ingest_')
+
+DEVICES = 16  # concurrent reporting devices, one request thread each
+PINGS = 100  # readings per device
+
+
+def synchronous_ping(client, i):
+    # what /beaconLog did before: one set() per request
+    db.collection('gps_logs_sync').document().set({
+        'sensor_id': f'sensor{i}', 'latitude': 18.79, 'longitude': 98.95,
+        'timestamp': datetime.datetime.utcnow()})
+
+
+def queued_ping(client, i):
+    response = client.get(f'/beacon/beaconLog?sensorID=sensor{i}&lat=18.79&lon=98.95')
+    assert response.status_code == 200, response.status_code
+
+
+def run(ping):
+    def device(d):
+        client = app.app.test_client()
+        latencies = []
+        for i in range(PINGS):
+            start = time.perf_counter()
+            ping(client, d)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(DEVICES) as pool:
+        latencies = [t for device_latencies in pool.map(device, range(DEVICES)) for t in device_latencies]
+    return time.perf_counter() - start, latencies
+
+
+def report(label, elapsed, latencies):
+    latencies.sort()
+    print(f"{label:<28} {len(latencies) / elapsed:8.0f} req/s   p50 {statistics.median(latencies) * 1e3:6.2f} ms"
+          f"   p99 {latencies[int(len(latencies) * 0.99)] * 1e3:6.2f} ms")
+
+
+if __name__ == "__main__":
+    print(f"{DEVICES} devices x {PINGS} pings, simulated round trip {LATENCY * 1e3:.0f} ms")
+    report("synchronous set() per ping", *run(synchronous_ping))
+
+    elapsed, latencies = run(queued_ping)
+    report("queued, batched writer", elapsed, latencies)
+    start = time.perf_counter()
+    while gps_log_writer.stats()['written'] < DEVICES * PINGS:
+        time.sleep(0.01)
+    print(f"  all {DEVICES * PINGS} readings in Firestore {time.perf_counter() - start:.2f} s after the last request;"
+          f" {gps_log_writer.stats()}")
+
+    # Firestore 25x slower than usual and a small queue: requests stay fast, the overflow goes to
+    # disk and is replayed once the queue drains
+    db.latency = LATENCY * 25
+    gps_log_writer._queue.maxsize = 200
+    elapsed, latencies = run(queued_ping)
+    report(f"queued, {db.latency * 1e3:.0f} ms round trip", elapsed, latencies)
+    print(f"  {gps_log_writer.stats()}")
+    start = time.perf_counter()
+    while sum(gps_log_writer.stats()[k] for k in ('written', 'replayed')) < 2 * DEVICES * PINGS:
+        time.sleep(0.05)
+    print(f"  all written {time.perf_counter() - start:.2f} s later; {gps_log_writer.stats()}")
+    gps_log_writer.stop()
@@ -0,0 +1,106 @@
+import time
+
+import numpy as np
+
+from benchmarks.bench_routing import synthetic_building
+from positioning import DEFAULT_TX_POWER, PATH_LOSS_EXPONENT, ParticleFilter, PathGeometry
+from routing import RoutingGraph
+
+UPDATE_INTERVAL = 0.5  # seconds between scans
+WALK_SPEED = 1.2  # m/s
+BEACON_SPACING = 8  # grid nodes between beacons
+HEARING_RANGE = 15.0  # metres
+RSSI_NOISE_DB = 4.0
+LABEL_ERROR_RATE = 0.1
+
+
+def build_floor(num_nodes=2500, seed=0):
+    floor = synthetic_building(num_nodes, num_floors=1, seed=seed)[0]
+    graph = floor["graph"]
+    geometry = PathGeometry(graph["nodes"], graph["adjacencyList"])
+    beacons = {}
+    for node in graph["nodes"]:
+        _, r, c = node["id"].split("_")
+        if int(r) % BEACON_SPACING == 0 and int(c) % BEACON_SPACING == 0:
+            beacons[f"beacon_{r}_{c}"] = {"xy": geometry.projection.forward(node["coordinates"])[0],
+                                          "txPower": DEFAULT_TX_POWER}
+    return floor, geometry, beacons
+
+
+def replay_track(floor, geometry, rng):
+    """
+    Ground-truth positions every UPDATE_INTERVAL along a shortest path across the floor,
+    walking with a stop halfway, plus the (noisy) movement label of each update.
+    """
+    graph = RoutingGraph.from_floor_graphs([floor])
+    ids = graph.ids[:graph.num_nodes]
+    path = None
+    while path is None:
+        path, _ = graph.shortest_path(*rng.choice(ids, 2, replace=False))
+    index = {node_id: i for i, node_id in enumerate(geometry.node_ids)}
+    polyline = geometry.node_xy[[index[graph.ids[i]] for i in path]]
+    cumulative = np.concatenate(([0.0], np.cumsum(np.linalg.norm(np.diff(polyline, axis=0), axis=1))))
+
+    travelled, truth, labels = 0.0, [], []
+    halt_at, halted = cumulative[-1] / 2, 0
+    while travelled < cumulative[-1]:
+        if travelled >= halt_at and halted < 6:
+            halted += 1
+            label = 'Halt'
+        else:
+            travelled = min(travelled + WALK_SPEED * UPDATE_INTERVAL, cumulative[-1])
+            label = 'Forward'
+        segment = min(np.searchsorted(cumulative, travelled, side='right') - 1, len(polyline) - 2)
+        fraction = (travelled - cumulative[segment]) / max(cumulative[segment + 1] - cumulative[segment], 1e-9)
+        truth.append(polyline[segment] + (polyline[segment + 1] - polyline[segment]) * min(fraction, 1.0))
+        if rng.random() < LABEL_ERROR_RATE:
+            label = rng.choice(['Halt', 'Forward', 'Turn'])
+        labels.append(label)
+    return np.array(truth), labels
+
+
+def scan_at(position, beacons, rng):
+    scan = {}
+    for beacon_id, beacon in beacons.items():
+        distance = np.linalg.norm(beacon["xy"] - position)
+        if distance <= HEARING_RANGE:
+            rssi = beacon["txPower"] - 10 * PATH_LOSS_EXPONENT * np.log10(max(distance, 0.5))
+            scan[beacon_id] = float(rssi + rng.normal(0, RSSI_NOISE_DB))
+    return scan
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    floor, geometry, beacons = build_floor()
+    print(f"floor: {len(geometry.node_ids)} nodes, {len(geometry)} edges, {len(beacons)} beacons")
+
+    for num_particles in (200, 500, 1000):
+        errors, elapsed, updates = [], 0.0, 0
+        for track in range(10):
+            truth, labels = replay_track(floor, geometry, rng)
+            scans = [scan_at(p, beacons, rng) for p in truth]
+            pf = ParticleFilter(geometry, beacons, num_particles, seed=track)
+            start = time.perf_counter()
+            estimates = [pf.step(scan, label, UPDATE_INTERVAL) for scan, label in zip(scans, labels)]
+            elapsed += time.perf_counter() - start
+            updates += len(estimates)
+            xy = geometry.projection.forward([[e["lat"], e["lng"]] for e in estimates])
+            errors.extend(np.linalg.norm(xy - truth, axis=1)[5:])  # skip convergence
+        errors = np.array(errors)
+        print(f"particles={num_particles:5d}  {elapsed / updates * 1e6:7.1f} us/update "
+              f"({updates / elapsed:8.0f} updates/s)  error median {np.median(errors):4.1f} m  "
+              f"p90 {np.percentile(errors, 90):4.1f} m")
+
+    # many concurrent sessions, one update each, as a process would see them
+    num_sessions = 2000
+    filters = [ParticleFilter(geometry, beacons, 500, seed=i) for i in range(num_sessions)]
+    truth, labels = replay_track(floor, geometry, rng)
+    for pf in filters:
+        pf.step(scan_at(truth[0], beacons, rng))
+    scans = [scan_at(truth[1], beacons, rng) for _ in range(num_sessions)]
+    start = time.perf_counter()
+    for pf, scan in zip(filters, scans):
+        pf.step(scan, 'Forward', UPDATE_INTERVAL)
+    elapsed = time.perf_counter() - start
+    print(f"{num_sessions} sessions x 500 particles: one update round in {elapsed * 1e3:.0f} ms "
+          f"({num_sessions / elapsed:.0f} updates/s)")
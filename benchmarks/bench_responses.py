@@ -0,0 +1,66 @@
+import gzip
+import json
+import time
+
+import msgpack
+
+from benchmarks import fake_firestore
+from benchmarks.bench_routing import synthetic_building
+
+db, bucket = fake_firestore.install(0)
+
+import app  # noqa: E402  (imported after the fake is installed)
+from responses import orjson  # noqa: E402
+
+client = app.app.test_client()
+BUILDING = 'bench'
+URLS = {
+    'supergraph': f'/navigations/{BUILDING}/supergraph',
+    'POIs': f'/POIs/{BUILDING}',
+    'beacons': f'/beacon/{BUILDING}/all_beacons',
+}
+
+
+def seed(num_floors=50, pois=200, beacons=50, nodes_per_floor=400):
+    db.collection('buildings').document(BUILDING).set({'name': BUILDING})
+    for f, floor in enumerate(synthetic_building(nodes_per_floor * num_floors, num_floors)):
+        client.post(f'/buildings/{BUILDING}/floors', json={'id': floor['id'], 'floor': f + 1})
+        client.post(f'/POIs/{BUILDING}/{floor["id"]}/bulk', json={'create': [
+            {'id': f'{floor["id"]}-poi{i}', 'name': f'POI {i}', 'category': 'shop', 'location': [18.79, 98.95]}
+            for i in range(pois)]})
+        client.post(f'/beacon/{BUILDING}/{floor["id"]}/bulk', json={'create': [
+            {'beaconId': f'{floor["id"]}-b{i}', 'name': f'Beacon {i}', 'latLng': [18.79, 98.95]}
+            for i in range(beacons)]})
+        client.post(f'/navigations/{BUILDING}/{floor["id"]}', json=floor['graph'])
+
+
+def timed(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+if __name__ == "__main__":
+    seed()
+    print(f"{'endpoint':<11} {'json':>9} {'orjson':>9} {'raw KiB':>8} {'gzip KiB':>9} {'msgpack KiB':>12} {'ndjson 1st chunk':>17}")
+    for name, url in URLS.items():
+        data = client.get(url).get_json()
+        _, stdlib = timed(lambda: json.dumps(data, sort_keys=True).encode())
+        _, fast = timed(lambda: orjson.dumps(data, option=orjson.OPT_SORT_KEYS)) if orjson else (None, float('nan'))
+
+        raw = client.get(url).data
+        gzipped = client.get(url, headers={'Accept-Encoding': 'gzip'})
+        packed = client.get(url, headers={'Accept': 'application/msgpack'})
+        assert gzip.decompress(gzipped.data) == raw and msgpack.unpackb(packed.data) == data
+
+        first_chunk = '-'
+        if isinstance(data, list):
+            streamed = client.get(url, headers={'Accept': 'application/x-ndjson'}, buffered=False)
+            first_chunk = f"{len(next(streamed.response)) / 1024:.0f} KiB"
+            streamed.close()
+
+        print(f"{name:<11} {stdlib * 1e3:7.1f}ms {fast * 1e3:7.1f}ms {len(raw) / 1024:8.0f} "
+              f"{len(gzipped.data) / 1024:9.0f} {len(packed.data) / 1024:12.0f} {first_chunk:>17}")
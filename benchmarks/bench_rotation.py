@@ -0,0 +1,39 @@
+import timeit
+
+import numpy as np
+import pandas as pd
+from scipy.spatial.transform import Rotation as R
+
+from benchmarks import random_sensor_window
+from preprocess import rotate_accelerometer_to_world_frame
+
+
+def rotate_per_row(sensor_df):
+    """
+    The original row-by-row implementation, kept here as the parity and speed reference.
+    """
+    columns = ['acc_x', 'acc_y', 'acc_z', 'acc_gx', 'acc_gy', 'acc_gz', 'mean_magnitude']
+    result_df = pd.DataFrame(columns=columns)
+
+    for row in sensor_df.itertuples(index=False):
+        r = R.from_euler('zyx', np.deg2rad([row.gyro_x, row.gyro_y, row.gyro_z]))
+        acc_world = r.apply([row.acc_x, row.acc_y, row.acc_z])
+        gravity_world = r.apply([row.acc_gx, row.acc_gy, row.acc_gz])
+        mean_magnitude = np.linalg.norm(acc_world)
+
+        result = pd.DataFrame([list(acc_world) + list(gravity_world) + [mean_magnitude]], columns=columns)
+        result_df = pd.concat([result_df, result], ignore_index=True)
+
+    return result_df
+
+
+if __name__ == "__main__":
+    for n in (10, 100, 1000):
+        window = random_sensor_window(n)
+        # parity with rotate_per_row is checked in tests/test_parity.py
+
+        repeats = max(3, 3000 // n)
+        per_row = min(timeit.repeat(lambda: rotate_per_row(window), number=1, repeat=repeats))
+        batched = min(timeit.repeat(lambda: rotate_accelerometer_to_world_frame(window), number=1, repeat=repeats))
+        print(f"n={n:5d}  per-row {per_row * 1e3:8.3f} ms  batched {batched * 1e3:8.3f} ms  "
+              f"speedup {per_row / batched:6.1f}x")
@@ -0,0 +1,73 @@
+import math
+import time
+
+import numpy as np
+
+from routing import RoutingGraph, haversine_m
+
+ORIGIN = (18.7953, 98.9523)  # lat, lng
+SPACING_DEG = 0.00001  # ~1.1 m between neighbouring nodes
+
+
+def synthetic_building(num_nodes, num_floors=5, seed=0):
+    """
+    Floor graphs shaped like the map editor's output: a square corridor grid per floor with
+    jittered coordinates, metre weights, a few dropped edges and two stair portals per floor.
+    """
+    rng = np.random.default_rng(seed)
+    side = int(math.sqrt(num_nodes / num_floors))
+    floor_graphs = []
+
+    for f in range(num_floors):
+        nodes, adjacency = [], {}
+        lat = ORIGIN[0] + np.arange(side)[:, None] * SPACING_DEG + rng.normal(0, SPACING_DEG / 10, (side, side))
+        lng = ORIGIN[1] + np.arange(side)[None, :] * SPACING_DEG + rng.normal(0, SPACING_DEG / 10, (side, side))
+
+        def node_id(r, c):
+            return f"f{f}_{r}_{c}"
+
+        for r in range(side):
+            for c in range(side):
+                node = {"id": node_id(r, c), "coordinates": [float(lat[r, c]), float(lng[r, c])]}
+                if (r, c) in ((0, 0), (side - 1, side - 1)):
+                    node["portalGroup"] = f"Stairs {r}"
+                nodes.append(node)
+                edges = []
+                for dr, dc in ((0, 1), (1, 0), (0, -1), (-1, 0)):
+                    rr, cc = r + dr, c + dc
+                    if 0 <= rr < side and 0 <= cc < side and rng.random() > 0.1:
+                        weight = float(haversine_m(lat[r, c], lng[r, c], lat[rr, cc], lng[rr, cc]))
+                        edges.append({"targetNodeId": node_id(rr, cc), "weight": weight})
+                adjacency[node_id(r, c)] = edges
+
+        floor_graphs.append({"id": f"floor{f}", "floor": f + 1, "graph": {"nodes": nodes, "adjacencyList": adjacency}})
+
+    return floor_graphs
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(1)
+    for num_nodes in (10_000, 25_000, 50_000, 100_000):
+        graph, build = timed(RoutingGraph.from_floor_graphs, synthetic_building(num_nodes))
+
+        queries = [tuple(rng.choice(graph.ids, 2)) for _ in range(20)]
+        astar_total = dijkstra_total = 0.0
+        scale = graph.heuristic_scale
+        for source, target in queries:
+            (_, astar_distance), astar = timed(graph.shortest_path, source, target)
+            graph.heuristic_scale = 0.0
+            (_, dijkstra_distance), dijkstra = timed(graph.shortest_path, source, target)
+            graph.heuristic_scale = scale
+            assert math.isclose(astar_distance, dijkstra_distance, rel_tol=1e-9) or astar_distance == dijkstra_distance
+            astar_total += astar
+            dijkstra_total += dijkstra
+
+        print(f"nodes={len(graph):7d}  edges={len(graph.indices):7d}  build {build * 1e3:7.1f} ms  "
+              f"A* {astar_total / len(queries) * 1e3:6.1f} ms/query  "
+              f"Dijkstra {dijkstra_total / len(queries) * 1e3:6.1f} ms/query")
@@ -0,0 +1,46 @@
+import time
+
+from benchmarks import fake_firestore
+from benchmarks.bench_routing import synthetic_building
+
+LATENCY = 0.01  # seconds per Firestore round trip
+
+db, bucket = fake_firestore.install(LATENCY)
+
+import app  # noqa: E402  (imported after the fake is installed)
+
+client = app.app.test_client()
+
+
+def writes_during(fn):
+    before = db.stats.writes
+    start = time.perf_counter()
+    response = fn()
+    return response, db.stats.writes - before, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    print(f"simulated round trip: {LATENCY * 1e3:.0f} ms")
+    for num_nodes in (400, 2500, 10000):
+        graph = synthetic_building(num_nodes, num_floors=1, seed=0)[0]["graph"]
+        body = {"nodes": graph["nodes"], "adjacencyList": graph["adjacencyList"]}
+        url = f'/paths/save/bench/f{num_nodes}'
+        db.collection('buildings').document('bench').collection('floors').document(f'f{num_nodes}').set({'floor': 1})
+
+        response, writes, elapsed = writes_during(lambda: client.post(url, json=body))
+        assert response.status_code == 200, response.json
+        print(f"nodes={num_nodes:6d}  first save     {writes:6d} writes  {elapsed * 1e3:7.0f} ms")
+
+        # a typical editor save: move ten nodes
+        version = response.json["version"]
+        for node in body["nodes"][:10]:
+            node["coordinates"] = [node["coordinates"][0] + 1e-6, node["coordinates"][1]]
+        response, writes, elapsed = writes_during(lambda: client.post(url, json={**body, "version": version}))
+        assert response.status_code == 200 and response.json["changed"] == 10, response.json
+        print(f"nodes={num_nodes:6d}  10-node edit   {writes:6d} writes  {elapsed * 1e3:7.0f} ms  "
+              f"(one document per node, delete-all-and-rewrite: {2 * num_nodes} writes"
+              f"{', over the 500-operation batch limit' if 2 * num_nodes > 500 else ''})")
+
+        # a second editor still holding the old version is turned away
+        response = client.post(url, json={**body, "version": version})
+        assert response.status_code == 409, response.json
@@ -0,0 +1,50 @@
+import time
+
+import numpy as np
+
+from routing import haversine_m
+from spatial_index import PointIndex
+
+ORIGIN = (18.7953, 98.9523)  # lat, lng
+FLOOR_SIZE_DEG = 0.002  # ~220 m across
+
+
+def random_features(count, seed=0):
+    rng = np.random.default_rng(seed)
+    points = np.array(ORIGIN) + rng.uniform(0, FLOOR_SIZE_DEG, (count, 2))
+    return [{"id": f"poi{i}", "location": [float(lat), float(lng)]} for i, (lat, lng) in enumerate(points)]
+
+
+def linear_nearest(features, lat, lng, k):
+    """
+    The client-side approach: distance to every feature, then sort.
+    """
+    points = np.array([f["location"] for f in features])
+    distance = haversine_m(points[:, 0], points[:, 1], lat, lng)
+    order = np.argsort(distance)[:k]
+    return [(features[i], float(distance[i])) for i in order]
+
+
+def timed(fn, *args, repeat=200):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn(*args)
+    return result, (time.perf_counter() - start) / repeat
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(1)
+    for count in (10_000, 50_000, 100_000):
+        features = random_features(count)
+        start = time.perf_counter()
+        index = PointIndex(features, lambda f: f["location"])
+        build = time.perf_counter() - start
+
+        lat, lng = np.array(ORIGIN) + rng.uniform(0, FLOOR_SIZE_DEG, 2)
+        expected, scan = timed(linear_nearest, features, lat, lng, 10, repeat=20)
+        actual, knn = timed(index.nearest, lat, lng, 10)
+        assert [f["id"] for f, _ in actual] == [f["id"] for f, _ in expected], "KD-tree disagrees with the scan"
+        within, radius = timed(index.within, lat, lng, 10.0)
+
+        print(f"features={count:7d}  build {build * 1e3:6.1f} ms  linear 10-NN {scan * 1e3:7.2f} ms  "
+              f"KD-tree 10-NN {knn * 1e6:6.1f} us  radius 10 m ({len(within)} hits) {radius * 1e6:6.1f} us")
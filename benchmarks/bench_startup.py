@@ -0,0 +1,89 @@
+import json
+import re
+import subprocess
+import sys
+
+# each measurement runs in a fresh interpreter, as a new worker would
+FIRST_REQUESTS = r'''
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+client = app.app.test_client()
+t2 = time.perf_counter()
+assert client.get('/jobs/none').status_code == 404
+t3 = time.perf_counter()
+from generateMockData import generate_mock_sensor_data
+response = client.post('/model/predictMovement', json={"interval": 500, "data": generate_mock_sensor_data(10)})
+assert response.status_code == 200, response.get_json()
+t4 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "create_app": t2 - t1, "first_request": t3 - t2, "first_prediction": t4 - t3,
+                  "clients_created": app.db.loaded or app.bucket.loaded}))
+'''
+
+# preload in a "master", then fork a "worker" and time its first prediction
+PRELOAD_FORK = r'''
+import json, os, time
+t0 = time.perf_counter()
+import app
+app.preload()
+preload = time.perf_counter() - t0
+from generateMockData import generate_mock_sensor_data
+payload = {"interval": 500, "data": generate_mock_sensor_data(10)}
+read, write = os.pipe()
+if os.fork() == 0:
+    t = time.perf_counter()
+    response = app.app.test_client().post('/model/predictMovement', json=payload)
+    first = time.perf_counter() - t
+    memory = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if name in ('Rss', 'Shared_Clean', 'Shared_Dirty', 'Private_Dirty'):
+                memory[name] = int(value.split()[0])
+    os.write(write, json.dumps({"status": response.status_code, "first_prediction": first, **memory}).encode())
+    os._exit(0)
+os.wait()
+child = json.loads(os.read(read, 65536))
+print(json.dumps({"preload": preload, **child}))
+'''
+
+
+def run(script, *flags):
+    out = subprocess.run([sys.executable, *flags, '-c', script], capture_output=True, text=True, check=True)
+    return out
+
+
+def import_time():
+    """
+    `python -X importtime` cumulative milliseconds of `import app` and of the modules it imports directly.
+    """
+    stderr = run('import app', '-X', 'importtime').stderr
+    total, children = 0, []
+    for cumulative, name in re.findall(r"import time:\s+\d+ \|\s+(\d+) \|( +\S+)", stderr):
+        depth = (len(name) - len(name.lstrip()) - 1) // 2  # two spaces of indent per level
+        if depth == 0 and name.strip() == 'app':
+            total = int(cumulative) / 1e3
+        elif depth == 1:
+            children.append((int(cumulative) / 1e3, name.strip()))
+    return total, sorted(children, reverse=True)
+
+
+if __name__ == "__main__":
+    total, children = import_time()
+    print(f"python -X importtime -c 'import app': {total:6.1f} ms")
+    for cumulative, name in children[:5]:
+        print(f"  {name:<26} {cumulative:6.1f} ms")
+
+    for _ in range(2):  # the first run also warms the OS file cache
+        first = json.loads(run(FIRST_REQUESTS).stdout.strip().splitlines()[-1])
+    print(f"fresh worker: import {first['import'] * 1e3:.0f} ms, create_app {first['create_app'] * 1e3:.0f} ms, "
+          f"first request {first['first_request'] * 1e3:.0f} ms, first prediction {first['first_prediction'] * 1e3:.0f} ms "
+          f"(Firebase clients created: {first['clients_created']})")
+
+    forked = json.loads(run(PRELOAD_FORK).stdout.strip().splitlines()[-1])
+    assert forked['status'] == 200
+    shared = forked['Shared_Clean'] + forked['Shared_Dirty']
+    print(f"preload in master {forked['preload'] * 1e3:.0f} ms; forked worker's first prediction "
+          f"{forked['first_prediction'] * 1e3:.1f} ms, {shared / 1024:.0f} of {forked['Rss'] / 1024:.0f} MiB RSS "
+          f"shared with the master")
@@ -0,0 +1,27 @@
+import time
+
+import numpy as np
+
+from benchmarks import random_sensor_window
+from preprocess import extract_features, sliding_windows, window_to_array
+from streaming import StreamingFeatureExtractor
+
+if __name__ == "__main__":
+    # 50 Hz phone sensors, 5-second window, 1-second stride
+    window_size, stride = 250, 50
+    stream = window_to_array(random_sensor_window(window_size + stride * 400))
+    windows = sliding_windows(stream, window_size, stride)
+
+    start = time.perf_counter()
+    recomputed = np.array([extract_features(np.ascontiguousarray(w), 20) for w in windows])
+    full_time = time.perf_counter() - start
+
+    extractor = StreamingFeatureExtractor(window_size, stride, data_interval=20)
+    start = time.perf_counter()
+    streamed = np.vstack([extractor.push(stream[i:i + stride]) for i in range(0, len(stream), stride)])
+    stream_time = time.perf_counter() - start
+
+    assert np.allclose(streamed, recomputed), "streaming features drifted from extract_features"
+    print(f"windows={len(windows)}  recompute {full_time / len(windows) * 1e6:8.1f} us/stride  "
+          f"streaming {stream_time / len(windows) * 1e6:8.1f} us/stride  speedup {full_time / stream_time:5.1f}x  "
+          f"upload {stride}/{window_size} samples per stride")
@@ -0,0 +1,74 @@
+import time
+
+from benchmarks import fake_firestore
+from benchmarks.bench_routing import synthetic_building
+
+LATENCY = 0.01  # seconds per Firestore round trip
+
+db, bucket = fake_firestore.install(LATENCY)
+
+import app  # noqa: E402  (imported after the fake is installed)
+
+client = app.app.test_client()
+BUILDING = 'bench'
+
+
+def seed(num_floors=20, pois=200, beacons=50, nodes_per_floor=400):
+    db.latency = 0
+    db.collection('buildings').document(BUILDING).set({'name': BUILDING})
+    for f, floor in enumerate(synthetic_building(nodes_per_floor * num_floors, num_floors)):
+        client.post(f'/buildings/{BUILDING}/floors', json={'id': floor['id'], 'floor': f + 1})
+        client.post(f'/POIs/{BUILDING}/{floor["id"]}/bulk', json={'create': [
+            {'id': f'{floor["id"]}-poi{i}', 'name': f'POI {i}', 'category': 'shop', 'location': [18.79, 98.95]}
+            for i in range(pois)]})
+        client.post(f'/beacon/{BUILDING}/{floor["id"]}/bulk', json={'create': [
+            {'beaconId': f'{floor["id"]}-b{i}', 'name': f'Beacon {i}', 'latLng': [18.79, 98.95]}
+            for i in range(beacons)]})
+        client.post(f'/navigations/{BUILDING}/{floor["id"]}', json=floor['graph'])
+    db.latency = LATENCY
+
+
+APP_START = [f'/buildings/{BUILDING}', f'/buildings/{BUILDING}/floors', f'/POIs/{BUILDING}',
+             f'/beacon/{BUILDING}/all_beacons', f'/navigations/{BUILDING}/supergraph']
+
+
+def open_app(etags=None):
+    """
+    The requests the app makes when it opens; returns (bytes received, seconds, new etags).
+    """
+    received, new_etags = 0, {}
+    start = time.perf_counter()
+    for url in APP_START:
+        headers = {'If-None-Match': etags[url]} if etags else {}
+        response = client.get(url, headers=headers)
+        assert response.status_code in (200, 304), (url, response.status_code)
+        received += len(response.data)
+        new_etags[url] = response.headers['ETag']
+    return received, time.perf_counter() - start, new_etags
+
+
+if __name__ == "__main__":
+    seed()
+    print(f"simulated round trip: {LATENCY * 1e3:.0f} ms")
+
+    app.cache.invalidate(BUILDING)
+    received, elapsed, etags = open_app()
+    print(f"cold open, full downloads          {received / 1024:8.0f} KiB  {elapsed * 1e3:6.0f} ms")
+
+    received, elapsed, _ = open_app(etags)
+    print(f"reopen, nothing changed (304s)     {received / 1024:8.1f} KiB  {elapsed * 1e3:6.0f} ms")
+
+    full = client.get(f'/sync/{BUILDING}')
+    print(f"/sync full                         {len(full.data) / 1024:8.0f} KiB")
+
+    for i in range(5):
+        client.patch(f'/POIs/{BUILDING}/floor{i}/floor{i}-poi0/recommended', json={'value': True})
+    client.patch(f'/beacon/{BUILDING}/floor3/floor3-b7', json={'name': 'Renamed'})
+
+    received, elapsed, _ = open_app(etags)
+    print(f"reopen after 6 edits, ETags only   {received / 1024:8.0f} KiB  {elapsed * 1e3:6.0f} ms")
+    start = time.perf_counter()
+    delta = client.get(f'/sync/{BUILDING}?since={full.json["version"]}')
+    elapsed = time.perf_counter() - start
+    print(f"reopen after 6 edits, /sync delta  {len(delta.data) / 1024:8.1f} KiB  {elapsed * 1e3:6.0f} ms  "
+          f"({len(delta.json['pois']['updated'])} POIs, {len(delta.json['beacons']['updated'])} beacon)")
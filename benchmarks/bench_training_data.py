@@ -0,0 +1,68 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import random_sensor_window
+from preprocess import FEATURES, SENSOR_CHANNELS, extract_features_batch, preprocess, sliding_windows
+from training_data import build, load_columns
+
+ROWS = 300_000
+SESSIONS = 3
+WINDOW = 20
+STRIDE = 5
+
+
+def recording(path):
+    """
+    SESSIONS back-to-back sessions with labels and a few incomplete rows, written as CSV.
+    """
+    frame = random_sensor_window(ROWS, seed=1)
+    frame['session'] = np.repeat(np.arange(SESSIONS), -(-ROWS // SESSIONS))[:ROWS]
+    frame['action'] = np.array(['Halt', 'Forward', 'Turn'])[(np.arange(ROWS) // 97) % 3]
+    frame.loc[np.random.default_rng(2).choice(ROWS, 20, replace=False), 'acc_x'] = np.nan
+    frame.to_csv(path, index=False)
+    return frame
+
+
+def expected_features(frame):
+    """
+    Every session's complete runs featurized whole, in memory: what the pipeline must reproduce.
+    """
+    blocks = []
+    complete = frame[SENSOR_CHANNELS].notna().all(axis=1).to_numpy()
+    run = np.cumsum(~complete | (frame['session'].diff().fillna(0) != 0).to_numpy())
+    for _, rows in frame[complete].groupby(run[complete], sort=True):
+        if len(rows) >= WINDOW:
+            blocks.append(extract_features_batch(sliding_windows(rows[SENSOR_CHANNELS].to_numpy(), WINDOW, STRIDE)))
+    return np.concatenate(blocks)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'recording.csv')
+        frame = recording(path)
+        print(f"{ROWS:,} rows ({os.path.getsize(path) / 2**20:.0f} MiB CSV), {SESSIONS} sessions, "
+              f"window {WINDOW}, stride {STRIDE}, {os.cpu_count()} cores")
+
+        # what one /model/predictMovement call does per window, timed on a sample
+        windows = [frame.iloc[i:i + WINDOW][SENSOR_CHANNELS] for i in range(0, 2000 * STRIDE, STRIDE)]
+        start = time.perf_counter()
+        for window in windows:
+            preprocess(window)
+        print(f"preprocess() per window         {len(windows) / (time.perf_counter() - start):10,.0f} windows/s")
+
+        expected = expected_features(frame)
+        for workers in sorted({0, os.cpu_count()}):
+            out = os.path.join(tmp, f'features-{workers}')
+            manifest = build([path], out, WINDOW, STRIDE, label_column='action', session_column='session',
+                             workers=workers, chunk_rows=50_000)
+            columns, _ = load_columns(out)
+            matrix = np.column_stack([columns[name] for name in FEATURES])
+            assert matrix.shape == expected.shape and np.allclose(matrix, expected, equal_nan=True)
+            label = 'in process' if workers == 0 else f'{workers} worker processes'
+            print(f"pipeline, {label:<21} {manifest['windowsPerSecond']:10,.0f} windows/s   "
+                  f"{manifest['rows']:,} windows, identical to serving's features")
+        print(f"labels: {pd.Series(np.asarray(columns['label'])).value_counts().sort_index().to_dict()}")
@@ -0,0 +1,383 @@
+"""
+In-memory stand-in for the Firestore client and storage bucket, used only by the benchmarks.
+
+Every RPC sleeps for ``latency`` seconds so round-trip-bound code paths can be compared
+without a network or emulator. ``install`` patches firebase_admin before ``app`` is imported.
+"""
+import bisect
+import copy
+import itertools
+import threading
+import time
+import types
+import uuid
+
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition
+
+
+class Counter:
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+        self.rpcs = 0
+
+
+class Snap:
+    def __init__(self, ref, data, update_time=None):
+        self.reference = ref
+        self.id = ref.id
+        self._data = data
+        self.exists = data is not None
+        self.update_time = update_time
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return self._data.get(field) if self._data else None
+
+
+def merge_into(d, data):
+    # set(merge=True) merges nested maps rather than replacing them
+    for k, v in data.items():
+        if isinstance(v, dict) and isinstance(d.get(k), dict):
+            merge_into(d[k], v)
+        else:
+            apply_update(d, {k: v})
+
+
+def apply_update(d, data):
+    for k, v in data.items():
+        if '.' in k:  # field path into a nested map
+            head, rest = k.split('.', 1)
+            if type(v).__name__ == 'Sentinel' and not isinstance(d.get(head), dict):
+                continue
+            d.setdefault(head, {})
+            apply_update(d[head], {rest: v})
+            continue
+        if type(v).__name__ == 'Increment':
+            d[k] = d.get(k, 0) + v.value
+        elif type(v).__name__ == 'Sentinel':  # firestore.DELETE_FIELD
+            d.pop(k, None)
+        elif type(v).__name__ == 'ArrayUnion':
+            d[k] = d.get(k, []) + [x for x in v.values if x not in d.get(k, [])]
+        else:
+            d[k] = copy.deepcopy(v)
+
+
+class DocRef:
+    def __init__(self, db, path):
+        self._db = db
+        self.path = path
+        self.id = path.split('/')[-1]
+
+    def collection(self, name):
+        return ColRef(self._db, f"{self.path}/{name}")
+
+    def get(self, *a, **k):
+        self._db.stats.reads += 1
+        self._db.stats.rpcs += 1
+        self._db.delay()
+        return Snap(self, copy.deepcopy(self._db.docs.get(self.path)), self._db.docs.update_times.get(self.path))
+
+    def set(self, data, merge=False):
+        self._db.stats.writes += 1
+        self._db.stats.rpcs += 1
+        self._db.delay()
+        if merge and self.path in self._db.docs:
+            merge_into(self._db.docs[self.path], data)
+            self._db.docs.touch(self.path)
+        else:
+            self._db.docs[self.path] = copy.deepcopy(data)
+
+    def create(self, data):
+        self._db.stats.writes += 1
+        self._db.stats.rpcs += 1
+        self._db.delay()
+        with self._db.lock:
+            if self.path in self._db.docs:
+                raise AlreadyExists(self.path)
+            self._db.docs[self.path] = copy.deepcopy(data)
+
+    def update(self, data, option=None):
+        self._db.stats.writes += 1
+        self._db.stats.rpcs += 1
+        self._db.delay()
+        with self._db.lock:
+            if self.path not in self._db.docs:
+                raise Exception(f"NotFound: {self.path}")
+            if option is not None and option.last_update_time != self._db.docs.update_times.get(self.path):
+                raise FailedPrecondition(f"{self.path} was updated since {option.last_update_time}")
+            apply_update(self._db.docs[self.path], data)
+            self._db.docs.touch(self.path)
+
+    def delete(self):
+        self._db.stats.writes += 1
+        self._db.stats.rpcs += 1
+        self._db.delay()
+        self._db.docs.pop(self.path, None)
+
+    def collections(self):
+        prefix = self.path + '/'
+        names = set()
+        for p in self._db.docs.under(prefix):
+            rest = p[len(prefix):].split('/')
+            if len(rest) >= 2:
+                names.add(rest[0])
+        return [self.collection(n) for n in sorted(names)]
+
+
+class Documents(dict):
+    """
+    path -> data, with a lazily rebuilt sorted path list so prefix scans stay cheap on big trees.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._sorted = None
+        # path -> update_time, a counter that every write to the document advances
+        self.update_times = {}
+        self._clock = itertools.count(1)
+
+    def __setitem__(self, path, data):
+        if path not in self:
+            self._sorted = None
+        super().__setitem__(path, data)
+        self.touch(path)
+
+    def touch(self, path):
+        self.update_times[path] = next(self._clock)
+
+    def pop(self, path, *default):
+        self._sorted = None
+        self.update_times.pop(path, None)
+        return super().pop(path, *default)
+
+    def under(self, prefix=''):
+        if self._sorted is None:
+            self._sorted = sorted(self)
+        start = bisect.bisect_left(self._sorted, prefix)
+        end = bisect.bisect_left(self._sorted, prefix + '\uffff') if prefix else len(self._sorted)
+        return self._sorted[start:end]
+
+
+class Query:
+    def __init__(self, db, matcher, filters=(), limit=None, order=None, prefix=''):
+        self._db = db
+        self._matcher = matcher
+        self._filters = list(filters)
+        self._limit = limit
+        self._order = order
+        self._prefix = prefix
+
+    def where(self, field=None, op=None, value=None, filter=None):
+        if filter is not None:
+            field, op, value = filter.field_path, filter.op_string, filter.value
+        return Query(self._db, self._matcher, self._filters + [(field, op, value)], self._limit, self._order,
+                     self._prefix)
+
+    def limit(self, n):
+        return Query(self._db, self._matcher, self._filters, n, self._order, self._prefix)
+
+    def order_by(self, field, direction=None):
+        return Query(self._db, self._matcher, self._filters, self._limit, (field, direction), self._prefix)
+
+    def _match(self, path, data):
+        for field, op, value in self._filters:
+            if field == '__name__':
+                v = path
+                value = value.path if isinstance(value, DocRef) else value
+            else:
+                v = data.get(field)
+            if op == '==' and v != value: return False
+            if op == '>=' and not (v is not None and v >= value): return False
+            if op == '<=' and not (v is not None and v <= value): return False
+            if op == '<' and not (v is not None and v < value): return False
+            if op == '>' and not (v is not None and v > value): return False
+            if op == 'in' and v not in value: return False
+        return True
+
+    def stream(self):
+        self._db.stats.rpcs += 1
+        self._db.delay()
+        out = []
+        for path in self._db.docs.under(self._prefix):
+            if self._matcher(path) and self._match(path, self._db.docs[path]):
+                out.append(Snap(DocRef(self._db, path), copy.deepcopy(self._db.docs[path]),
+                                self._db.docs.update_times.get(path)))
+        if self._order:
+            out.sort(key=lambda s: s._data.get(self._order[0]), reverse=(self._order[1] == 'DESCENDING'))
+        if self._limit is not None:
+            out = out[:self._limit]
+        self._db.stats.reads += len(out)
+        return iter(out)
+
+    def get(self):
+        return list(self.stream())
+
+
+class ColRef(Query):
+    def __init__(self, db, path):
+        depth = path.count('/') + 2
+        super().__init__(db, lambda p: p.count('/') + 1 == depth, prefix=path + '/')
+        self.path = path
+        self.id = path.split('/')[-1]
+
+    def document(self, doc_id=None):
+        return DocRef(self._db, f"{self.path}/{doc_id or uuid.uuid4().hex[:20]}")
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return None, ref
+
+    def list_documents(self):
+        ids = set()
+        prefix = self.path + '/'
+        for p in self._db.docs.under(prefix):
+            ids.add(p[len(prefix):].split('/')[0])
+        return [self.document(i) for i in sorted(ids)]
+
+
+class Batch:
+    def __init__(self, db):
+        self._db = db
+        self._ops = []
+
+    def set(self, ref, data, merge=False):
+        self._ops.append(('set', ref, data, merge))
+
+    def update(self, ref, data, option=None):
+        self._ops.append(('update', ref, data, option))
+
+    def delete(self, ref):
+        self._ops.append(('delete', ref))
+
+    def create(self, ref, data):
+        self._ops.append(('create', ref, data))
+
+    def __len__(self):
+        return len(self._ops)
+
+    def commit(self):
+        if len(self._ops) > 500:
+            raise Exception("InvalidArgument: maximum 500 writes allowed per request")
+        self._db.stats.rpcs += 1
+        self._db.delay()
+        with self._db.lock:
+            # all or nothing, like Firestore: check every precondition before writing
+            for op in self._ops:
+                if op[0] == 'update' and op[3] is not None \
+                        and op[3].last_update_time != self._db.docs.update_times.get(op[1].path):
+                    raise FailedPrecondition(f"{op[1].path} was updated since {op[3].last_update_time}")
+            for op in self._ops:
+                if op[0] == 'set':
+                    if op[3] and op[1].path in self._db.docs:
+                        merge_into(self._db.docs[op[1].path], op[2])
+                        self._db.docs.touch(op[1].path)
+                    else:
+                        self._db.docs[op[1].path] = copy.deepcopy(op[2])
+                elif op[0] == 'create':
+                    self._db.docs[op[1].path] = copy.deepcopy(op[2])
+                elif op[0] == 'update':
+                    if op[1].path not in self._db.docs:
+                        raise Exception(f"NotFound: {op[1].path}")
+                    apply_update(self._db.docs[op[1].path], op[2])
+                    self._db.docs.touch(op[1].path)
+                else:
+                    self._db.docs.pop(op[1].path, None)
+        self._db.stats.writes += len(self._ops)
+        return []
+
+
+class FakeDB:
+    def __init__(self, latency=0.0):
+        self.docs = Documents()
+        self.stats = Counter()
+        self.latency = latency
+        self.lock = threading.Lock()
+
+    def delay(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def collection(self, name):
+        return ColRef(self, name)
+
+    def document(self, path):
+        return DocRef(self, path)
+
+    def collection_group(self, name):
+        return Query(self, lambda p: p.split('/')[-2] == name)
+
+    def batch(self):
+        return Batch(self)
+
+    @staticmethod
+    def write_option(last_update_time=None):
+        return types.SimpleNamespace(last_update_time=last_update_time)
+
+    def get_all(self, refs):
+        refs = list(refs)
+        self.stats.rpcs += 1
+        self.stats.reads += len(refs)
+        self.delay()
+        return [Snap(r, copy.deepcopy(self.docs.get(r.path)), self.docs.update_times.get(r.path)) for r in refs]
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.public_url = f"https://storage.googleapis.com/fake/{name}"
+
+    def exists(self):
+        return self.name in self.bucket.blobs
+
+    def delete(self):
+        self.bucket.blobs.pop(self.name, None)
+
+    def upload_from_file(self, f, content_type=None):
+        self.bucket.blobs[self.name] = f.read()
+
+    def upload_from_string(self, data, content_type=None):
+        self.bucket.blobs[self.name] = data
+
+    def download_as_bytes(self):
+        return self.bucket.blobs[self.name]
+
+    def make_public(self):
+        pass
+
+
+class FakeBucket:
+    def __init__(self):
+        self.blobs = {}
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+    def list_blobs(self, prefix=''):
+        return [FakeBlob(self, n) for n in sorted(self.blobs) if n.startswith(prefix)]
+
+    def delete_blobs(self, blobs, on_error=None):
+        for b in blobs:
+            self.blobs.pop(b.name, None)
+
+
+def install(latency=0.0):
+    """
+    Makes firebase_admin hand out a FakeDB and FakeBucket; call before importing ``app``.
+
+    Returns:
+        tuple: (FakeDB, FakeBucket)
+    """
+    import firebase_admin
+    from firebase_admin import credentials, firestore, storage
+    db = FakeDB(latency)
+    bucket = FakeBucket()
+    credentials.Certificate = lambda *a, **k: None
+    firebase_admin.initialize_app = lambda *a, **k: None
+    firestore.client = lambda *a, **k: db
+    storage.bucket = lambda *a, **k: bucket
+    return db, bucket
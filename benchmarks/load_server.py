@@ -0,0 +1,48 @@
+"""
+The production entry point backed by the in-memory Firestore and seeded with a synthetic
+building, so the gunicorn setup can be load-tested without a Firebase project:
+
+    gunicorn -c gunicorn.conf.py benchmarks.load_server:application
+
+Like the app's other in-memory state, the fake Firestore belongs to one process: with more than
+one worker (WEB_CONCURRENCY) each would see only its own writes.
+"""
+import os
+import tempfile
+
+from benchmarks import fake_firestore
+from benchmarks.bench_routing import synthetic_building
+
+LATENCY = float(os.environ.get('FAKE_FIRESTORE_LATENCY', 0.01))  # seconds per Firestore round trip
+BUILDING = 'bench'
+FLOORS = 5
+
+db, bucket = fake_firestore.install()
+
+import app  # noqa: E402  (imported after the fake is installed)
+
+
+def seed(flask_app, pois=100, beacons=20, nodes_per_floor=400):
+    client = flask_app.test_client()
+    db.collection('buildings').document(BUILDING).set({'name': BUILDING})
+    for f, floor in enumerate(synthetic_building(nodes_per_floor * FLOORS, FLOORS)):
+        client.post(f'/buildings/{BUILDING}/floors', json={'id': floor['id'], 'floor': f + 1})
+        client.post(f'/POIs/{BUILDING}/{floor["id"]}/bulk', json={'create': [
+            {'id': f'{floor["id"]}-poi{i}', 'name': f'POI {i}', 'category': 'shop', 'location': [18.79, 98.95]}
+            for i in range(pois)]})
+        client.post(f'/beacon/{BUILDING}/{floor["id"]}/bulk', json={'create': [
+            {'beaconId': f'{floor["id"]}-b{i}', 'name': f'Beacon {i}', 'latLng': [18.79, 98.95]}
+            for i in range(beacons)]})
+        client.post(f'/navigations/{BUILDING}/{floor["id"]}', json=floor['graph'])
+
+
+pool = os.environ.get('SERVER_POOL', 'all')
+if pool != 'model':
+    from blueprints.beacon import gps_log_writer
+    gps_log_writer.spill_dir = tempfile.mkdtemp(prefix='load_server_')
+    seed(app.get_app(pool))
+    # the snapshot cache starts cold in every worker, as it would after a deploy
+    app.cache.invalidate(BUILDING)
+db.latency = LATENCY
+
+application = app.preload(pool)
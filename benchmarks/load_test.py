@@ -0,0 +1,172 @@
+"""
+Load test for a running server: concurrent clients send a mix of requests for a fixed time and
+requests/sec and p50/p99 latency are reported per endpoint.
+
+    python -m benchmarks.load_test --url https://api.example.com --building <id>
+
+With --serve it starts gunicorn itself on benchmarks.load_server (the in-memory Firestore), either
+as one server for everything or, with --split, as separate 'model' and 'api' servers, and stops
+them with SIGTERM at the end to time the graceful shutdown.
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+from generateMockData import generate_mock_sensor_data
+
+
+def endpoints(building, floor):
+    """
+    (name, method, path, body, weight, pool) for each request in the mix.
+    """
+    prediction = {"interval": 500, "data": generate_mock_sensor_data(10)}
+    return [
+        ('GET /buildings/<id>', 'GET', f'/buildings/{building}', None, 2, 'api'),
+        ('GET /POIs/<id>', 'GET', f'/POIs/{building}', None, 2, 'api'),
+        ('GET /POIs/<id>/<floor>', 'GET', f'/POIs/{building}/{floor}', None, 2, 'api'),
+        ('GET /navigations/<id>/supergraph', 'GET', f'/navigations/{building}/supergraph', None, 1, 'api'),
+        ('GET /beacon/beaconLog', 'GET', '/beacon/beaconLog?sensorID=load-{n}&lat=18.79&lon=98.95', None, 4, 'api'),
+        ('POST /model/predictMovement', 'POST', '/model/predictMovement', prediction, 2, 'model'),
+    ]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run(urls, mix, concurrency, duration, verify=True):
+    """
+    ``concurrency`` clients, each with its own keep-alive session, cycle through the weighted mix.
+
+    Returns:
+        dict: name -> {"latencies": [seconds, ...], "errors": int}
+    """
+    schedule = [entry for entry in mix for _ in range(entry[4])]
+    results = {name: {"latencies": [], "errors": 0} for name, *_ in mix}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(c):
+        session = requests.Session()
+        session.verify = verify
+        latencies = {name: [] for name, *_ in mix}
+        errors = dict.fromkeys(latencies, 0)
+        n = c
+        while time.perf_counter() < deadline:
+            name, method, path, body, _, pool = schedule[n % len(schedule)]
+            n += concurrency
+            start = time.perf_counter()
+            try:
+                response = session.request(method, urls[pool] + path.format(n=c), json=body, timeout=30)
+                ok = response.status_code < 400
+            except requests.RequestException:
+                ok = False
+            if ok:
+                latencies[name].append(time.perf_counter() - start)
+            else:
+                errors[name] += 1
+        with lock:
+            for name in latencies:
+                results[name]["latencies"].extend(latencies[name])
+                results[name]["errors"] += errors[name]
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def report(results, duration):
+    print(f"{'endpoint':34} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    total = 0
+    for name, r in results.items():
+        latencies = r["latencies"]
+        total += len(latencies)
+        if not latencies:
+            print(f"{name:34} {0:8d} {r['errors']:6d}")
+            continue
+        print(f"{name:34} {len(latencies):8d} {r['errors']:6d} {len(latencies) / duration:8.1f} "
+              f"{percentile(latencies, 50) * 1e3:8.1f} {percentile(latencies, 99) * 1e3:8.1f}")
+    everything = [v for r in results.values() for v in r["latencies"]]
+    if everything:
+        print(f"{'total':34} {total:8d} {sum(r['errors'] for r in results.values()):6d} {total / duration:8.1f} "
+              f"{percentile(everything, 50) * 1e3:8.1f} {percentile(everything, 99) * 1e3:8.1f}")
+
+
+def start_server(pool, port):
+    env = dict(os.environ, SERVER_POOL=pool, BIND=f'127.0.0.1:{port}')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'benchmarks.load_server:application'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url + '/model/versions', timeout=1)
+            return process, url
+        except requests.ConnectionError:
+            if process.poll() is not None:
+                raise RuntimeError(f"gunicorn ({pool}) exited with {process.returncode}")
+            time.sleep(0.5)
+    process.kill()
+    raise RuntimeError(f"gunicorn ({pool}) did not start")
+
+
+def stop_server(process):
+    """
+    SIGTERM, as a deploy would send; returns the seconds until the master exited.
+    """
+    start = time.perf_counter()
+    process.send_signal(signal.SIGTERM)
+    process.wait()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8080', help="server to test")
+    parser.add_argument('--model-url', help="server for /model/predictMovement, if separate (default: --url)")
+    parser.add_argument('--building', default='bench')
+    parser.add_argument('--floor', default='floor0')
+    parser.add_argument('--concurrency', type=int, default=32, help="concurrent clients")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds")
+    parser.add_argument('--insecure', action='store_true', help="skip TLS certificate checks")
+    parser.add_argument('--serve', action='store_true', help="start gunicorn on the in-memory Firestore")
+    parser.add_argument('--split', action='store_true', help="with --serve: separate 'model' and 'api' servers")
+    parser.add_argument('--port', type=int, default=8090, help="with --serve: first port to listen on")
+    args = parser.parse_args()
+
+    servers = []
+    urls = {'api': args.url, 'model': args.model_url or args.url}
+    try:
+        if args.serve and args.split:
+            servers.append(start_server('model', args.port))
+            servers.append(start_server('api', args.port + 1))
+            urls = {'model': servers[0][1], 'api': servers[1][1]}
+        elif args.serve:
+            servers.append(start_server('all', args.port))
+            urls = {'api': servers[0][1], 'model': servers[0][1]}
+
+        mix = endpoints(args.building, args.floor)
+        # one pass first, so every worker's lazy clients and caches are warm
+        run(urls, mix, args.concurrency, 1.0, verify=not args.insecure)
+        results = run(urls, mix, args.concurrency, args.duration, verify=not args.insecure)
+        print(f"{args.concurrency} clients for {args.duration:.0f} s against {json.dumps(urls)}")
+        report(results, args.duration)
+    finally:
+        for process, url in servers:
+            print(f"graceful shutdown of {url}: {stop_server(process):.2f} s")
+
+
+if __name__ == "__main__":
+    main()
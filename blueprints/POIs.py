@@ -1,8 +1,13 @@
 from flask import Blueprint, request, jsonify
-from app import db, bucket  # Assuming 'bucket' is from GCS
+from app import db, bucket, cache  # Assuming 'bucket' is from GCS
 from google.cloud.firestore import GeoPoint
+from firestore_fanout import apply_bulk, fan_out
+from http_cache import conditional_get
+from responses import list_response
+from sync_log import change, record_changes
 
 POIs_bp = Blueprint('POIs', __name__)
+POIs_bp.after_request(conditional_get)
 
 
 @POIs_bp.route('/<building_id>', methods=['GET'])
@@ -13,31 +18,34 @@ def get_building_POIs(building_id):
         return jsonify({"error": "Database not initialized."}), 500
 
     try:
-        # Correctly get the floor document
-        floors_ref = db.collection('buildings').document(building_id).collection('floors')
-        floor_docs = floors_ref.stream()
-
-        POIs = []
-        for floor_doc in floor_docs:
-            poi_ref = floor_doc.reference.collection('POIs')
-            poi_docs = poi_ref.stream()
-
-            for poi_doc in poi_docs:
-                poi_data = poi_doc.to_dict()
-                poi_data['id'] = poi_doc.id
-                poi_data['floor'] = floor_doc.get('floor')  # Use the floor_doc
-                for key, value in poi_data.items():
-                    if isinstance(value, GeoPoint):
-                        poi_data[key] = [value.latitude, value.longitude]
-                POIs.append(poi_data)
-
-        return jsonify(POIs), 200
+        POIs = cache.get_or_load(building_id, 'pois', lambda: load_building_POIs(building_id))
+        return list_response(POIs), 200
 
     except Exception as e:
         print(f"An error occurred during query: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+def load_building_POIs(building_id):
+    floors_ref = db.collection('buildings').document(building_id).collection('floors')
+    floor_docs = list(floors_ref.stream())
+
+    # fetch every floor's POIs concurrently, then merge them in floor order
+    poi_docs_per_floor = fan_out(lambda floor_doc: list(floor_doc.reference.collection('POIs').stream()), floor_docs)
+
+    POIs = []
+    for floor_doc, poi_docs in zip(floor_docs, poi_docs_per_floor):
+        for poi_doc in poi_docs:
+            poi_data = poi_doc.to_dict()
+            poi_data['id'] = poi_doc.id
+            poi_data['floor'] = floor_doc.get('floor')  # Use the floor_doc
+            for key, value in poi_data.items():
+                if isinstance(value, GeoPoint):
+                    poi_data[key] = [value.latitude, value.longitude]
+            POIs.append(poi_data)
+    return POIs
+
+
 @POIs_bp.route('/<building_id>/<floor_id>', methods=['GET'])
 def get_POIs(building_id, floor_id):
     if not building_id:
@@ -48,33 +56,40 @@ def get_POIs(building_id, floor_id):
         return jsonify({"error": "Database not initialized."}), 500
 
     try:
-        # Correctly get the floor document
-        floor_doc_ref = db.collection('buildings').document(building_id).collection('floors').document(floor_id)
-        floor_doc = floor_doc_ref.get()
-
-        if not floor_doc.exists:
+        POIs = cache.get_or_load(building_id, f'pois:{floor_id}', lambda: load_floor_POIs(building_id, floor_id))
+        if POIs is None:
             return jsonify({"error": f"Floor '{floor_id}' not found for building '{building_id}'."}), 404
 
-        POIs_ref = floor_doc_ref.collection('POIs')
-        POIs_docs = POIs_ref.stream()
-
-        POIs = []
-        for doc in POIs_docs:
-            poi_data = doc.to_dict()
-            poi_data['id'] = doc.id
-            poi_data['floor'] = floor_doc.get('floor')  # Use the floor_doc
-            for key, value in poi_data.items():
-                if isinstance(value, GeoPoint):
-                    poi_data[key] = [value.latitude, value.longitude]
-            POIs.append(poi_data)
-
-        return jsonify(POIs), 200
+        return list_response(POIs), 200
 
     except Exception as e:
         print(f"An error occurred during query: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+def load_floor_POIs(building_id, floor_id):
+    # Correctly get the floor document
+    floor_doc_ref = db.collection('buildings').document(building_id).collection('floors').document(floor_id)
+    floor_doc = floor_doc_ref.get()
+
+    if not floor_doc.exists:
+        return None
+
+    POIs_ref = floor_doc_ref.collection('POIs')
+    POIs_docs = POIs_ref.stream()
+
+    POIs = []
+    for doc in POIs_docs:
+        poi_data = doc.to_dict()
+        poi_data['id'] = doc.id
+        poi_data['floor'] = floor_doc.get('floor')  # Use the floor_doc
+        for key, value in poi_data.items():
+            if isinstance(value, GeoPoint):
+                poi_data[key] = [value.latitude, value.longitude]
+        POIs.append(poi_data)
+    return POIs
+
+
 @POIs_bp.route('/<building_id>/<floor_id>', methods=['POST'])
 def add_poi(building_id, floor_id):
     try:
@@ -93,6 +108,8 @@ def add_poi(building_id, floor_id):
             .collection('floors').document(floor_id)\
             .collection('POIs').document(poi_id)
         poi_ref.set(poi_copy)
+        cache.invalidate(building_id)
+        record_changes(db, building_id, [change('poi', poi_id, floor_id)])
 
         return jsonify({"status": "success", "message": f"POI {poi_id} added."}), 201
     except Exception as e:
@@ -127,6 +144,8 @@ def update_poi(building_id, floor_id, poi_id):
         # Update POI doc
         poi_ref = db.collection('buildings').document(building_id).collection('floors').document(floor_id).collection('POIs').document(poi_id)
         poi_ref.update(update_data)
+        cache.invalidate(building_id)
+        record_changes(db, building_id, [change('poi', poi_id, floor_id)])
 
         return jsonify({"status": "success", "message": f"POI {poi_id} updated successfully."}), 200
 
@@ -146,11 +165,79 @@ def delete_poi(building_id, floor_id, poi_id):
             return jsonify({"error": f"POI {poi_id} not found"}), 404
 
         poi_ref.delete()
+        cache.invalidate(building_id)
+        record_changes(db, building_id, [change('poi', poi_id, floor_id, deleted=True)])
         return jsonify({"status": "success", "message": f"POI {poi_id} deleted."}), 200
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@POIs_bp.route('/<building_id>/<floor_id>/bulk', methods=['POST'])
+def bulk_POIs(building_id, floor_id):
+    """
+    Creates, updates and deletes many POIs of one floor with batched writes.
+    Body: {"create": [{"id", ...POI}], "update": [{"id", ...fields}], "delete": ["poiId", ...]}
+    'create' overwrites like POST, 'update' merges the given fields into an existing POI.
+    Returns one result per item, with status 207 if any of them failed.
+    """
+    if db is None:
+        return jsonify({"error": "Database not initialized."}), 500
+
+    try:
+        data = request.get_json()
+        if not data or not any(data.get(op) for op in ('create', 'update', 'delete')):
+            return jsonify({"error": "Provide 'create', 'update' and/or 'delete' arrays."}), 400
+
+        POIs_ref = db.collection('buildings').document(building_id)\
+            .collection('floors').document(floor_id)\
+            .collection('POIs')
+
+        def to_document(poi):
+            poi_copy = {k: v for k, v in poi.items() if k != 'id'}
+            if 'location' in poi_copy and isinstance(poi_copy['location'], list) and len(poi_copy['location']) == 2:
+                poi_copy['location'] = GeoPoint(poi_copy['location'][0], poi_copy['location'][1])
+            return poi_copy
+
+        items, seen = [], set()
+        for op in ('create', 'update', 'delete'):
+            for entry in data.get(op) or []:
+                poi_id = entry if op == 'delete' else (entry.get('id') if isinstance(entry, dict) else None)
+                item = {"op": op, "id": poi_id}
+                if not isinstance(poi_id, str) or not poi_id:
+                    item['error'] = "Each POI must have an 'id'."
+                elif poi_id in seen:
+                    item['error'] = f"POI {poi_id} appears more than once in this request."
+                else:
+                    seen.add(poi_id)
+                    poi_ref = POIs_ref.document(poi_id)
+                    if op == 'create':
+                        item['writes'] = [('set', poi_ref, to_document(entry))]
+                    elif op == 'update':
+                        item['writes'] = [('update', poi_ref, to_document(entry))]
+                        item['mustExist'] = poi_ref
+                    else:
+                        item['writes'] = [('delete', poi_ref, None)]
+                        item['mustExist'] = poi_ref
+                items.append(item)
+
+        results = apply_bulk(db, items)
+        succeeded = sum(r['status'] == 'ok' for r in results)
+        if succeeded:
+            cache.invalidate(building_id)
+            record_changes(db, building_id, [change('poi', r['id'], floor_id, deleted=r['op'] == 'delete')
+                                             for r in results if r['status'] == 'ok'])
+
+        return jsonify({
+            "results": results,
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded
+        }), 200 if succeeded == len(results) else 207
+
+    except Exception as e:
+        print(f"Error in bulk POI write: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
 @POIs_bp.route('POI_info/<building_id>/<poi_id>', methods=['GET'])
 def get_POI(building_id, poi_id):
     if not building_id:
@@ -161,27 +248,40 @@ def get_POI(building_id, poi_id):
         return jsonify({"error": "Database not initialized."}), 500
 
     try:
-        # Query across all floors for the given POI
-        floor_query = db.collection('buildings').document(building_id).collection('floors')
-        for floor_doc in floor_query.stream():
-            poi_doc_ref = floor_doc.reference.collection('POIs').document(poi_id)
-            poi_snapshot = poi_doc_ref.get()
-            if poi_snapshot.exists:
-                query_result = poi_snapshot.to_dict()
-                query_result['id'] = poi_snapshot.id
-                query_result['floor'] = floor_doc.get('floor')
-                for key, value in query_result.items():
-                    if isinstance(value, GeoPoint):
-                        query_result[key] = [value.latitude, value.longitude]
-                return jsonify(query_result), 200
-
-        # If the loop finishes without finding the POI
-        return jsonify({"error": f"Cannot find poi id: {poi_id} for building {building_id}."}), 404
+        query_result = cache.get_or_load(building_id, f'poi:{poi_id}', lambda: load_POI(building_id, poi_id))
+        if query_result is None:
+            return jsonify({"error": f"Cannot find poi id: {poi_id} for building {building_id}."}), 404
+
+        return jsonify(query_result), 200
 
     except Exception as e:
         print(f"An error occurred during query: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+
+def load_POI(building_id, poi_id):
+    # Look the POI up on every floor with a single batched read
+    floor_query = db.collection('buildings').document(building_id).collection('floors')
+    floor_docs = list(floor_query.stream())
+    poi_refs = [floor_doc.reference.collection('POIs').document(poi_id) for floor_doc in floor_docs]
+    if not poi_refs:
+        return None
+
+    snapshots = {snapshot.reference.path: snapshot for snapshot in db.get_all(poi_refs)}
+    for floor_doc, poi_ref in zip(floor_docs, poi_refs):
+        poi_snapshot = snapshots.get(poi_ref.path)
+        if poi_snapshot is not None and poi_snapshot.exists:
+            query_result = poi_snapshot.to_dict()
+            query_result['id'] = poi_snapshot.id
+            query_result['floor'] = floor_doc.get('floor')
+            for key, value in query_result.items():
+                if isinstance(value, GeoPoint):
+                    query_result[key] = [value.latitude, value.longitude]
+            return query_result
+
+    # If the loop finishes without finding the POI
+    return None
+
 # ===================== NEW: RECOMMENDED POIs ENDPOINTS =====================
 
 
@@ -206,6 +306,8 @@ def set_recommended(building_id, floor_id, poi_id):
             return jsonify({"error": f"POI {poi_id} not found"}), 404
 
         poi_ref.update({'recommended': bool(payload['value'])})
+        cache.invalidate(building_id)
+        record_changes(db, building_id, [change('poi', poi_id, floor_id)])
         return jsonify({
             "status": "success",
             "message": f"POI {poi_id} recommended = {bool(payload['value'])}"
@@ -222,27 +324,11 @@ def list_recommended_on_floor(building_id, floor_id):
     List only recommended POIs for a given floor.
     """
     try:
-        floor_doc_ref = db.collection('buildings').document(building_id) \
-            .collection('floors').document(floor_id)
-        floor_doc = floor_doc_ref.get()
-
-        if not floor_doc.exists:
+        results = cache.get_or_load(building_id, f'recommended:{floor_id}',
+                                    lambda: load_recommended_on_floor(building_id, floor_id))
+        if results is None:
             return jsonify({"error": f"Floor '{floor_id}' not found for building '{building_id}'."}), 404
 
-        pois_ref = floor_doc_ref.collection('POIs')
-        pois_docs = pois_ref.where('recommended', '==', True).stream()
-
-        results = []
-        for doc in pois_docs:
-            poi = doc.to_dict()
-            poi['id'] = doc.id
-            poi['floor'] = floor_doc.get('floor')
-            # convert GeoPoint → [lat, lng] (keep same style as your GET)
-            for k, v in list(poi.items()):
-                if isinstance(v, GeoPoint):
-                    poi[k] = [v.latitude, v.longitude]
-            results.append(poi)
-
         return jsonify(results), 200
 
     except Exception as e:
@@ -250,29 +336,60 @@ def list_recommended_on_floor(building_id, floor_id):
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+def load_recommended_on_floor(building_id, floor_id):
+    floor_doc_ref = db.collection('buildings').document(building_id) \
+        .collection('floors').document(floor_id)
+    floor_doc = floor_doc_ref.get()
+
+    if not floor_doc.exists:
+        return None
+
+    pois_ref = floor_doc_ref.collection('POIs')
+    pois_docs = pois_ref.where('recommended', '==', True).stream()
+
+    results = []
+    for doc in pois_docs:
+        poi = doc.to_dict()
+        poi['id'] = doc.id
+        poi['floor'] = floor_doc.get('floor')
+        # convert GeoPoint → [lat, lng] (keep same style as your GET)
+        for k, v in list(poi.items()):
+            if isinstance(v, GeoPoint):
+                poi[k] = [v.latitude, v.longitude]
+        results.append(poi)
+    return results
+
+
 @POIs_bp.route('/<building_id>/recommended', methods=['GET'])
 def list_recommended_in_building(building_id):
     """
     (Optional) List recommended POIs across ALL floors in a building.
     """
     try:
-        floors_ref = db.collection('buildings').document(building_id).collection('floors')
-        results = []
-
-        for floor_doc in floors_ref.stream():
-            pois_ref = floor_doc.reference.collection('POIs')
-            for poi_doc in pois_ref.where('recommended', '==', True).stream():
-                poi = poi_doc.to_dict()
-                poi['id'] = poi_doc.id
-                poi['floor'] = floor_doc.get('floor')
-                for k, v in list(poi.items()):
-                    if isinstance(v, GeoPoint):
-                        poi[k] = [v.latitude, v.longitude]
-                results.append(poi)
-
+        results = cache.get_or_load(building_id, 'recommended', lambda: load_recommended_in_building(building_id))
         return jsonify(results), 200
 
     except Exception as e:
         print(f"Error listing building recommended POIs: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
+
+
+def load_recommended_in_building(building_id):
+    floors_ref = db.collection('buildings').document(building_id).collection('floors')
+    floor_docs = list(floors_ref.stream())
+
+    def recommended_on(floor_doc):
+        return list(floor_doc.reference.collection('POIs').where('recommended', '==', True).stream())
+
+    results = []
+    for floor_doc, poi_docs in zip(floor_docs, fan_out(recommended_on, floor_docs)):
+        for poi_doc in poi_docs:
+            poi = poi_doc.to_dict()
+            poi['id'] = poi_doc.id
+            poi['floor'] = floor_doc.get('floor')
+            for k, v in list(poi.items()):
+                if isinstance(v, GeoPoint):
+                    poi[k] = [v.latitude, v.longitude]
+            results.append(poi)
+    return results
 # =================== END NEW: RECOMMENDED POIs ENDPOINTS ====================
@@ -1,9 +1,41 @@
-import datetime
+import math
+import time
 from flask import Blueprint, request, jsonify
-from app import db
+from app import db, cache
 from google.cloud.firestore import GeoPoint
+from cascade_delete import stale_index_entries
+from firestore_fanout import apply_bulk, commit_batched, fan_out
+from gps_log_store import FLUSH_READINGS, FLUSH_SECONDS, bucket_writes, parse_timestamp
+from log_ingest import LogWriter, QueueFull
+from http_cache import conditional_get
+from responses import list_response
+from sync_log import change, record_changes
 
 beacons_bp = Blueprint('Beacons', __name__)
+beacons_bp.after_request(conditional_get)
+
+# beacon_index/{beaconId} -> {"buildingId", "floorId"}, kept in step with every beacon write
+BEACON_INDEX = 'beacon_index'
+
+
+# GPS readings from /beaconLog are written to the hourly gps_log_buckets by a background writer
+gps_log_writer = LogWriter(db, lambda records: bucket_writes(db, records),
+                           flush_interval=FLUSH_SECONDS, batch_limit=FLUSH_READINGS)
+MAX_BULK_READINGS = 5000
+LOG_RETRY_AFTER = 5  # seconds, sent with 503 when the writer cannot keep up
+
+
+def beacon_index_ref(beacon_id):
+    return db.collection(BEACON_INDEX).document(beacon_id)
+
+
+def owned_index_entries(building_id, floor_id, beacon_ids):
+    """
+    IDs of the beacon_index entries that point at this floor; an ID re-registered on another
+    floor meanwhile keeps its entry when the old beacon is deleted.
+    """
+    refs = stale_index_entries(db, BEACON_INDEX, beacon_ids, {"buildingId": building_id, "floorId": floor_id})
+    return {ref.id for ref in refs}
 
 
 # --------------------------
@@ -19,38 +51,46 @@ def get_beacons(building_id, floor_id):
         return jsonify({"error": "Database not initialized."}), 500
 
     try:
-        floor_ref = db.collection('buildings').document(building_id) \
-            .collection('floors').document(floor_id)
-        floor_doc = floor_ref.get()  # Get the floor document itself
-
-        if not floor_doc.exists:
+        beacons = cache.get_or_load(building_id, f'beacons:{floor_id}',
+                                    lambda: load_floor_beacons(building_id, floor_id))
+        if beacons is None:
             return jsonify({"error": f"Floor '{floor_id}' not found in building '{building_id}'."}), 404
 
-        floor_data = floor_doc.to_dict()
-        floor_number = floor_data.get('floor')  # Get the floor number
+        return list_response(beacons), 200
+
+    except Exception as e:
+        print(f"Error fetching beacons: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
 
-        beacons_ref = floor_ref.collection('beacons')
-        beacon_docs = beacons_ref.stream()
 
-        beacons = []
-        for doc in beacon_docs:
-            beacon_data = doc.to_dict()
-            beacon_data['beaconId'] = doc.id
-            beacon_data['name'] = beacon_data.get('name', '')
-            if 'latLng' in beacon_data and isinstance(beacon_data['latLng'], GeoPoint):
-                beacon_data['latLng'] = [beacon_data['latLng'].latitude, beacon_data['latLng'].longitude]
+def load_floor_beacons(building_id, floor_id):
+    floor_ref = db.collection('buildings').document(building_id) \
+        .collection('floors').document(floor_id)
+    floor_doc = floor_ref.get()  # Get the floor document itself
 
-            # --- ADD FLOOR NUMBER ---
-            beacon_data['floorNumber'] = floor_number  # Add the floor number
-            # --- END ADD ---
+    if not floor_doc.exists:
+        return None
 
-            beacons.append(beacon_data)
+    floor_data = floor_doc.to_dict()
+    floor_number = floor_data.get('floor')  # Get the floor number
 
-        return jsonify(beacons), 200
+    beacons_ref = floor_ref.collection('beacons')
+    beacon_docs = beacons_ref.stream()
 
-    except Exception as e:
-        print(f"Error fetching beacons: {e}")
-        return jsonify({"status": "error", "message": str(e)}), 500
+    beacons = []
+    for doc in beacon_docs:
+        beacon_data = doc.to_dict()
+        beacon_data['beaconId'] = doc.id
+        beacon_data['name'] = beacon_data.get('name', '')
+        if 'latLng' in beacon_data and isinstance(beacon_data['latLng'], GeoPoint):
+            beacon_data['latLng'] = [beacon_data['latLng'].latitude, beacon_data['latLng'].longitude]
+
+        # --- ADD FLOOR NUMBER ---
+        beacon_data['floorNumber'] = floor_number  # Add the floor number
+        # --- END ADD ---
+
+        beacons.append(beacon_data)
+    return beacons
 
 
 # --------------------------
@@ -64,37 +104,40 @@ def get_all_building_beacons(building_id):
         return jsonify({"error": "Database not initialized."}), 500
 
     try:
-        all_beacons = []
-        floors_ref = db.collection('buildings').document(building_id).collection('floors')
-        all_floor_docs = floors_ref.stream()
+        all_beacons = cache.get_or_load(building_id, 'beacons', lambda: load_building_beacons(building_id))
+        return list_response(all_beacons), 200
 
-        for floor_doc in all_floor_docs:
-            floor_data = floor_doc.to_dict()
-            floor_id = floor_doc.id
-            floor_number = floor_data.get('floor')  # Get floor number
+    except Exception as e:
+        print(f"Error fetching all building beacons: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
 
-            # Get beacons for this specific floor
-            beacons_ref = floor_doc.reference.collection('beacons')
-            beacon_docs = beacons_ref.stream()
 
-            for beacon_doc in beacon_docs:
-                beacon_data = beacon_doc.to_dict()
-                beacon_data['beaconId'] = beacon_doc.id
-                beacon_data['name'] = beacon_data.get('name', '')
-                if 'latLng' in beacon_data and isinstance(beacon_data['latLng'], GeoPoint):
-                    beacon_data['latLng'] = [beacon_data['latLng'].latitude, beacon_data['latLng'].longitude]
+def load_building_beacons(building_id):
+    all_beacons = []
+    floors_ref = db.collection('buildings').document(building_id).collection('floors')
+    all_floor_docs = list(floors_ref.stream())
 
-                # --- ADD FLOOR NUMBER ---
-                beacon_data['floorNumber'] = floor_number  # Add the floor number
-                # --- END ADD ---
+    # Get every floor's beacons concurrently, merged back in floor order
+    beacon_docs_per_floor = fan_out(lambda floor_doc: list(floor_doc.reference.collection('beacons').stream()),
+                                    all_floor_docs)
 
-                all_beacons.append(beacon_data)
+    for floor_doc, beacon_docs in zip(all_floor_docs, beacon_docs_per_floor):
+        floor_data = floor_doc.to_dict()
+        floor_number = floor_data.get('floor')  # Get floor number
 
-        return jsonify(all_beacons), 200
+        for beacon_doc in beacon_docs:
+            beacon_data = beacon_doc.to_dict()
+            beacon_data['beaconId'] = beacon_doc.id
+            beacon_data['name'] = beacon_data.get('name', '')
+            if 'latLng' in beacon_data and isinstance(beacon_data['latLng'], GeoPoint):
+                beacon_data['latLng'] = [beacon_data['latLng'].latitude, beacon_data['latLng'].longitude]
 
-    except Exception as e:
-        print(f"Error fetching all building beacons: {e}")
-        return jsonify({"status": "error", "message": str(e)}), 500
+            # --- ADD FLOOR NUMBER ---
+            beacon_data['floorNumber'] = floor_number  # Add the floor number
+            # --- END ADD ---
+
+            all_beacons.append(beacon_data)
+    return all_beacons
 
 
 # --------------------------
@@ -115,10 +158,15 @@ def add_beacon(building_id, floor_id):
             .collection('floors').document(floor_id)\
             .collection('beacons').document(beacon_id)
 
-        beacon_ref.set({
+        batch = db.batch()
+        batch.set(beacon_ref, {
             "latLng": GeoPoint(lat, lng),
             "name": name
         })
+        batch.set(beacon_index_ref(beacon_id), {"buildingId": building_id, "floorId": floor_id})
+        batch.commit()
+        cache.invalidate(building_id)
+        record_changes(db, building_id, [change('beacon', beacon_id, floor_id)])
 
         return jsonify({"status": "success", "message": f"Beacon {beacon_id} added."}), 201
     except Exception as e:
@@ -152,7 +200,13 @@ def update_beacon(building_id, floor_id, beacon_id):
         if not beacon_ref.get().exists:
             return jsonify({"error": f"Beacon {beacon_id} not found"}), 404
 
-        beacon_ref.update(update_data)
+        batch = db.batch()
+        batch.update(beacon_ref, update_data)
+        # also backfills beacons written before the index existed
+        batch.set(beacon_index_ref(beacon_id), {"buildingId": building_id, "floorId": floor_id})
+        batch.commit()
+        cache.invalidate(building_id)
+        record_changes(db, building_id, [change('beacon', beacon_id, floor_id)])
 
         return jsonify({"status": "success", "message": f"Beacon {beacon_id} updated."}), 200
     except Exception as e:
@@ -173,12 +227,98 @@ def delete_beacon(building_id, floor_id, beacon_id):
         if not beacon_ref.get().exists:
             return jsonify({"error": f"Beacon {beacon_id} not found"}), 404
 
-        beacon_ref.delete()
+        batch = db.batch()
+        batch.delete(beacon_ref)
+        if owned_index_entries(building_id, floor_id, [beacon_id]):
+            batch.delete(beacon_index_ref(beacon_id))
+        batch.commit()
+        cache.invalidate(building_id)
+        record_changes(db, building_id, [change('beacon', beacon_id, floor_id, deleted=True)])
         return jsonify({"status": "success", "message": f"Beacon {beacon_id} deleted."}), 200
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+# --------------------------
+# BULK add / update / delete beacons of one floor
+# --------------------------
+@beacons_bp.route('/<building_id>/<floor_id>/bulk', methods=['POST'])
+def bulk_beacons(building_id, floor_id):
+    """
+    Creates, updates and deletes many beacons of one floor with batched writes, keeping
+    beacon_index in step exactly like the single-beacon endpoints.
+    Body: {"create": [{"beaconId", "name", "latLng"}], "update": [{"beaconId", "name"?, "latLng"?}],
+           "delete": ["beaconId", ...]}
+    Returns one result per item, with status 207 if any of them failed.
+    """
+    try:
+        data = request.get_json()
+        if not data or not any(data.get(op) for op in ('create', 'update', 'delete')):
+            return jsonify({"error": "Provide 'create', 'update' and/or 'delete' arrays."}), 400
+
+        beacons_ref = db.collection('buildings').document(building_id)\
+            .collection('floors').document(floor_id)\
+            .collection('beacons')
+        index_entry = {"buildingId": building_id, "floorId": floor_id}
+
+        deletes = [b for b in data.get('delete') or [] if isinstance(b, str) and b]
+        owned = owned_index_entries(building_id, floor_id, list(dict.fromkeys(deletes))) if deletes else set()
+
+        items, seen = [], set()
+        for op in ('create', 'update', 'delete'):
+            for entry in data.get(op) or []:
+                beacon_id = entry if op == 'delete' else (entry.get('beaconId') if isinstance(entry, dict) else None)
+                item = {"op": op, "id": beacon_id}
+                if not isinstance(beacon_id, str) or not beacon_id:
+                    item['error'] = "Each beacon must have a 'beaconId'."
+                elif beacon_id in seen:
+                    item['error'] = f"Beacon {beacon_id} appears more than once in this request."
+                elif op == 'create' and ('latLng' not in entry or 'name' not in entry):
+                    item['error'] = "Beacon must have 'beaconId', 'name', and 'latLng' [lat, lng]."
+                elif op == 'update' and 'latLng' not in entry and 'name' not in entry:
+                    item['error'] = "Nothing to update. Provide 'latLng' or 'name'."
+                elif op != 'delete' and 'latLng' in entry and \
+                        not (isinstance(entry['latLng'], list) and len(entry['latLng']) == 2):
+                    item['error'] = "'latLng' must be [lat, lng]."
+                else:
+                    seen.add(beacon_id)
+                    beacon_ref = beacons_ref.document(beacon_id)
+                    if op == 'delete':
+                        item['writes'] = [('delete', beacon_ref, None)]
+                        if beacon_id in owned:
+                            item['writes'].append(('delete', beacon_index_ref(beacon_id), None))
+                        item['mustExist'] = beacon_ref
+                    else:
+                        fields = {}
+                        if 'latLng' in entry:
+                            lat, lng = entry['latLng']
+                            fields['latLng'] = GeoPoint(lat, lng)
+                        if 'name' in entry:
+                            fields['name'] = entry['name']
+                        item['writes'] = [('set' if op == 'create' else 'update', beacon_ref, fields),
+                                          ('set', beacon_index_ref(beacon_id), index_entry)]
+                        if op == 'update':
+                            item['mustExist'] = beacon_ref
+                items.append(item)
+
+        results = apply_bulk(db, items)
+        succeeded = sum(r['status'] == 'ok' for r in results)
+        if succeeded:
+            cache.invalidate(building_id)
+            record_changes(db, building_id, [change('beacon', r['id'], floor_id, deleted=r['op'] == 'delete')
+                                             for r in results if r['status'] == 'ok'])
+
+        return jsonify({
+            "results": results,
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded
+        }), 200 if succeeded == len(results) else 207
+
+    except Exception as e:
+        print(f"Error in bulk beacon write: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
 # --------------------------
 # LOG beacon data (GPS logs)
 # --------------------------
@@ -192,27 +332,93 @@ def logBeaconData():
         if not all([sensor_id, lat, lon]):
             return jsonify({"error": "Missing sensorID, lat, or lon"}), 400
 
-        doc_ref = db.collection('gps_logs').document()
-        gps_data = {
+        # queued for the background writer instead of a Firestore round trip per ping
+        gps_log_writer.submit([{
             'sensor_id': sensor_id,
             'latitude': lat,
             'longitude': lon,
-            'timestamp': datetime.datetime.utcnow()
-        }
-        doc_ref.set(gps_data)
+            'timestamp': time.time()
+        }])
 
         return jsonify({"status": "success", "message": "GPS data logged"}), 200
 
+    except QueueFull as e:
+        return log_backpressure(e)
     except Exception as e:
         print(f"An error occurred: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+def log_backpressure(e):
+    response = jsonify({"status": "error", "message": f"Log ingestion is overloaded, retry later. {e}"})
+    response.headers['Retry-After'] = str(LOG_RETRY_AFTER)
+    return response, 503
+
+
+@beacons_bp.route('/beaconLog/bulk', methods=['POST'])
+def log_beacon_data_bulk():
+    """
+    Logs many GPS readings with one request, e.g. what a device buffered while offline.
+    Body: {"readings": [{"sensorID": "...", "lat": 18.79, "lon": 98.95, "timestamp": 1718000000.5}, ...]}
+    'timestamp' (epoch seconds or ISO 8601) is optional and defaults to the time of the request.
+    Valid readings are queued even if others are rejected; 'rejected' lists the invalid ones by index.
+    """
+    try:
+        payload = request.get_json(silent=True) or {}
+        readings = payload.get('readings')
+        if not isinstance(readings, list) or not readings:
+            return jsonify({"error": "Body must include a non-empty 'readings' array."}), 400
+        if len(readings) > MAX_BULK_READINGS:
+            return jsonify({"error": f"At most {MAX_BULK_READINGS} readings per request."}), 413
+
+        now = time.time()
+        valid, rejected = [], []
+        for i, reading in enumerate(readings):
+            try:
+                sensor_id = reading.get('sensorID')
+                lat, lon = float(reading['lat']), float(reading['lon'])
+                if not sensor_id or not (math.isfinite(lat) and math.isfinite(lon)):
+                    raise ValueError("sensorID, lat and lon are required")
+                timestamp = parse_timestamp(reading['timestamp']) if reading.get('timestamp') is not None else now
+            except KeyError as e:
+                rejected.append({"index": i, "message": f"Missing {e.args[0]}"})
+                continue
+            except (AttributeError, TypeError, ValueError) as e:
+                rejected.append({"index": i, "message": str(e) or "Invalid reading"})
+                continue
+            valid.append({'sensor_id': str(sensor_id), 'latitude': lat, 'longitude': lon, 'timestamp': timestamp})
+
+        if valid:
+            gps_log_writer.submit(valid)
+
+        return jsonify({
+            "status": "success" if not rejected else "partial",
+            "accepted": len(valid),
+            "rejected": rejected
+        }), 202 if valid else 400
+
+    except QueueFull as e:
+        return log_backpressure(e)
+    except Exception as e:
+        print(f"Error in bulk GPS log: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@beacons_bp.route('/beaconLog/stats', methods=['GET'])
+def log_ingest_stats():
+    """
+    This worker's log ingestion counters: queued, written, spilled (to local disk), replayed
+    (from disk), rejected, failedCommits and spillBytes.
+    """
+    return jsonify(gps_log_writer.stats()), 200
+
+
 @beacons_bp.route('/<beacon_id>/get_buildingId', methods=['GET'])
 def get_beacon_info(beacon_id):
     """
-    Finds a beacon by its document ID across all buildings/floors
+    Looks a beacon up by its document ID in the beacon index
     and returns the buildingId it belongs to.
+    Beacons the index does not have yet are searched for across all buildings/floors.
     """
     if not beacon_id:
         return jsonify({"error": "Missing 'beacon_id' parameter."}), 400
@@ -220,21 +426,123 @@ def get_beacon_info(beacon_id):
         return jsonify({"error": "Database not initialized."}), 500
 
     try:
-        # Use collection group to find a document with this ID
-        beacons_ref = db.collection_group('beacons')
-        beacon_docs = beacons_ref.stream()
+        # Single document read for every indexed beacon
+        index_doc = beacon_index_ref(beacon_id).get()
+        if index_doc.exists:
+            return jsonify({"buildingId": index_doc.get('buildingId')}), 200
 
-        for doc in beacon_docs:
-            if doc.id == beacon_id:
-                # Path example: buildings/{buildingId}/floors/{floorId}/beacons/{beaconId}
-                path_parts = doc.reference.path.split('/')
-                if len(path_parts) >= 2 and path_parts[0] == 'buildings':
-                    building_id = path_parts[1]
-                    return jsonify({"buildingId": building_id}), 200
-
-        # If not found
-        return jsonify({"error": f"Beacon '{beacon_id}' not found."}), 404
+        location = find_unindexed([beacon_id]).get(beacon_id)
+        if location is None:
+            return jsonify({"error": f"Beacon '{beacon_id}' not found."}), 404
+        return jsonify({"buildingId": location['buildingId']}), 200
 
     except Exception as e:
         print(f"Error fetching beacon info: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
+
+
+def find_unindexed(beacon_ids):
+    """
+    Locations of beacons stored before beacon_index existed, found the way lookups worked before
+    it (a scan of every floor's beacons) and added to the index, so the next lookup is one read.
+
+    Returns:
+        dict: {beaconId: {"buildingId", "floorId"}} of the IDs found.
+    """
+    wanted, found = set(beacon_ids), {}
+    for doc in db.collection_group('beacons').stream():
+        if doc.id in wanted and doc.id not in found:
+            location = beacon_location(doc.reference.path)
+            if location is not None:
+                found[doc.id] = location
+                if len(found) == len(wanted):
+                    break
+    for error in commit_batched(db, [[('set', beacon_index_ref(beacon_id), location)]
+                                     for beacon_id, location in found.items()]):
+        if error:
+            print(f"Could not add a beacon to the index: {error}")
+    return found
+
+
+def beacon_location(path):
+    # Path example: buildings/{buildingId}/floors/{floorId}/beacons/{beaconId}
+    path_parts = path.split('/')
+    if len(path_parts) == 6 and path_parts[0] == 'buildings' and path_parts[2] == 'floors':
+        return {"buildingId": path_parts[1], "floorId": path_parts[3]}
+    return None
+
+
+@beacons_bp.route('/get_buildingIds', methods=['POST'])
+def get_beacons_info():
+    """
+    Resolves many scanned beacon IDs with one batched read of the beacon index.
+    Body: {"beaconIds": ["id1", "id2", ...]}
+    Returns: {"id1": {"buildingId": ..., "floorId": ...}, ...}; unknown IDs are left out.
+    """
+    if db is None:
+        return jsonify({"error": "Database not initialized."}), 500
+
+    try:
+        payload = request.get_json() or {}
+        beacon_ids = payload.get('beaconIds')
+        if not isinstance(beacon_ids, list):
+            return jsonify({"error": "Body must include a 'beaconIds' array."}), 400
+
+        beacon_ids = list(dict.fromkeys(beacon_ids))
+        if not beacon_ids:
+            return jsonify({}), 200
+
+        results = {}
+        for snapshot in db.get_all([beacon_index_ref(beacon_id) for beacon_id in beacon_ids]):
+            if snapshot.exists:
+                results[snapshot.id] = {"buildingId": snapshot.get('buildingId'), "floorId": snapshot.get('floorId')}
+
+        return jsonify(results), 200
+
+    except Exception as e:
+        print(f"Error fetching beacons info: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@beacons_bp.route('/rebuild_index', methods=['POST'])
+def rebuild_beacon_index():
+    """
+    Rewrites beacon_index from every stored beacon and removes the entries of beacons that
+    no longer exist. Needed once for beacons created before the index existed (until then the
+    single lookup falls back to a scan and the batched one does not find them); afterwards the
+    write handlers keep it current.
+    """
+    if db is None:
+        return jsonify({"error": "Database not initialized."}), 500
+
+    try:
+        indexed, written = set(), 0
+        batch = db.batch()
+        for doc in db.collection_group('beacons').stream():
+            location = beacon_location(doc.reference.path)
+            if location is None:
+                continue
+            batch.set(beacon_index_ref(doc.id), location)
+            indexed.add(doc.id)
+            written += 1
+            if written % 500 == 0:  # Firestore's per-batch write limit
+                batch.commit()
+                batch = db.batch()
+
+        removed = 0
+        for ref in db.collection(BEACON_INDEX).list_documents():
+            if ref.id in indexed:
+                continue
+            batch.delete(ref)
+            removed += 1
+            written += 1
+            if written % 500 == 0:
+                batch.commit()
+                batch = db.batch()
+        batch.commit()
+
+        return jsonify({"status": "success", "indexed": len(indexed), "removed": removed}), 200
+
+    except Exception as e:
+        print(f"Error rebuilding beacon index: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
@@ -1,9 +1,16 @@
 from flask import Blueprint, request, jsonify
 from google.cloud.firestore_v1 import GeoPoint
 
-from app import db
+from app import db, bucket, cache
+from cascade_delete import start_cascade_delete
+from firestore_fanout import fan_out
+from http_cache import conditional_get
+from snapshot_cache import ALL_BUILDINGS
+from sync_log import change, record_changes
+from blueprints.beacon import BEACON_INDEX
 
 building_bp = Blueprint('building', __name__)
+building_bp.after_request(conditional_get)
 
 
 @building_bp.route('', methods=['GET'])
@@ -11,29 +18,7 @@ def get_buildings():
     if db is None:
         return jsonify({"error": "Database not initialized."}), 500
     try:
-        building_ref = db.collection('buildings')
-        building_docs = list(building_ref.stream())
-        buildings = []
-        for doc in building_docs:
-            building_data = doc.to_dict()
-            building_data['id'] = doc.id
-
-            for key, value in building_data.items():
-                if isinstance(value, GeoPoint):
-                    building_data[key] = [value.latitude, value.longitude]
-
-            floors_ref = doc.reference.collection('floors')
-            floor_docs = list(floors_ref.stream())
-
-            floors = []
-            for floor_doc in floor_docs:
-                floor_data = floor_doc.to_dict()
-                floor_data['id'] = floor_doc.id
-                floors.append(floor_data)
-
-            building_data['floors'] = sorted(floors, key=lambda x: x['floor'])
-            buildings.append(building_data)
-
+        buildings = cache.get_or_load(ALL_BUILDINGS, 'buildings', load_buildings)
         return jsonify(buildings), 200
 
     except Exception as e:
@@ -41,40 +26,42 @@ def get_buildings():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
-@building_bp.route('/<building_id>', methods=['GET'])
-def get_building_with_floors(building_id):
-    if db is None:
-        return jsonify({"error": "Database not initialized."}), 500
+def load_buildings():
+    building_ref = db.collection('buildings')
+    building_docs = list(building_ref.stream())
 
-    try:
-        building_ref = db.collection('buildings').document(building_id)
-        building_doc = building_ref.get()
-
-        if not building_doc.exists:
-            return jsonify({"error": "Building not found."}), 404
+    # one floors query per building, issued concurrently instead of back to back
+    floors_per_building = fan_out(lambda doc: list(doc.reference.collection('floors').stream()), building_docs)
 
-        building_data = building_doc.to_dict()
+    buildings = []
+    for doc, floor_docs in zip(building_docs, floors_per_building):
+        building_data = doc.to_dict()
+        building_data['id'] = doc.id
 
         for key, value in building_data.items():
             if isinstance(value, GeoPoint):
                 building_data[key] = [value.latitude, value.longitude]
 
-        floor_ref = building_ref.collection('floors')
-        floor_docs = list(floor_ref.stream())
         floors = []
-        for doc in floor_docs:
-            log_data = doc.to_dict()
-            log_data['id'] = doc.id
-            floors.append(log_data)
-
-        sorted_floors = sorted(floors, key=lambda x: x['floor'])
-        response = {
-            'id': building_ref.id,
-            'name': building_data.get('name', '< Unnamed Building >'),
-            'NE_bound': building_data.get('NE_bound', [0, 0]),
-            'SW_bound': building_data.get('SW_bound', [0, 0]),
-            'floors': sorted_floors
-        }
+        for floor_doc in floor_docs:
+            floor_data = floor_doc.to_dict()
+            floor_data['id'] = floor_doc.id
+            floors.append(floor_data)
+
+        building_data['floors'] = sorted(floors, key=lambda x: x['floor'])
+        buildings.append(building_data)
+    return buildings
+
+
+@building_bp.route('/<building_id>', methods=['GET'])
+def get_building_with_floors(building_id):
+    if db is None:
+        return jsonify({"error": "Database not initialized."}), 500
+
+    try:
+        response = cache.get_or_load(building_id, 'building', lambda: load_building_with_floors(building_id))
+        if response is None:
+            return jsonify({"error": "Building not found."}), 404
         return jsonify(response), 200
 
     except Exception as e:
@@ -82,6 +69,37 @@ def get_building_with_floors(building_id):
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+def load_building_with_floors(building_id):
+    building_ref = db.collection('buildings').document(building_id)
+    building_doc = building_ref.get()
+
+    if not building_doc.exists:
+        return None
+
+    building_data = building_doc.to_dict()
+
+    for key, value in building_data.items():
+        if isinstance(value, GeoPoint):
+            building_data[key] = [value.latitude, value.longitude]
+
+    floor_ref = building_ref.collection('floors')
+    floor_docs = list(floor_ref.stream())
+    floors = []
+    for doc in floor_docs:
+        log_data = doc.to_dict()
+        log_data['id'] = doc.id
+        floors.append(log_data)
+
+    sorted_floors = sorted(floors, key=lambda x: x['floor'])
+    return {
+        'id': building_ref.id,
+        'name': building_data.get('name', '< Unnamed Building >'),
+        'NE_bound': building_data.get('NE_bound', [0, 0]),
+        'SW_bound': building_data.get('SW_bound', [0, 0]),
+        'floors': sorted_floors
+    }
+
+
 @building_bp.route('', methods=['POST'])
 def add_building():
     if db is None:
@@ -104,7 +122,9 @@ def add_building():
         floor_data = {
             'floor': 1
         }
-        building_ref.collection('floors').add(floor_data)
+        _, floor_ref = building_ref.collection('floors').add(floor_data)
+        cache.invalidate(building_ref.id)
+        record_changes(db, building_ref.id, [change('building', building_ref.id), change('floor', floor_ref.id)])
 
         return jsonify({
             "message": "Building and first floor added successfully.",
@@ -131,13 +151,16 @@ def delete_building(building_id):
         if not building.exists:
             return jsonify({"error": "Building not found."}), 404
 
-        floors_ref = building_ref.collection('floors')
-        floors_docs = floors_ref.stream()
-        for doc in floors_docs:
-            doc.reference.delete()
-
-        building_ref.delete()
-        return jsonify({"message": "Building deleted successfully."}), 200
+        # floors, their POIs / beacons / path nodes and the POI images go in a background job
+        job = start_cascade_delete(db, bucket, building_ref, f"building {building_id}",
+                                   index_collection=BEACON_INDEX, owner={"buildingId": building_id},
+                                   on_finish=lambda: cache.invalidate(building_id))
+        cache.invalidate(building_id)
+        return jsonify({
+            "message": f"Deleting building {building_id} and its data.",
+            "jobId": job.id,
+            "statusUrl": f"/jobs/{job.id}"
+        }), 202
     except Exception as e:
         print(f"An error occurred: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -0,0 +1,15 @@
+from flask import Blueprint, jsonify
+from app import cache
+
+cache_bp = Blueprint('cache', __name__)
+
+
+@cache_bp.route('/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(cache.stats()), 200
+
+
+@cache_bp.route('/<building_id>', methods=['DELETE'])
+def invalidate_building_cache(building_id):
+    cache.invalidate(building_id)
+    return jsonify({"message": f"Cached snapshots of building {building_id} dropped."}), 200
@@ -1,8 +1,13 @@
 from flask import Blueprint, request, jsonify
-from app import db, bucket
+from app import db, bucket, cache
 from google.cloud.firestore import GeoPoint
+from cascade_delete import start_cascade_delete
+from http_cache import conditional_get
+from sync_log import ALL, change, record_changes
+from blueprints.beacon import BEACON_INDEX
 
 floors_bp = Blueprint('floors', __name__)
+floors_bp.after_request(conditional_get)
 
 
 @floors_bp.route('/<building_id>/floors', methods=['GET'])
@@ -11,16 +16,7 @@ def get_all_floor(building_id):
         return jsonify({"error": "Database not initialized."}), 500
 
     try:
-        building_ref = db.collection('buildings').document(building_id)
-        floor_ref = building_ref.collection('floors')
-        floor_docs = list(floor_ref.stream())
-        floors = []
-        for doc in floor_docs:
-            log_data = doc.to_dict()
-            log_data['id'] = doc.id
-            floors.append(log_data)
-
-        sorted_floors = sorted(floors, key=lambda x: x['floor'])
+        sorted_floors = cache.get_or_load(building_id, 'floors', lambda: load_floors(building_id))
         return jsonify(sorted_floors), 200
 
     except Exception as e:
@@ -28,6 +24,19 @@ def get_all_floor(building_id):
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+def load_floors(building_id):
+    building_ref = db.collection('buildings').document(building_id)
+    floor_ref = building_ref.collection('floors')
+    floor_docs = list(floor_ref.stream())
+    floors = []
+    for doc in floor_docs:
+        log_data = doc.to_dict()
+        log_data['id'] = doc.id
+        floors.append(log_data)
+
+    return sorted(floors, key=lambda x: x['floor'])
+
+
 @floors_bp.route('/<building_id>/floors', methods=['POST'])
 def add_floor_plan(building_id):
     if db is None:
@@ -44,6 +53,8 @@ def add_floor_plan(building_id):
         building_ref = db.collection('buildings').document(building_id)
         floor_ref = building_ref.collection('floors').document(floor_id)
         floor_ref.set(floor_copy)
+        cache.invalidate(building_id)
+        record_changes(db, building_id, [change('floor', floor_id)])
 
         return jsonify({"status": "success", "message": f"Floor {floor_id} added."}), 201
     except Exception as e:
@@ -66,6 +77,8 @@ def update_floor_plan(building_id, floor_id):
         floor_ref = building_ref.collection('floors').document(floor_id)
 
         floor_ref.update({"floor_plan_url": data['floor_plan_url']})
+        cache.invalidate(building_id)
+        record_changes(db, building_id, [change('floor', floor_id)])
 
         return jsonify({"message": f"Floor {floor_id} updated successfully."}), 200
     except Exception as e:
@@ -96,27 +109,31 @@ def delete_floor(building_id, floor_id):
             floors.append(data)
 
         # Sort and shift down floors above the deleted one
-        for floor in floors:
-            if floor['floor'] > target_floor:
-                floors_ref.document(floor['id']).update({"floor": floor['floor'] - 1})
-
-        # --- Cascade delete subcollections ---
+        # the floor document goes in the same batch, so the listing never shows two floors with one number
         floor_doc_ref = floors_ref.document(floor_id)
-
-        def delete_subcollection(subcoll_name):
-            sub_ref = floor_doc_ref.collection(subcoll_name)
-            for doc in sub_ref.stream():
-                doc.reference.delete()
-
-        # Delete known subcollections (POIs, beacons, path_nodes)
-        delete_subcollection("POIs")
-        delete_subcollection("beacons")
-        delete_subcollection("path_nodes")
-
-        # Finally, delete the floor document itself
-        floor_doc_ref.delete()
-
-        return jsonify({"message": f"Floor {floor_id} and its data deleted successfully."}), 200
+        batch = db.batch()
+        batch.delete(floor_doc_ref)
+        shifted = [floor for floor in floors if floor['floor'] > target_floor]
+        for floor in shifted:
+            batch.update(floors_ref.document(floor['id']), {"floor": floor['floor'] - 1})
+        batch.commit()
+        cache.invalidate(building_id)
+        # the POIs and beacons of renumbered floors carry the new floor number
+        record_changes(db, building_id, [change('floor', floor_id, deleted=True)] + [
+            change(kind, entity_id, floor['id'])
+            for floor in shifted for kind, entity_id in (('floor', floor['id']), ('poi', ALL), ('beacon', ALL))])
+
+        # --- Cascade delete the floor, its subcollections and POI images in the background ---
+        job = start_cascade_delete(db, bucket, floor_doc_ref, f"floor {floor_id} of {building_id}",
+                                   index_collection=BEACON_INDEX,
+                                   owner={"buildingId": building_id, "floorId": floor_id},
+                                   on_finish=lambda: cache.invalidate(building_id))
+
+        return jsonify({
+            "message": f"Deleting floor {floor_id} and its data.",
+            "jobId": job.id,
+            "statusUrl": f"/jobs/{job.id}"
+        }), 202
 
     except Exception as e:
         print(f"Error deleting a floor: {e}")
@@ -0,0 +1,144 @@
+import time
+from flask import Blueprint, request, jsonify
+from app import db
+from gps_log_store import RAW_DAYS, RETENTION_DAYS, parse_timestamp, rollup, sensor_rollups, start_compaction, track
+
+gps_logs_bp = Blueprint('gps_logs', __name__)
+
+INTERVALS = {'minute': 60, 'hour': 3600, 'day': 86400}
+# longest ranges served in one request; each hour of a sensor's range is one document read
+MAX_TRACK_DAYS = 31
+MAX_ROLLUP_DAYS = 366
+MAX_SENSOR_ROLLUP_DAYS = 7
+
+
+def query_timestamp(value):
+    try:
+        return float(value)
+    except ValueError:
+        return parse_timestamp(value)
+
+
+def time_range(default_seconds, max_days):
+    """
+    The [start, end) range from the 'start' and 'end' query params (epoch seconds or ISO 8601),
+    ending now and spanning ``default_seconds`` when left out.
+
+    Returns:
+        tuple: (start, end, error message or None)
+    """
+    try:
+        end = query_timestamp(request.args['end']) if 'end' in request.args else time.time()
+        start = query_timestamp(request.args['start']) if 'start' in request.args else end - default_seconds
+    except ValueError:
+        return None, None, "'start' and 'end' must be epoch seconds or ISO 8601 timestamps."
+    if end <= start:
+        return None, None, "'end' must be after 'start'."
+    if end - start > max_days * 86400:
+        return None, None, f"The range can span at most {max_days} days."
+    return start, end, None
+
+
+@gps_logs_bp.route('/<path:sensor_id>/track', methods=['GET'])
+def get_track(sensor_id):
+    """
+    A sensor's readings in a time range, oldest first.
+    Query params: start, end (default: the last hour).
+    Returns: {"sensorId", "start", "end", "points": [[t, lat, lon], ...], "bucketsRead"}
+    Readings older than the compaction's raw period come back as one averaged point per minute.
+    """
+    if db is None:
+        return jsonify({"error": "Database not initialized."}), 500
+
+    start, end, error = time_range(3600, MAX_TRACK_DAYS)
+    if error:
+        return jsonify({"error": error}), 400
+
+    try:
+        points, reads = track(db, sensor_id, start, end)
+        return jsonify({"sensorId": sensor_id, "start": start, "end": end, "points": points, "bucketsRead": reads}), 200
+
+    except Exception as e:
+        print(f"Error reading the track of {sensor_id}: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@gps_logs_bp.route('/<path:sensor_id>/rollup', methods=['GET'])
+def get_sensor_rollup(sensor_id):
+    """
+    A sensor's readings summarized per interval.
+    Query params: start, end (default: the last day), interval ('minute' | 'hour' | 'day', default 'hour').
+    Returns: {"sensorId", "interval", "rollups": [{"start", "count", "first", "last", "meanLat",
+    "meanLon", "minLat", "maxLat", "minLon", "maxLon"}, ...], "bucketsRead"}
+    """
+    if db is None:
+        return jsonify({"error": "Database not initialized."}), 500
+
+    interval = request.args.get('interval', 'hour')
+    if interval not in INTERVALS:
+        return jsonify({"error": f"'interval' must be one of {', '.join(INTERVALS)}."}), 400
+    start, end, error = time_range(86400, MAX_ROLLUP_DAYS)
+    if error:
+        return jsonify({"error": error}), 400
+
+    try:
+        rollups, reads = rollup(db, sensor_id, start, end, INTERVALS[interval])
+        return jsonify({"sensorId": sensor_id, "interval": interval, "rollups": rollups, "bucketsRead": reads}), 200
+
+    except Exception as e:
+        print(f"Error rolling up the logs of {sensor_id}: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@gps_logs_bp.route('/rollup', methods=['GET'])
+def get_sensor_rollups():
+    """
+    Every sensor that reported in a time range, with its summary.
+    Query params: start, end (default: the last hour).
+    Returns: {"start", "end", "sensors": {sensorId: {"count", "first", "last", ...}}, "bucketsRead"}
+    """
+    if db is None:
+        return jsonify({"error": "Database not initialized."}), 500
+
+    start, end, error = time_range(3600, MAX_SENSOR_ROLLUP_DAYS)
+    if error:
+        return jsonify({"error": error}), 400
+
+    try:
+        sensors, reads = sensor_rollups(db, start, end)
+        return jsonify({"start": start, "end": end, "sensors": sensors, "bucketsRead": reads}), 200
+
+    except Exception as e:
+        print(f"Error rolling up gps logs: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@gps_logs_bp.route('/compact', methods=['POST'])
+def compact_logs():
+    """
+    Starts the retention job: legacy gps_logs documents are moved into buckets, hours older
+    than 'rawDays' are downsampled to one point per minute and hours older than
+    'retentionDays' are deleted.
+    Body (optional): {"rawDays": 7, "retentionDays": 365}
+    """
+    if db is None:
+        return jsonify({"error": "Database not initialized."}), 500
+
+    try:
+        data = request.get_json(silent=True) or {}
+        raw_days = data.get('rawDays', RAW_DAYS)
+        retention_days = data.get('retentionDays', RETENTION_DAYS)
+        if not all(isinstance(v, (int, float)) and not isinstance(v, bool) and v >= 0
+                   for v in (raw_days, retention_days)) or retention_days < raw_days:
+            return jsonify({"error": "'rawDays' and 'retentionDays' must be numbers with rawDays <= retentionDays."}), 400
+
+        job = start_compaction(db, raw_days, retention_days)
+        return jsonify({
+            "message": "Compacting gps logs.",
+            "jobId": job.id,
+            "statusUrl": f"/jobs/{job.id}"
+        }), 202
+
+    except Exception as e:
+        print(f"Error starting gps log compaction: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
@@ -0,0 +1,12 @@
+from flask import Blueprint, jsonify
+from cascade_delete import get_job
+
+jobs_bp = Blueprint('jobs', __name__)
+
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": f"Job '{job_id}' not found."}), 404
+    return jsonify(job.to_dict()), 200
@@ -1,24 +1,78 @@
 from flask import Blueprint, request, jsonify
-import pandas as pd
 import numpy as np
-from preprocess import preprocess
-import pickle
+from model_registry import ModelNotAvailable, ModelRegistry
+from preprocess import FEATURES, extract_features, extract_features_batch, sliding_windows, window_to_array
+from streaming import StreamingFeatureExtractor
+import threading
+import time
+import uuid
 
 model_bp = Blueprint('model', __name__)
-try:
-    with open('Models/lightGBM-model_v4.pkl', 'rb') as f:
-        model = pickle.load(f)
 
-except FileNotFoundError:
-    print("Error: Model file 'lightGBM-model_v3.pkl' not found.")
-    model = None
+# versions load on first use and reload when their pickle changes on disk
+registry = ModelRegistry('Models')
+if not registry.versions():
+    print("Error: No model files found in 'Models/'.")
+
+ACTION_LABEL = {0: 'Halt', 1: 'Forward', 2: 'Turn'}
+
+# streaming sessions live in this process only; idle ones are dropped after SESSION_TTL seconds
+SESSION_TTL = 300
+sessions = {}
+sessions_lock = threading.Lock()
+
+
+def format_prediction(prob):
+    prediction = int(np.argmax(prob))
+    return {
+        "prediction": prediction,
+        "action": ACTION_LABEL.get(prediction, 'Unknown'),
+        "probability": {
+            "Halt": float(prob[0]),
+            "Forward": float(prob[1]),
+            "Turn": float(prob[2])
+        }
+    }
+
+
+def batch_features(windows, data_interval):
+    """
+    Builds one feature row per window, featurizing equally long windows together.
+
+    Args:
+        windows (list): (n_samples, n_channels) arrays, possibly of different lengths.
+        data_interval (float): Sampling interval in milliseconds.
+
+    Returns:
+        np.ndarray: (len(windows), len(FEATURES)) matrix in the order of ``windows``.
+    """
+    features = np.empty((len(windows), len(FEATURES)))
+    by_length = {}
+    for i, window in enumerate(windows):
+        by_length.setdefault(len(window), []).append(i)
+
+    for indices in by_length.values():
+        features[indices] = extract_features_batch(np.stack([windows[i] for i in indices]), data_interval)
+    return features
+
+
+def resolve_model(payload):
+    """
+    Picks the model for a request: an explicit 'modelVersion', otherwise the configured
+    traffic split, keyed on 'clientId' so one device keeps hitting the same version.
+    """
+    return registry.get(payload.get('modelVersion'), payload.get('clientId'))
+
+
+def predict_features(entry, features):
+    if len(features) == 0:
+        return []
+    probs = entry.predictor.predict_proba(features)
+    return [format_prediction(prob) for prob in probs]
 
 
 @model_bp.route('/predictMovement', methods=['POST'])
 def predictMovement():
-    if model is None:
-        return jsonify({"error": "Model not loaded. Please check the model file path."}), 500
-
     try:
         request_payload = request.get_json()
         if request_payload is None:
@@ -27,26 +81,170 @@ def predictMovement():
         if 'data' not in request_payload:
             return jsonify({"error": "Missing 'data' array in JSON payload."}), 400
 
+        entry = resolve_model(request_payload)
         data_list = request_payload['data']
-        data_df = pd.DataFrame(data_list)
         data_interval = request_payload.get('interval')
-        processed_data = preprocess(data_df, data_interval)
+        features = extract_features(window_to_array(data_list), data_interval)
 
         # Make prediction
-        prob = model.predict_proba(processed_data)[0]
-        prediction = int(np.argmax(prob))
-        action_label = {0: 'Halt', 1: 'Forward', 2: 'Turn'}
-        prediction_label = action_label.get(prediction, 'Unknown')
+        prob = entry.predictor.predict_proba(features)[0]
+        return jsonify({**format_prediction(prob), "modelVersion": entry.version}), 200
+    except ModelNotAvailable as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        return jsonify({
-            "prediction": prediction,
-            "action": prediction_label,
-            "probability": {
-                "Halt": prob[0],
-                "Forward": prob[1],
-                "Turn": prob[2]
+
+@model_bp.route('/predictMovementBatch', methods=['POST'])
+def predictMovementBatch():
+    """
+    Scores many windows with a single predict_proba call.
+    Body: {"interval": 500, "windows": [[sample, ...], ...]}
+       or {"interval": 500, "data": [sample, ...], "window": 10, "stride": 2}
+    """
+    try:
+        request_payload = request.get_json()
+        if request_payload is None:
+            return jsonify({"error": "Invalid JSON data provided."}), 400
+
+        entry = resolve_model(request_payload)
+        data_interval = request_payload.get('interval')
+        if 'windows' in request_payload:
+            windows = [window_to_array(w) for w in request_payload['windows']]
+            if any(len(w) == 0 for w in windows):
+                return jsonify({"error": "Every window must contain at least one sample."}), 400
+        elif 'data' in request_payload:
+            window_size = request_payload.get('window')
+            stride = request_payload.get('stride', window_size)
+            if not isinstance(window_size, int) or not isinstance(stride, int) or window_size <= 0 or stride <= 0:
+                return jsonify({"error": "Streams need positive integer 'window' and 'stride' sizes."}), 400
+            windows = sliding_windows(window_to_array(request_payload['data']), window_size, stride)
+        else:
+            return jsonify({"error": "Provide either a 'windows' array or a 'data' stream."}), 400
+
+        if isinstance(windows, np.ndarray):
+            features = extract_features_batch(windows, data_interval) if len(windows) else []
+        else:
+            features = batch_features(windows, data_interval)
+
+        return jsonify({"predictions": predict_features(entry, features), "modelVersion": entry.version}), 200
+    except ModelNotAvailable as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def expire_idle_sessions():
+    cutoff = time.monotonic() - SESSION_TTL
+    with sessions_lock:
+        for session_id in [sid for sid, s in sessions.items() if s['last_used'] < cutoff]:
+            del sessions[session_id]
+
+
+@model_bp.route('/sessions', methods=['POST'])
+def open_session():
+    """
+    Opens a streaming session that keeps a sliding window on the server.
+    Body: {"interval": 20, "window": 250, "stride": 50}   (window/stride in samples)
+    The model version is chosen when the session opens and kept for its lifetime.
+    """
+    try:
+        payload = request.get_json() or {}
+        window_size = payload.get('window')
+        stride = payload.get('stride', window_size)
+        data_interval = payload.get('interval', 500)
+        if not isinstance(window_size, int) or not isinstance(stride, int) or window_size < 2 or stride <= 0:
+            return jsonify({"error": "Sessions need an integer 'window' of at least 2 and a positive 'stride'."}), 400
+
+        entry = resolve_model(payload)
+        expire_idle_sessions()
+        session_id = uuid.uuid4().hex
+        with sessions_lock:
+            sessions[session_id] = {
+                'version': entry.version,
+                'extractor': StreamingFeatureExtractor(window_size, stride, data_interval),
+                'lock': threading.Lock(),
+                'last_used': time.monotonic()
             }
+
+        return jsonify({
+            "sessionId": session_id,
+            "window": window_size,
+            "stride": stride,
+            "modelVersion": entry.version
+        }), 201
+    except ModelNotAvailable as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@model_bp.route('/sessions/<session_id>/samples', methods=['POST'])
+def push_session_samples(session_id):
+    """
+    Appends only the new samples to a session and returns one prediction per completed stride.
+    Body: {"data": [sample, ...]}
+    """
+    try:
+        with sessions_lock:
+            session = sessions.get(session_id)
+        if session is None:
+            return jsonify({"error": f"Session '{session_id}' not found."}), 404
+
+        payload = request.get_json()
+        if payload is None or 'data' not in payload:
+            return jsonify({"error": "Missing 'data' array in JSON payload."}), 400
+
+        samples = window_to_array(payload['data'])
+        with session['lock']:
+            features = session['extractor'].push(samples)
+            session['last_used'] = time.monotonic()
+            pending = session['extractor'].samples_until_next
+
+        entry = registry.get(session['version'])
+        return jsonify({
+            "predictions": predict_features(entry, features),
+            "samplesUntilNext": pending,
+            "modelVersion": entry.version
         }), 200
+    except ModelNotAvailable as e:
+        return jsonify({"error": str(e)}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+
+@model_bp.route('/sessions/<session_id>', methods=['DELETE'])
+def close_session(session_id):
+    with sessions_lock:
+        session = sessions.pop(session_id, None)
+    if session is None:
+        return jsonify({"error": f"Session '{session_id}' not found."}), 404
+    return jsonify({"message": f"Session {session_id} closed."}), 200
+
+
+@model_bp.route('/versions', methods=['GET'])
+def list_model_versions():
+    return jsonify({
+        "available": registry.versions(),
+        "loaded": registry.loaded_versions(),
+        "routes": {str(v): w for v, w in registry.routes().items()}
+    }), 200
+
+
+@model_bp.route('/routes', methods=['PUT'])
+def set_model_routes():
+    """
+    Sets the traffic split between model versions.
+    Body: {"routes": {"3": 0.1, "4": 0.9}}, or {"routes": null} to send everything to the latest version.
+    """
+    try:
+        payload = request.get_json()
+        if payload is None or 'routes' not in payload:
+            return jsonify({"error": "Body must include 'routes'."}), 400
+
+        registry.set_routes(payload['routes'])
+        return jsonify({"routes": {str(v): w for v, w in registry.routes().items()}}), 200
+    except (ModelNotAvailable, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
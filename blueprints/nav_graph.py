@@ -1,7 +1,23 @@
 from flask import Blueprint, request, jsonify
-from app import db
+from app import db, cache
+from firestore_fanout import fan_out
+from graph_store import load_graph, store_graph
+from http_cache import conditional_get
+from routing import RoutingGraphCache, build_portals, portal_edges
+from sync_log import change, record_changes
+from poi_table import PoiTableCache
+from blueprints.POIs import load_building_POIs
+from blueprints.paths import load_legacy_path
 
 nav_graph_bp = Blueprint('nav_graph', __name__)
+nav_graph_bp.after_request(conditional_get)
+
+# CSR graphs for /route, rebuilt from the cached floor graphs after any write to the building
+routing_graphs = RoutingGraphCache(cache.ttl)
+cache.on_invalidate(routing_graphs.invalidate)
+# POI distance tables over those graphs, updated incrementally from the previous table
+poi_tables = PoiTableCache(cache.ttl)
+cache.on_invalidate(poi_tables.invalidate)
 
 
 @nav_graph_bp.route('/<building_id>/<floor_id>', methods=['POST'])
@@ -18,13 +34,14 @@ def save_or_update_navigation_graph(building_id, floor_id):
         floor_ref = db.collection('buildings').document(building_id).collection('floors').document(floor_id)
 
         # Check if floor exists
-        if not floor_ref.get().exists:
+        floor_doc = floor_ref.get()
+        if not floor_doc.exists:
             return jsonify({"error": f"Floor '{floor_id}' not found in building '{building_id}'."}), 404
 
-        # Update the graph field
-        floor_ref.update({
-            "graph": data,
-        })
+        # Store it as the floor's canonical graph (also served by /paths)
+        store_graph(db, floor_ref, data, floor_doc.to_dict().get('graphStore'))
+        cache.invalidate(building_id)
+        record_changes(db, building_id, [change('graph', floor_id, floor_id)])
 
         return jsonify({"message": "Navigation graph saved successfully."}), 200
 
@@ -39,14 +56,12 @@ def get_navigation_graph(building_id, floor_id):
         return jsonify({"error": "Database not initialized."}), 500
 
     try:
-        floor_ref = db.collection('buildings').document(building_id).collection('floors').document(floor_id)
-        doc = floor_ref.get()
-
-        if not doc.exists:
+        snapshot = cache.get_or_load(building_id, f'graph:{floor_id}',
+                                     lambda: load_navigation_graph(building_id, floor_id))
+        if snapshot is None:
             return jsonify({"error": f"Floor '{floor_id}' not found in building '{building_id}'."}), 404
 
-        floor_data = doc.to_dict()
-        graph = floor_data.get("graph")
+        graph = snapshot["graph"]
 
         if not graph:
             return jsonify({"error": "No navigation graph found for this floor."}), 404
@@ -58,6 +73,58 @@ def get_navigation_graph(building_id, floor_id):
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+def load_navigation_graph(building_id, floor_id):
+    floor_ref = db.collection('buildings').document(building_id).collection('floors').document(floor_id)
+    doc = floor_ref.get()
+
+    if not doc.exists:
+        return None
+
+    return {"graph": load_floor_graph(doc)}
+
+
+def load_floor_graph(floor_doc):
+    """
+    The floor's graph from the graph store, or from the legacy 'graph' field of floors not yet
+    saved since the store was introduced.
+    """
+    graph = load_graph(db, floor_doc)
+    if graph is None:
+        graph = floor_doc.to_dict().get("graph")
+    return graph
+
+
+@nav_graph_bp.route('/<building_id>/migrate-graphs', methods=['POST'])
+def migrate_graphs(building_id):
+    """
+    Moves every floor of the building that has no stored graph yet into the graph store, from its
+    'graph' field or, when that is empty, its 'path_nodes' documents, and removes those copies.
+    """
+    if db is None:
+        return jsonify({"error": "Database not initialized."}), 500
+
+    try:
+        floors_ref = db.collection('buildings').document(building_id).collection('floors')
+        migrated = {}
+        for floor in floors_ref.stream():
+            floor_data = floor.to_dict()
+            if floor_data.get('graphStore'):
+                continue
+            graph = floor_data.get('graph')
+            if not graph or not graph.get('nodes'):
+                graph = load_legacy_path(floor.reference)
+            migrated[floor.id] = store_graph(db, floor.reference, graph)
+
+        if migrated:
+            cache.invalidate(building_id)
+            record_changes(db, building_id, [change('graph', floor_id, floor_id) for floor_id in migrated])
+        return jsonify({"migrated": migrated}), 200
+
+    except Exception as e:
+        print(f"Error migrating navigation graphs: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
 @nav_graph_bp.route('/<building_id>/portal-groups', methods=['GET'])
 def get_portal_groups(building_id):
     """
@@ -68,100 +135,211 @@ def get_portal_groups(building_id):
         return jsonify({"error": "Database not initialized."}), 500
 
     try:
-        portal_names = set()  # Use a set for automatic de-duplication
-        floors_ref = db.collection('buildings').document(building_id).collection('floors')
-        all_floors = floors_ref.stream()
-
-        for floor in all_floors:
-            floor_data = floor.to_dict()
-            graph = floor_data.get("graph")
-
-            if graph and graph.get("nodes"):
-                for node in graph["nodes"]:
-                    if node.get("portalGroup") and node["portalGroup"]:
-                        portal_names.add(node["portalGroup"])
+        portal_names = cache.get_or_load(building_id, 'portal_groups', lambda: load_portal_groups(building_id))
 
         # Return the set as a JSON list
-        return jsonify(list(portal_names)), 200
+        return jsonify(portal_names), 200
 
     except Exception as e:
         print(f"Error fetching portal groups: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+def load_portal_groups(building_id):
+    portal_names = set()  # Use a set for automatic de-duplication
+    all_floors = cache.get_or_load(building_id, 'floor_graphs', lambda: load_floor_graphs(building_id))
+
+    for floor in all_floors:
+        graph = floor["graph"]
+
+        if graph and graph.get("nodes"):
+            for node in graph["nodes"]:
+                if node.get("portalGroup") and node["portalGroup"]:
+                    portal_names.add(node["portalGroup"])
+
+    return list(portal_names)
+
+
 @nav_graph_bp.route('/<building_id>/supergraph', methods=['GET'])
 def get_super_graph(building_id):
     """
-    Fetches all floor graphs for a building, merges them, and
-    connects all nodes that share the same 'portalGroup' name.
+    Fetches all floor graphs for a building and merges them. Nodes sharing a 'portalGroup'
+    name are listed once per group in the 'portals' section, with the group's type and cost:
+    riding from floor a to floor b costs board + (up if b > a else down) * |b - a|.
+
+    Query params:
+        portals (str, optional): 'expanded' also adds an explicit edge between every pair of
+            nodes of a group to the adjacency list, for clients that do not read 'portals'.
     """
     if db is None:
         return jsonify({"error": "Database not initialized."}), 500
 
     try:
-        # 1. Get all floor documents for the building
-        floors_ref = db.collection('buildings').document(building_id).collection('floors')
-        all_floors = floors_ref.stream()
+        super_graph = cache.get_or_load(building_id, 'supergraph', lambda: load_super_graph(building_id))
 
-        super_nodes = []
-        super_adj = {}
-        # This will store: {"Main Stairs": ["f1_stair_id", "f2_stair_id"]}
-        portal_map = {}
+        if request.args.get('portals') == 'expanded':
+            super_graph = expand_portals(super_graph)
 
-        # --- LOOP 1: Merge all graphs and find portals ---
-        for floor in all_floors:
-            floor_data = floor.to_dict()
-            graph = floor_data.get("graph")
+        # Return the final merged graph
+        return jsonify(super_graph), 200
 
-            # Skip floor if it has no graph
-            if not graph or not graph.get("nodes") or not graph.get("adjacencyList"):
-                print(f"Skipping floor {floor.id}, graph data is incomplete.")
-                continue
+    except Exception as e:
+        print(f"Error building super graph: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
 
-            # Add this floor's nodes and edges to the super graph
-            super_nodes.extend(graph.get("nodes", []))
-            super_adj.update(graph.get("adjacencyList", {}))
-
-            # Find all nodes in this graph that are portals
-            for node in graph.get("nodes", []):
-                # Check for the "portalGroup" name
-                if node.get("portalGroup"):
-                    group_name = node["portalGroup"]
-                    node_id = node["id"]
-
-                    # Add this node to the portal map
-                    if group_name not in portal_map:
-                        portal_map[group_name] = []
-                    portal_map[group_name].append(node_id)
-
-        # --- LOOP 2: Connect all portals ---
-        # "Cost" to use stairs/elevator (e.g., 30 seconds)
-        FLOOR_CHANGE_WEIGHT = 30
-
-        for group_name, node_ids in portal_map.items():
-            # Connect every node in this group to every other node in the same group
-            for i in range(len(node_ids)):
-                for j in range(i + 1, len(node_ids)):
-                    node_id_a = node_ids[i]
-                    node_id_b = node_ids[j]
-
-                    # Add edge A -> B
-                    if node_id_a not in super_adj: super_adj[node_id_a] = []
-                    super_adj[node_id_a].append({
-                        "targetNodeId": node_id_b,
-                        "weight": FLOOR_CHANGE_WEIGHT
-                    })
-
-                    # Add edge B -> A
-                    if node_id_b not in super_adj: super_adj[node_id_b] = []
-                    super_adj[node_id_b].append({
-                        "targetNodeId": node_id_a,
-                        "weight": FLOOR_CHANGE_WEIGHT
-                    })
 
-        # Return the final merged graph
-        return jsonify({"nodes": super_nodes, "adjacencyList": super_adj}), 200
+def load_floor_graphs(building_id):
+    floors_ref = db.collection('buildings').document(building_id).collection('floors')
+
+    floors = list(floors_ref.stream())
+    # the floors' chunk reads are independent, fetch them concurrently
+    graphs = fan_out(load_floor_graph, floors)
+
+    return [{"id": floor.id, "floor": floor.to_dict().get("floor"), "graph": graph}
+            for floor, graph in zip(floors, graphs)]
+
+
+def load_super_graph(building_id):
+    # 1. Get all floor graphs for the building
+    all_floors = cache.get_or_load(building_id, 'floor_graphs', lambda: load_floor_graphs(building_id))
+
+    super_nodes = []
+    super_adj = {}
+
+    # Merge all graphs
+    for floor in all_floors:
+        graph = floor["graph"]
+
+        # Skip floor if it has no graph
+        if not graph or not graph.get("nodes") or not graph.get("adjacencyList"):
+            print(f"Skipping floor {floor['id']}, graph data is incomplete.")
+            continue
+
+        # Add this floor's nodes and edges to the super graph
+        super_nodes.extend(graph.get("nodes", []))
+        super_adj.update(graph.get("adjacencyList", {}))
+
+    # Portals stay grouped: linear in the number of portal nodes instead of one edge per pair
+    return {"nodes": super_nodes, "adjacencyList": super_adj, "portals": build_portals(all_floors)}
+
+
+def expand_portals(super_graph):
+    # copies the touched lists, the cached snapshot must stay compact
+    super_adj = dict(super_graph["adjacencyList"])
+    copied = set()
+
+    for node_id_a, node_id_b, weight in portal_edges(super_graph["portals"]):
+        if node_id_a not in copied:
+            super_adj[node_id_a] = list(super_adj.get(node_id_a, []))
+            copied.add(node_id_a)
+        super_adj[node_id_a].append({
+            "targetNodeId": node_id_b,
+            "weight": weight
+        })
+
+    return dict(super_graph, adjacencyList=super_adj)
+
+
+@nav_graph_bp.route('/<building_id>/route', methods=['GET'])
+def get_route(building_id):
+    """
+    Shortest path between two nodes of the building's merged graph, computed server-side.
+
+    Query params:
+        from (str): start node id
+        to (str): destination node id
+
+    Returns the node sequence, the total distance (sum of edge weights) and the floor
+    transitions along the way.
+    """
+    if db is None:
+        return jsonify({"error": "Database not initialized."}), 500
+
+    source_id = request.args.get('from')
+    target_id = request.args.get('to')
+    if not source_id or not target_id:
+        return jsonify({"error": "Query parameters 'from' and 'to' are required."}), 400
+
+    try:
+        graph = get_routing_graph(building_id)
+
+        for node_id in (source_id, target_id):
+            if not graph.has_node(node_id):
+                return jsonify({"error": f"Node '{node_id}' not found in building '{building_id}'."}), 404
+
+        route = graph.route(source_id, target_id)
+        if route is None:
+            return jsonify({"error": f"No route from '{source_id}' to '{target_id}'."}), 404
+
+        return jsonify(route), 200
 
     except Exception as e:
-        print(f"Error building super graph: {e}")
+        print(f"Error computing route: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+def get_routing_graph(building_id):
+    return routing_graphs.get_or_build(
+        building_id,
+        lambda: cache.get_or_load(building_id, 'floor_graphs', lambda: load_floor_graphs(building_id)))
+
+
+def get_poi_table(building_id):
+    return poi_tables.get_or_build(
+        building_id,
+        get_routing_graph(building_id),
+        lambda: cache.get_or_load(building_id, 'pois', lambda: load_building_POIs(building_id)))
+
+
+@nav_graph_bp.route('/<building_id>/nearest', methods=['GET'])
+def get_nearest_poi(building_id):
+    """
+    Closest POI of a category by path distance, looked up in the building's precomputed table.
+
+    Query params:
+        from (str): node id the user is at
+        category (str): POI category, e.g. 'restroom'
+    """
+    if db is None:
+        return jsonify({"error": "Database not initialized."}), 500
+
+    node_id = request.args.get('from')
+    category = request.args.get('category')
+    if not node_id or not category:
+        return jsonify({"error": "Query parameters 'from' and 'category' are required."}), 400
+
+    try:
+        table = get_poi_table(building_id)
+        if not table.graph.has_node(node_id):
+            return jsonify({"error": f"Node '{node_id}' not found in building '{building_id}'."}), 404
+
+        nearest = table.nearest(node_id, category)
+        if nearest is None:
+            return jsonify({"error": f"No reachable POI of category '{category}'."}), 404
+
+        poi_id, distance = nearest
+        return jsonify({"poiId": poi_id, "category": category, "distance": distance}), 200
+
+    except Exception as e:
+        print(f"Error finding nearest POI: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@nav_graph_bp.route('/<building_id>/poi-distances/<poi_id>', methods=['GET'])
+def get_poi_distances(building_id, poi_id):
+    """
+    Path distance from one POI to every POI reachable from it: {"poiId", "distances": {id: distance}}.
+    """
+    if db is None:
+        return jsonify({"error": "Database not initialized."}), 500
+
+    try:
+        distances = get_poi_table(building_id).distances_from(poi_id)
+        if distances is None:
+            return jsonify({"error": f"POI '{poi_id}' not found in building '{building_id}'."}), 404
+
+        return jsonify({"poiId": poi_id, "distances": distances}), 200
+
+    except Exception as e:
+        print(f"Error fetching POI distances: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -1,8 +1,17 @@
 from flask import Blueprint, request, jsonify
-from app import db
-from google.cloud.firestore import GeoPoint
+from google.api_core.exceptions import FailedPrecondition
+from app import db, cache
+from graph_store import load_graph, store_graph
+from http_cache import conditional_get
+from sync_log import change, record_changes
+import hashlib
+import json
 
 paths_bp = Blueprint('paths', __name__)
+paths_bp.after_request(conditional_get)
+
+# a save that loses a race re-reads and merges again this many times in all
+SAVE_ATTEMPTS = 3
 
 
 @paths_bp.route('/<building_id>/<floor_id>', methods=['GET'])
@@ -11,32 +20,7 @@ def get_path(building_id, floor_id):
         return jsonify({"error": "Database not initialized."}), 500
 
     try:
-        nodes_ref = db.collection('buildings').document(building_id).collection('floors').document(floor_id).collection(
-            'path_nodes')
-        nodes_docs = nodes_ref.stream()
-
-        path_data = {
-            "nodes": [],
-            "adjacencyList": {}
-        }
-
-        for doc in nodes_docs:
-            node_data = doc.to_dict()
-            node_id = doc.id
-
-            # Populate the nodes list
-            path_data["nodes"].append({
-                "id": node_id,
-                "coordinates": [node_data['coordinates'].latitude, node_data['coordinates'].longitude],
-                # --- FIX: Read the portalGroup property ---
-                # Use .get() to safely handle nodes that don't have it
-                "portalGroup": node_data.get('portalGroup', None)
-            })
-
-            # Populate the adjacency list
-            if 'adjacencyList' in node_data:
-                path_data["adjacencyList"][node_id] = node_data['adjacencyList']
-
+        path_data = cache.get_or_load(building_id, f'path:{floor_id}', lambda: load_path(building_id, floor_id))
         return jsonify(path_data), 200
 
     except Exception as e:
@@ -44,8 +28,144 @@ def get_path(building_id, floor_id):
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+def load_path(building_id, floor_id):
+    floor_ref = db.collection('buildings').document(building_id).collection('floors').document(floor_id)
+    graph = load_graph(db, floor_ref.get())
+    if graph is None:
+        graph = load_legacy_path(floor_ref)
+
+    path_data = path_view(graph)
+    path_data["version"] = path_version(stored_hashes(path_data))
+    return path_data
+
+
+def path_view(graph):
+    """
+    The editor's view of a floor graph: nodes with coordinates, their portal group and adjacency.
+    """
+    path_data = {
+        "nodes": [],
+        "adjacencyList": {}
+    }
+    for node in graph["nodes"]:
+        if not isinstance(node.get('coordinates'), (list, tuple)):
+            continue
+        path_data["nodes"].append({
+            "id": node["id"],
+            "coordinates": list(node['coordinates']),
+            "portalGroup": node.get('portalGroup', None)
+        })
+        if node["id"] in graph["adjacencyList"]:
+            path_data["adjacencyList"][node["id"]] = graph["adjacencyList"][node["id"]]
+
+    return path_data
+
+
+def load_legacy_path(floor_ref):
+    """
+    A floor saved before the graph store: one document per node in 'path_nodes'.
+    """
+    graph = {
+        "nodes": [],
+        "adjacencyList": {}
+    }
+
+    for doc in floor_ref.collection('path_nodes').stream():
+        node_data = doc.to_dict()
+        node_id = doc.id
+
+        # Populate the nodes list
+        graph["nodes"].append({
+            "id": node_id,
+            "coordinates": [node_data['coordinates'].latitude, node_data['coordinates'].longitude],
+            # --- FIX: Read the portalGroup property ---
+            # Use .get() to safely handle nodes that don't have it
+            "portalGroup": node_data.get('portalGroup', None)
+        })
+
+        # Populate the adjacency list
+        if 'adjacencyList' in node_data:
+            graph["adjacencyList"][node_id] = node_data['adjacencyList']
+
+    return graph
+
+
+def node_hash(coordinates, adjacency, portal_group):
+    """
+    Content hash of one path node, equal for a node as sent by the editor and as stored (which
+    keeps weights as floats).
+    """
+    edges = [{**edge, "weight": float(edge["weight"])} if isinstance(edge, dict) and edge.get("weight") is not None
+             else edge for edge in adjacency or []]
+    content = [[float(c) for c in coordinates], edges, portal_group]
+    return hashlib.sha1(json.dumps(content, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def path_version(hashes):
+    """
+    Version token of a floor's path graph: a hash over all its node hashes.
+    """
+    digest = hashlib.sha1()
+    for node_id in sorted(hashes):
+        digest.update(f"{node_id}:{hashes[node_id]}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def stored_hashes(path_data):
+    return {node["id"]: node_hash(node["coordinates"], path_data["adjacencyList"].get(node["id"]),
+                                  node.get("portalGroup"))
+            for node in path_data["nodes"]}
+
+
+def merge_path(stored_graph, stored, nodes_data, adjacency_list_data):
+    """
+    The editor's nodes merged into the stored graph. Unchanged nodes keep everything stored for
+    them (e.g. edge weights saved through /navigations) and nodes the editor does not show
+    (no coordinates) stay as they are.
+
+    Returns:
+        tuple: (graph, {nodeId: hash} of the editor's nodes)
+    """
+    stored_nodes = {node['id']: node for node in stored_graph["nodes"]}
+    incoming = {}
+    nodes, adjacency = [], {}
+    for node in nodes_data:
+        node_id = node['id']
+        node_adjacencies = adjacency_list_data.get(node_id, [])
+        portal_group = node.get('portalGroup', None)
+        incoming[node_id] = node_hash(node['coordinates'], node_adjacencies, portal_group)
+        if stored.get(node_id) == incoming[node_id]:
+            nodes.append(stored_nodes[node_id])
+            adjacency[node_id] = stored_graph["adjacencyList"].get(node_id, [])
+            continue
+
+        nodes.append({
+            **stored_nodes.get(node_id, {}),
+            'id': node_id,
+            'coordinates': [float(node['coordinates'][0]), float(node['coordinates'][1])],
+            'portalGroup': portal_group
+        })
+        adjacency[node_id] = node_adjacencies
+
+    for node in stored_graph["nodes"]:
+        if node['id'] not in stored and node['id'] not in incoming:
+            nodes.append(node)
+            if node['id'] in stored_graph["adjacencyList"]:
+                adjacency[node['id']] = stored_graph["adjacencyList"][node['id']]
+
+    return {"nodes": nodes, "adjacencyList": adjacency}, incoming
+
+
 @paths_bp.route('/save/<building_id>/<floor_id>', methods=['POST'])
 def save_path(building_id, floor_id):
+    """
+    Saves a floor's path graph as the floor's canonical graph, merging the edits into what is stored.
+    Body: {"nodes": [...], "adjacencyList": {...}, "version": "..."}
+    'version' (optional) is the token returned by GET or by the previous save; if the stored graph
+    has changed since, nothing is written and 409 is returned with the current version.
+    The graph is only replaced if the floor document is unchanged since it was read, so a save
+    racing another one is merged again against the winner (or answered 409 if it sent 'version').
+    """
     if db is None:
         return jsonify({"error": "Database not initialized."}), 500
 
@@ -57,34 +177,51 @@ def save_path(building_id, floor_id):
         if nodes_data is None or adjacency_list_data is None:
             return jsonify({"error": "Missing required data keys 'nodes' or 'adjacencyList'."}), 400
 
-        nodes_ref = db.collection('buildings').document(building_id).collection('floors').document(floor_id).collection(
-            'path_nodes')
-
-        batch = db.batch()
-
-        # Step 1: Delete all existing nodes (this is correct)
-        for doc in nodes_ref.stream():
-            batch.delete(doc.reference)
-
-        # Step 2: Add the new nodes
-        for node in nodes_data:
-            node_adjacencies = adjacency_list_data.get(node['id'], [])
-            node_doc_ref = nodes_ref.document(node['id'])
-
-            # --- FIX: Correct Python syntax ---
-            # Use node.get('portalGroup', None)
-            # This is the Python equivalent of node.portalGroup || null
-            node_doc_data = {
-                'coordinates': GeoPoint(node['coordinates'][0], node['coordinates'][1]),
-                'adjacencyList': node_adjacencies,
-                'portalGroup': node.get('portalGroup', None)  # <-- Corrected line
-            }
-            batch.set(node_doc_ref, node_doc_data)
-
-        batch.commit()
-
-        return jsonify({"message": "Path data saved successfully."}), 200
+        floor_ref = db.collection('buildings').document(building_id).collection('floors').document(floor_id)
+        for _ in range(SAVE_ATTEMPTS):
+            floor_doc = floor_ref.get()
+            if not floor_doc.exists:
+                return jsonify({"error": f"Floor '{floor_id}' not found in building '{building_id}'."}), 404
+
+            # Read the stored graph fresh (not from the cache) to diff against it
+            previous = floor_doc.to_dict().get('graphStore')
+            stored_graph = load_graph(db, floor_doc) or load_legacy_path(floor_ref)
+            stored = stored_hashes(path_view(stored_graph))
+            current_version = path_version(stored)
+            expected_version = data.get('version')
+            if expected_version is not None and expected_version != current_version:
+                return jsonify({
+                    "error": "The path graph was changed by someone else. Reload it and apply your edits again.",
+                    "currentVersion": current_version
+                }), 409
+
+            graph, incoming = merge_path(stored_graph, stored, nodes_data, adjacency_list_data)
+            added = sum(1 for node_id in incoming if node_id not in stored)
+            removed = sum(1 for node_id in stored if node_id not in incoming)
+            changed = sum(1 for node_id in incoming if node_id in stored and stored[node_id] != incoming[node_id])
+            if not (added or changed or removed or previous is None):
+                break
+
+            try:
+                # only if nobody saved the floor since it was read above
+                store_graph(db, floor_ref, graph, previous, last_update_time=floor_doc.update_time)
+            except FailedPrecondition:
+                # merge again against the graph that was saved meanwhile; with a 'version' that is a 409
+                continue
+            cache.invalidate(building_id)
+            record_changes(db, building_id, [change('graph', floor_id, floor_id)])
+            break
+        else:
+            return jsonify({"error": "The path graph kept changing while saving. Try again."}), 409
+
+        return jsonify({
+            "message": "Path data saved successfully.",
+            "version": path_version(stored_hashes(path_view(graph))),
+            "added": added,
+            "changed": changed,
+            "removed": removed
+        }), 200
 
     except Exception as e:
         print(f"An error occurred during path save: {e}")
-        return jsonify({"status": "error", "message": str(e)}), 500
\ No newline at end of file
+        return jsonify({"status": "error", "message": str(e)}), 500
@@ -0,0 +1,202 @@
+from flask import Blueprint, request, jsonify
+from app import db, cache
+from model_registry import ModelNotAvailable
+from positioning import DEFAULT_TX_POWER, ParticleFilter, PathGeometry
+from preprocess import window_to_array
+from spatial_index import SpatialIndexCache
+from streaming import StreamingFeatureExtractor
+from blueprints.beacon import load_floor_beacons
+from blueprints.model import registry, resolve_model, predict_features
+from blueprints.paths import load_path
+import math
+import threading
+import time
+import uuid
+
+position_bp = Blueprint('position', __name__)
+
+# path geometry and beacon positions per floor, shared by every session on that floor
+floor_models = SpatialIndexCache(cache.ttl)
+cache.on_invalidate(floor_models.invalidate)
+
+# positioning sessions live in this process only; idle ones are dropped after SESSION_TTL seconds
+SESSION_TTL = 300
+MAX_PARTICLES = 5000
+MAX_DT = 5.0  # seconds of motion applied at most between two updates
+sessions = {}
+sessions_lock = threading.Lock()
+
+
+def load_floor_model(building_id, floor_id):
+    """
+    Returns:
+        tuple: (PathGeometry, {beaconId: {"xy", "txPower"}}), or None when the floor has no path graph.
+    """
+    path = cache.get_or_load(building_id, f'path:{floor_id}', lambda: load_path(building_id, floor_id))
+    geometry = PathGeometry(path["nodes"], path["adjacencyList"])
+    if len(geometry) == 0 or geometry.length.sum() <= 0:
+        return None
+
+    beacons = cache.get_or_load(building_id, f'beacons:{floor_id}',
+                                lambda: load_floor_beacons(building_id, floor_id)) or []
+    positions = {}
+    for beacon in beacons:
+        if isinstance(beacon.get('latLng'), list) and len(beacon['latLng']) == 2:
+            positions[beacon['beaconId']] = {
+                "xy": geometry.projection.forward(beacon['latLng'])[0],
+                "txPower": beacon.get('txPower', DEFAULT_TX_POWER)
+            }
+    return geometry, positions
+
+
+def parse_rssi(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"RSSI readings must be numbers, got {value!r}.")
+    return float(value)
+
+
+def parse_scan(rssi):
+    """
+    Accepts {"beaconId": rssi} or [{"beaconId", "rssi"}]; several readings of one beacon are averaged.
+    Raises ValueError for anything else.
+    """
+    if rssi is None:
+        return {}
+    if isinstance(rssi, dict):
+        return {str(k): parse_rssi(v) for k, v in rssi.items()}
+    if not isinstance(rssi, list):
+        raise ValueError("'rssi' must be an object or an array.")
+    readings = {}
+    for reading in rssi:
+        if not isinstance(reading, dict) or 'beaconId' not in reading or 'rssi' not in reading:
+            raise ValueError("Each 'rssi' entry must have 'beaconId' and 'rssi'.")
+        readings.setdefault(str(reading['beaconId']), []).append(parse_rssi(reading['rssi']))
+    return {beacon_id: sum(values) / len(values) for beacon_id, values in readings.items()}
+
+
+def expire_idle_sessions():
+    cutoff = time.monotonic() - SESSION_TTL
+    with sessions_lock:
+        for session_id in [sid for sid, s in sessions.items() if s['last_used'] < cutoff]:
+            del sessions[session_id]
+
+
+@position_bp.route('/sessions', methods=['POST'])
+def open_position_session():
+    """
+    Starts tracking one user on one floor.
+    Body: {"buildingId", "floorId", "particles": 500,
+           "interval": 20, "window": 250, "stride": 50}   (IMU window/stride in samples, optional)
+    Without IMU settings the client sends its own 'movement' label with each update.
+    """
+    if db is None:
+        return jsonify({"error": "Database not initialized."}), 500
+
+    try:
+        payload = request.get_json() or {}
+        building_id, floor_id = payload.get('buildingId'), payload.get('floorId')
+        if not building_id or not floor_id:
+            return jsonify({"error": "Body must include 'buildingId' and 'floorId'."}), 400
+
+        num_particles = payload.get('particles', 500)
+        if not isinstance(num_particles, int) or not 1 <= num_particles <= MAX_PARTICLES:
+            return jsonify({"error": f"'particles' must be an integer between 1 and {MAX_PARTICLES}."}), 400
+
+        window_size = payload.get('window')
+        stride = payload.get('stride', window_size)
+        extractor, version = None, None
+        if window_size is not None:
+            if not isinstance(window_size, int) or not isinstance(stride, int) or window_size < 2 or stride <= 0:
+                return jsonify({"error": "IMU needs an integer 'window' of at least 2 and a positive 'stride'."}), 400
+            extractor = StreamingFeatureExtractor(window_size, stride, payload.get('interval', 500))
+            version = resolve_model(payload).version
+
+        floor_model = floor_models.get_or_build(building_id, floor_id, 'positioning',
+                                                lambda: load_floor_model(building_id, floor_id))
+        if floor_model is None:
+            return jsonify({"error": f"Floor '{floor_id}' of building '{building_id}' has no path graph."}), 404
+
+        geometry, beacons = floor_model
+        expire_idle_sessions()
+        session_id = uuid.uuid4().hex
+        with sessions_lock:
+            sessions[session_id] = {
+                'filter': ParticleFilter(geometry, beacons, num_particles),
+                'extractor': extractor,
+                'version': version,
+                'movement': None,
+                'lock': threading.Lock(),
+                'last_update': None,
+                'last_used': time.monotonic()
+            }
+
+        return jsonify({"sessionId": session_id, "particles": num_particles, "beacons": len(beacons),
+                        "modelVersion": version}), 201
+    except ModelNotAvailable as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        print(f"Error opening positioning session: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@position_bp.route('/sessions/<session_id>/update', methods=['POST'])
+def update_position(session_id):
+    """
+    Feeds one update and returns the current estimate.
+    Body: {"rssi": {"beaconId": -71, ...} or [{"beaconId", "rssi"}],
+           "data": [IMU sample, ...]   (new samples only, sessions opened with a window),
+           "movement": "Forward",      (optional, overrides the model)
+           "dt": 0.5}                  (optional seconds since the previous update, else measured)
+    Returns: {"lat", "lng", "accuracy", "beaconsUsed", "movement"}
+    """
+    try:
+        with sessions_lock:
+            session = sessions.get(session_id)
+        if session is None:
+            return jsonify({"error": f"Session '{session_id}' not found."}), 404
+
+        payload = request.get_json()
+        if payload is None:
+            return jsonify({"error": "Invalid JSON data provided."}), 400
+
+        try:
+            scan = parse_scan(payload.get('rssi'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        dt = payload.get('dt')
+        if dt is not None and (isinstance(dt, bool) or not isinstance(dt, (int, float)) or not math.isfinite(dt)):
+            return jsonify({"error": "'dt' must be a number of seconds."}), 400
+
+        # one update at a time per session, so the extractor, movement and filter stay in step
+        with session['lock']:
+            features = None
+            if payload.get('data') and session['extractor'] is not None:
+                features = session['extractor'].push(window_to_array(payload['data']))
+            if features is not None and len(features):
+                # the newest completed window says how the user is moving now
+                session['movement'] = predict_features(registry.get(session['version']), features[-1:])[0]['action']
+            if payload.get('movement'):
+                session['movement'] = payload['movement']
+
+            now = time.monotonic()
+            if dt is None:
+                dt = 0.0 if session['last_update'] is None else now - session['last_update']
+            estimate = session['filter'].step(scan, session['movement'], min(max(float(dt), 0.0), MAX_DT))
+            session['last_update'] = session['last_used'] = now
+            movement = session['movement']
+
+        return jsonify({**estimate, "movement": movement}), 200
+    except ModelNotAvailable as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        print(f"Error updating position: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@position_bp.route('/sessions/<session_id>', methods=['DELETE'])
+def close_position_session(session_id):
+    with sessions_lock:
+        session = sessions.pop(session_id, None)
+    if session is None:
+        return jsonify({"error": f"Session '{session_id}' not found."}), 404
+    return jsonify({"message": f"Session {session_id} closed."}), 200
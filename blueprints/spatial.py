@@ -0,0 +1,111 @@
+from flask import Blueprint, request, jsonify
+from app import db, cache
+from spatial_index import PointIndex, SpatialIndexCache
+from blueprints.POIs import load_floor_POIs
+from blueprints.beacon import load_floor_beacons
+from blueprints.paths import load_path
+
+spatial_bp = Blueprint('spatial', __name__)
+
+# per-floor KD-trees, rebuilt from the cached snapshots after any write to the building
+spatial_indexes = SpatialIndexCache(cache.ttl)
+cache.on_invalidate(spatial_indexes.invalidate)
+
+# kind -> (snapshot key shared with the list endpoint, its loader, snapshot -> features, feature -> [lat, lng])
+KINDS = {
+    'pois': ('pois:{floor_id}', load_floor_POIs, lambda POIs: POIs, lambda poi: poi.get('location')),
+    'beacons': ('beacons:{floor_id}', load_floor_beacons, lambda beacons: beacons, lambda beacon: beacon.get('latLng')),
+    'nodes': ('path:{floor_id}', load_path, lambda path: path["nodes"], lambda node: node.get('coordinates')),
+}
+
+
+def get_index(building_id, floor_id, kind):
+    key, loader, features, location = KINDS[kind]
+
+    def build():
+        snapshot = cache.get_or_load(building_id, key.format(floor_id=floor_id), lambda: loader(building_id, floor_id))
+        return None if snapshot is None else PointIndex(features(snapshot), location)
+
+    return spatial_indexes.get_or_build(building_id, floor_id, kind, build)
+
+
+def parse_point():
+    try:
+        return float(request.args['lat']), float(request.args['lng'])
+    except (KeyError, ValueError):
+        return None
+
+
+def with_distances(results):
+    return [dict(feature, distance=distance) for feature, distance in results]
+
+
+@spatial_bp.route('/<building_id>/<floor_id>/<kind>/nearest', methods=['GET'])
+def get_nearest(building_id, floor_id, kind):
+    """
+    The k features of a floor closest to a point, closest first, each with its 'distance' in metres.
+
+    Query params:
+        lat, lng (float): the point
+        k (int, optional): how many, default 5
+        maxDistance (float, optional): ignore features further than this many metres
+    """
+    if db is None:
+        return jsonify({"error": "Database not initialized."}), 500
+    if kind not in KINDS:
+        return jsonify({"error": f"Unknown kind '{kind}', expected one of {sorted(KINDS)}."}), 404
+
+    point = parse_point()
+    if point is None:
+        return jsonify({"error": "Query parameters 'lat' and 'lng' are required numbers."}), 400
+
+    try:
+        k = int(request.args.get('k', 5))
+        max_distance = float(request.args.get('maxDistance', 'inf'))
+    except ValueError:
+        return jsonify({"error": "'k' and 'maxDistance' must be numbers."}), 400
+
+    try:
+        index = get_index(building_id, floor_id, kind)
+        if index is None:
+            return jsonify({"error": f"Floor '{floor_id}' not found for building '{building_id}'."}), 404
+
+        return jsonify(with_distances(index.nearest(*point, k=k, max_distance=max_distance))), 200
+
+    except Exception as e:
+        print(f"Error querying nearest {kind}: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@spatial_bp.route('/<building_id>/<floor_id>/<kind>/within', methods=['GET'])
+def get_within(building_id, floor_id, kind):
+    """
+    Every feature of a floor within a radius of a point, closest first, each with its 'distance' in metres.
+
+    Query params:
+        lat, lng (float): the point
+        radius (float): metres
+    """
+    if db is None:
+        return jsonify({"error": "Database not initialized."}), 500
+    if kind not in KINDS:
+        return jsonify({"error": f"Unknown kind '{kind}', expected one of {sorted(KINDS)}."}), 404
+
+    point = parse_point()
+    try:
+        radius = float(request.args['radius'])
+    except (KeyError, ValueError):
+        radius = None
+    if point is None or radius is None or radius < 0:
+        return jsonify({"error": "Query parameters 'lat', 'lng' and 'radius' are required numbers."}), 400
+
+    try:
+        index = get_index(building_id, floor_id, kind)
+        if index is None:
+            return jsonify({"error": f"Floor '{floor_id}' not found for building '{building_id}'."}), 404
+
+        return jsonify(with_distances(index.within(*point, radius))), 200
+
+    except Exception as e:
+        print(f"Error querying {kind} within radius: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
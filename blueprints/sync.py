@@ -0,0 +1,154 @@
+from flask import Blueprint, request, jsonify
+from app import db, cache
+from http_cache import conditional_get
+from sync_log import ALL, changes_since, current_version
+from blueprints.beacon import load_building_beacons
+from blueprints.building import load_building_with_floors
+from blueprints.floors import load_floors
+from blueprints.nav_graph import load_navigation_graph
+from blueprints.POIs import load_building_POIs
+
+sync_bp = Blueprint('sync', __name__)
+sync_bp.after_request(conditional_get)
+
+
+@sync_bp.route('/<building_id>', methods=['GET'])
+def sync_building(building_id):
+    """
+    Everything a client needs to bring its copy of a building up to date.
+
+    Query params:
+        since (int, optional): the 'version' of the client's last sync. Without it (or 0) the
+            whole building is returned.
+
+    Returns: {"version", "full", "building"?, "floors", "pois", "beacons", "graphs"}, each of the
+    last four as {"updated": [...], "deleted": [ids]}. Graphs are listed as {"floorId", "graph"}.
+    A deleted floor takes its POIs, beacons and graph with it.
+    """
+    if db is None:
+        return jsonify({"error": "Database not initialized."}), 500
+
+    try:
+        since = int(request.args.get('since', 0))
+    except ValueError:
+        return jsonify({"error": "'since' must be an integer version."}), 400
+
+    try:
+        # the version is read before any data, so the data is at least that new
+        if since <= 0:
+            version, changes = current_version(db, building_id), None
+        else:
+            version, changes = changes_since(db, building_id, since)
+
+        building = snapshot_as_of(building_id, 'building', lambda: load_building_with_floors(building_id), version)
+        if building is None:
+            return jsonify({"error": "Building not found."}), 404
+
+        if changes is None:
+            return jsonify(full_sync(building_id, building, version)), 200
+        return jsonify(delta_sync(building_id, building, version, changes)), 200
+
+    except Exception as e:
+        print(f"Error syncing building {building_id}: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+def snapshot_as_of(building_id, key, loader, version):
+    """
+    ``loader()``'s data including every change up to sync ``version``: the cached copy if it was
+    loaded after that version was recorded, otherwise a fresh load. A copy that predates it (one
+    cached before a write another worker made, say) would report new entities as deleted.
+    """
+    def load():
+        loaded_after = current_version(db, building_id)
+        data = loader()
+        return None if data is None else {"version": loaded_after, "data": data}
+
+    snapshot = cache.get_or_load(building_id, f'sync:{key}', load)
+    if snapshot is not None and snapshot["version"] < version:
+        snapshot = load()
+    return snapshot["data"] if snapshot else None
+
+
+def building_fields(building):
+    return {key: value for key, value in building.items() if key != 'floors'}
+
+
+def floor_graph(building_id, floor_id, version):
+    snapshot = snapshot_as_of(building_id, f'graph:{floor_id}',
+                              lambda: load_navigation_graph(building_id, floor_id), version)
+    return snapshot["graph"] if snapshot else None
+
+
+def full_sync(building_id, building, version):
+    # anything written after the version was read is sent again by the next delta
+    floors = snapshot_as_of(building_id, 'floors', lambda: load_floors(building_id), version)
+    graphs = [{"floorId": floor['id'], "graph": floor_graph(building_id, floor['id'], version)} for floor in floors]
+    return {
+        "version": version,
+        "full": True,
+        "building": building_fields(building),
+        "floors": {"updated": floors, "deleted": []},
+        "pois": {"updated": snapshot_as_of(building_id, 'pois', lambda: load_building_POIs(building_id), version),
+                 "deleted": []},
+        "beacons": {"updated": snapshot_as_of(building_id, 'beacons', lambda: load_building_beacons(building_id),
+                                              version),
+                    "deleted": []},
+        "graphs": {"updated": [g for g in graphs if g["graph"]], "deleted": []}
+    }
+
+
+def delta_sync(building_id, building, version, changes):
+    by_kind = {}
+    for item in changes:
+        by_kind.setdefault(item['kind'], []).append(item)
+
+    response = {"version": version, "full": False}
+    if by_kind.get('building'):
+        response["building"] = building_fields(building)
+
+    floors = snapshot_as_of(building_id, 'floors', lambda: load_floors(building_id), version)
+    floor_numbers = {floor['id']: floor.get('floor') for floor in floors}
+    response["floors"] = updated_and_deleted(by_kind.get('floor', []), floors, 'id', floor_numbers)
+    response["pois"] = updated_and_deleted(
+        by_kind.get('poi', []),
+        lambda: snapshot_as_of(building_id, 'pois', lambda: load_building_POIs(building_id), version),
+        'id', floor_numbers, 'floor')
+    response["beacons"] = updated_and_deleted(
+        by_kind.get('beacon', []),
+        lambda: snapshot_as_of(building_id, 'beacons', lambda: load_building_beacons(building_id), version),
+        'beaconId', floor_numbers, 'floorNumber')
+
+    graphs = {"updated": [], "deleted": []}
+    for item in by_kind.get('graph', []):
+        graph = floor_graph(building_id, item['id'], version) if item['id'] in floor_numbers else None
+        if graph:
+            graphs["updated"].append({"floorId": item['id'], "graph": graph})
+        else:
+            graphs["deleted"].append(item['id'])
+    response["graphs"] = graphs
+    return response
+
+
+def updated_and_deleted(changes, current, id_field, floor_numbers, floor_field=None):
+    """
+    Splits the changes of one kind into the entities' current data and the ids that are gone.
+    ``current`` is the kind's full list (or a function loading it, only called when needed).
+    A change with id ALL stands for every entity on its floor.
+    """
+    result = {"updated": [], "deleted": []}
+    if not changes:
+        return result
+    if callable(current):
+        current = current()
+
+    ids = {item['id'] for item in changes if item['id'] != ALL}
+    whole_floors = {floor_numbers.get(item['floorId']) for item in changes if item['id'] == ALL}
+    whole_floors.discard(None)
+    found = set()
+    for entity in current or []:
+        if entity.get(id_field) in ids or (floor_field and entity.get(floor_field) in whole_floors):
+            result["updated"].append(entity)
+            found.add(entity.get(id_field))
+    result["deleted"] = sorted(ids - found)
+    return result
@@ -0,0 +1,227 @@
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from firestore_fanout import BATCH_LIMIT
+
+# its own pools, so a big delete never starves the request fan-out pool
+DELETE_WORKERS = 8
+_workers = ThreadPoolExecutor(max_workers=DELETE_WORKERS, thread_name_prefix='cascade-delete')
+_runner = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cascade-delete-job')
+
+# images uploaded through /uploadImage live under pois/ in the bucket
+IMAGE_URL = re.compile(r"/(pois/[^?#\s\"']+)")
+
+# finished jobs are kept this long for status polling
+JOB_TTL = 3600
+
+jobs = {}
+jobs_lock = threading.Lock()
+
+
+class DeleteJob:
+    def __init__(self, description):
+        self.id = uuid.uuid4().hex
+        self.description = description
+        self.status = 'queued'  # queued -> collecting -> deleting -> images -> done | failed
+        self.documents_found = 0
+        self.documents_deleted = 0
+        self.images_found = 0
+        self.images_deleted = 0
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "jobId": self.id,
+                "description": self.description,
+                "status": self.status,
+                "documentsFound": self.documents_found,
+                "documentsDeleted": self.documents_deleted,
+                "imagesFound": self.images_found,
+                "imagesDeleted": self.images_deleted,
+                "error": self.error,
+                "createdAt": self.created_at,
+                "finishedAt": self.finished_at
+            }
+
+
+def get_job(job_id):
+    with jobs_lock:
+        return jobs.get(job_id)
+
+
+def _expire_finished_jobs():
+    cutoff = time.time() - JOB_TTL
+    with jobs_lock:
+        for job_id in [j for j, job in jobs.items() if job.finished_at and job.finished_at < cutoff]:
+            del jobs[job_id]
+
+
+def running_jobs():
+    with jobs_lock:
+        return [job for job in jobs.values() if job.finished_at is None]
+
+
+def add_job(job):
+    """
+    Makes a background job pollable at /jobs/<id>. Any object with ``id``, ``finished_at``
+    and ``to_dict()`` will do.
+    """
+    _expire_finished_jobs()
+    with jobs_lock:
+        jobs[job.id] = job
+
+
+def image_paths(value):
+    """
+    Every pois/... storage path referenced by a URL anywhere in a document's fields.
+    """
+    if isinstance(value, str):
+        return set(IMAGE_URL.findall(value))
+    if isinstance(value, dict):
+        value = value.values()
+    elif not isinstance(value, (list, tuple)):
+        return set()
+    paths = set()
+    for item in value:
+        paths |= image_paths(item)
+    return paths
+
+
+def _list_collection(collection, job):
+    """
+    All documents of one collection, including 'missing' parents that only hold subcollections
+    (what the old building delete left behind), plus the image paths and beacon ids found.
+    """
+    snapshots = list(collection.stream())
+    refs = {s.reference.path: s.reference for s in snapshots}
+    for ref in collection.list_documents():
+        refs.setdefault(ref.path, ref)
+
+    images = set()
+    for snapshot in snapshots:
+        images |= image_paths(snapshot.to_dict())
+    beacon_ids = [ref.id for ref in refs.values()] if collection.id == 'beacons' else []
+    job.add(documents_found=len(refs))
+    return list(refs.values()), images, beacon_ids
+
+
+def collect_subtree(root, job):
+    """
+    Walks ``root`` and all its subcollections breadth first, listing the collections of one
+    level in parallel.
+
+    Returns:
+        tuple: (document refs including ``root``, image paths, beacon ids)
+    """
+    refs, images, beacon_ids = [root], set(), []
+    level = [root]
+    while level:
+        collections = [c for doc_collections in _workers.map(lambda ref: list(ref.collections()), level)
+                       for c in doc_collections]
+        level = []
+        for found, found_images, found_beacons in _workers.map(lambda c: _list_collection(c, job), collections):
+            level.extend(found)
+            images |= found_images
+            beacon_ids.extend(found_beacons)
+        refs.extend(level)
+    job.add(documents_found=1)
+    return refs, images, beacon_ids
+
+
+def delete_refs(db, refs, job):
+    chunks = [refs[i:i + BATCH_LIMIT] for i in range(0, len(refs), BATCH_LIMIT)]
+
+    def commit(chunk):
+        batch = db.batch()
+        for ref in chunk:
+            batch.delete(ref)
+        batch.commit()
+        job.add(documents_deleted=len(chunk))
+
+    list(_workers.map(commit, chunks))
+
+
+def stale_index_entries(db, index_collection, beacon_ids, owner):
+    """
+    beacon_index entries of the deleted beacons that still point into the deleted subtree
+    (an id re-registered elsewhere meanwhile keeps its entry).
+    """
+    refs = [db.collection(index_collection).document(beacon_id) for beacon_id in beacon_ids]
+    chunks = [refs[i:i + BATCH_LIMIT] for i in range(0, len(refs), BATCH_LIMIT)]
+    stale = []
+    for snapshots in _workers.map(lambda chunk: list(db.get_all(chunk)), chunks):
+        for snapshot in snapshots:
+            data = snapshot.to_dict() if snapshot.exists else None
+            if data and all(data.get(k) == v for k, v in owner.items()):
+                stale.append(snapshot.reference)
+    return stale
+
+
+def delete_images(bucket, paths, job):
+    job.add(images_found=len(paths))
+    if not paths:
+        return
+    missing = []
+    paths = sorted(paths)
+    for lo in range(0, len(paths), 100):
+        chunk = [bucket.blob(path) for path in paths[lo:lo + 100]]
+        bucket.delete_blobs(chunk, on_error=missing.append)  # an already deleted image is not an error
+        job.add(images_deleted=len(chunk))
+    job.add(images_deleted=-len(missing))
+
+
+def run_cascade_delete(job, db, bucket, root, index_collection=None, owner=None, on_finish=None):
+    try:
+        job.status = 'collecting'
+        refs, images, beacon_ids = collect_subtree(root, job)
+        if index_collection and beacon_ids:
+            index_refs = stale_index_entries(db, index_collection, beacon_ids, owner or {})
+            refs.extend(index_refs)
+            job.add(documents_found=len(index_refs))
+
+        job.status = 'deleting'
+        delete_refs(db, refs, job)
+
+        job.status = 'images'
+        if bucket is not None:
+            delete_images(bucket, images, job)
+        job.status = 'done'
+    except Exception as e:
+        print(f"Cascade delete of {job.description} failed: {e}")
+        job.status, job.error = 'failed', str(e)
+    finally:
+        job.finished_at = time.time()
+        if on_finish is not None:
+            on_finish()
+
+
+def start_cascade_delete(db, bucket, root, description, index_collection=None, owner=None, on_finish=None):
+    """
+    Deletes the document ``root``, every document below it and the pois/ images they reference,
+    in the background.
+
+    Args:
+        root: DocumentReference of the building or floor.
+        index_collection (str): beacon index collection to clean up for deleted beacons.
+        owner (dict): fields an index entry must match to be deleted, e.g. {"buildingId": ...}.
+        on_finish (callable): called once the job ended, e.g. to invalidate caches.
+
+    Returns:
+        DeleteJob: poll ``to_dict()`` for progress.
+    """
+    job = DeleteJob(description)
+    add_job(job)
+    _runner.submit(run_cascade_delete, job, db, bucket, root, index_collection, owner, on_finish)
+    return job
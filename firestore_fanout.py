@@ -0,0 +1,128 @@
+from concurrent.futures import ThreadPoolExecutor
+
+# shared by every request; Firestore calls spend their time waiting on the network
+FANOUT_WORKERS = 16
+_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='firestore-fanout')
+
+
+def fan_out(fn, items):
+    """
+    Calls ``fn`` on every item concurrently and returns the results in the order of ``items``.
+
+    Used to fetch per-floor subcollections in parallel instead of one round trip after another.
+    Do not call it from inside ``fn``: nested fan-outs can exhaust the shared pool.
+    """
+    items = list(items)
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    return list(_executor.map(fn, items))
+
+
+# Firestore rejects batched writes with more than 500 operations
+BATCH_LIMIT = 500
+
+
+def _commit(db, chunk):
+    batch = db.batch()
+    for writes in chunk:
+        for method, ref, data in writes:
+            if method == 'delete':
+                batch.delete(ref)
+            else:
+                getattr(batch, method)(ref, data)
+    batch.commit()
+
+
+def _commit_chunk(db, chunk):
+    try:
+        _commit(db, chunk)
+        return [None] * len(chunk)
+    except Exception as e:
+        if len(chunk) == 1:
+            return [str(e)]
+        print(f"Batch of {len(chunk)} items failed ({e}), retrying them one by one")
+
+    # a batch is all-or-nothing: retry its items separately so one bad item does not fail the rest
+    results = []
+    for writes in chunk:
+        try:
+            _commit(db, [writes])
+            results.append(None)
+        except Exception as e:
+            results.append(str(e))
+    return results
+
+
+def commit_batched(db, items, batch_limit=BATCH_LIMIT):
+    """
+    Commits many items' writes as batched writes of at most ``batch_limit`` operations, the
+    batches running concurrently. An item's writes always land in the same batch.
+
+    Args:
+        items (list): per item, a list of writes ('set' | 'update' | 'delete', ref, data).
+
+    Returns:
+        list: per item, None when committed or the error message, in the order of ``items``.
+    """
+    chunks, chunk, size = [], [], 0
+    for writes in items:
+        if chunk and size + len(writes) > batch_limit:
+            chunks.append(chunk)
+            chunk, size = [], 0
+        chunk.append(writes)
+        size += len(writes)
+    if chunk:
+        chunks.append(chunk)
+
+    results = []
+    for chunk_results in fan_out(lambda c: _commit_chunk(db, c), chunks):
+        results.extend(chunk_results)
+    return results
+
+
+def exists_all(db, refs, chunk_size=BATCH_LIMIT):
+    """
+    Existence of every document in ``refs`` with one get_all per chunk instead of a get() each.
+    """
+    refs = list(refs)
+    chunks = [refs[i:i + chunk_size] for i in range(0, len(refs), chunk_size)]
+    found = set()
+    for snapshots in fan_out(lambda c: list(db.get_all(c)), chunks):
+        found.update(s.reference.path for s in snapshots if s.exists)
+    return [ref.path in found for ref in refs]
+
+
+def apply_bulk(db, items):
+    """
+    Runs a bulk request: checks the documents that must already exist, then commits the rest
+    with ``commit_batched``.
+
+    Args:
+        items (list): dicts {"op", "id", "writes": [...], "mustExist": ref or None,
+                      "error": message if the item was rejected before writing}
+
+    Returns:
+        list: per item {"op", "id", "status": "ok" | "not_found" | "error", "message"?}
+    """
+    checks = [i for i, item in enumerate(items) if not item.get('error') and item.get('mustExist') is not None]
+    missing = set()
+    for i, exists in zip(checks, exists_all(db, [items[i]['mustExist'] for i in checks])):
+        if not exists:
+            missing.add(i)
+
+    to_write = [i for i, item in enumerate(items) if not item.get('error') and i not in missing]
+    errors = dict(zip(to_write, commit_batched(db, [items[i]['writes'] for i in to_write])))
+
+    results = []
+    for i, item in enumerate(items):
+        result = {"op": item['op'], "id": item['id']}
+        if item.get('error'):
+            result.update(status="error", message=item['error'])
+        elif i in missing:
+            result.update(status="not_found", message=f"{item['id']} not found")
+        elif errors[i] is not None:
+            result.update(status="error", message=errors[i])
+        else:
+            result['status'] = "ok"
+        results.append(result)
+    return results
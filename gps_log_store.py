@@ -0,0 +1,366 @@
+import datetime
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import numpy as np
+from google.api_core.exceptions import FailedPrecondition
+from google.cloud.firestore import DELETE_FIELD
+
+from cascade_delete import add_job
+
+# gps_log_buckets/{sensor}_{YYYYMMDDHH}: one document per sensor per hour, readings packed as arrays
+GPS_LOG_BUCKETS = 'gps_log_buckets'
+BUCKET_SECONDS = 3600
+# every commit adds one chunk to each bucket it touches, so the writer holds readings this long
+# (up to FLUSH_READINGS of them): a bucket then gets at most one write per FLUSH_SECONDS and
+# BUCKET_SECONDS / FLUSH_SECONDS chunks while fewer readings than that arrive per flush.
+# The chunks are exempt from indexing (firestore.indexes.json).
+FLUSH_SECONDS = 15.0
+FLUSH_READINGS = 10_000
+# the flat one-document-per-reading collection written before the buckets
+LEGACY_GPS_LOGS = 'gps_logs'
+
+# compaction: hours older than RAW_DAYS keep one averaged point per minute, older than
+# RETENTION_DAYS are deleted. Finding the raw hours (raw == true, start < cutoff) needs the
+# composite index on (raw, start) in firestore.indexes.json.
+RAW_DAYS = 7
+RETENTION_DAYS = 365
+DOWNSAMPLE_SECONDS = 60
+COMPACT_PAGE = 100  # buckets per batched compaction write
+LEGACY_PAGE = 200  # legacy documents per batch: their bucket writes and deletes must fit in 500
+
+_runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix='gps-log-compact')
+
+
+def parse_timestamp(value):
+    """
+    Epoch seconds from epoch seconds or an ISO 8601 string (UTC unless it says otherwise).
+    """
+    if isinstance(value, bool):
+        raise ValueError("timestamp must be epoch seconds or an ISO 8601 string")
+    if isinstance(value, (int, float)):
+        return float(value)
+    moment = datetime.datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment.timestamp()
+
+
+def to_datetime(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+
+
+def to_epoch(moment):
+    # Firestore hands back aware datetimes; naive ones were written as UTC (utcnow)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment.timestamp()
+
+
+def bucket_start(timestamp):
+    return timestamp - timestamp % BUCKET_SECONDS
+
+
+def bucket_ref(db, sensor_id, start):
+    # sensor ids are free text; '/' would split the document path
+    hour = to_datetime(start).strftime('%Y%m%d%H')
+    return db.collection(GPS_LOG_BUCKETS).document(f"{quote(str(sensor_id), safe='')}_{hour}")
+
+
+def bucket_writes(db, records):
+    """
+    LogWriter writes for a batch of readings ({"id", "sensor_id", "latitude", "longitude",
+    "timestamp"}): one merge per touched bucket, adding the readings as a chunk named after the
+    first reading's id, so writing the same batch again replaces that chunk.
+    """
+    groups = {}
+    for record in records:
+        key = (record['sensor_id'], bucket_start(record['timestamp']))
+        groups.setdefault(key, []).append(record)
+
+    writes = []
+    for (sensor_id, start), group in groups.items():
+        chunk = {
+            "t": [round(r['timestamp'] - start, 3) for r in group],
+            "lat": [r['latitude'] for r in group],
+            "lon": [r['longitude'] for r in group],
+        }
+        writes.append(('merge', bucket_ref(db, sensor_id, start), {
+            "sensor_id": sensor_id,
+            "start": to_datetime(start),
+            "raw": True,  # has chunks the compaction job has not downsampled yet
+            # prefixed: a field name used in an update path must not start with a digit
+            "chunks": {f"c{group[0]['id']}": chunk}
+        }))
+    return writes
+
+
+def bucket_points(data):
+    """
+    A bucket's readings as arrays sorted by time: (t epoch seconds, lat, lon, n). ``n`` is how
+    many readings a point stands for: 1, or more for points averaged by compaction.
+    """
+    start = to_epoch(data['start'])
+    chunks = list((data.get('chunks') or {}).values())
+    if not chunks:
+        empty = np.empty(0)
+        return empty, empty, empty, empty
+    t = np.concatenate([np.asarray(c['t'], dtype=float) for c in chunks]) + start
+    lat = np.concatenate([np.asarray(c['lat'], dtype=float) for c in chunks])
+    lon = np.concatenate([np.asarray(c['lon'], dtype=float) for c in chunks])
+    n = np.concatenate([np.asarray(c['n'], dtype=float) if 'n' in c else np.ones(len(c['t'])) for c in chunks])
+    order = np.argsort(t, kind='stable')
+    return t[order], lat[order], lon[order], n[order]
+
+
+def read_buckets(db, sensor_id, start, end):
+    """
+    The sensor's bucket documents covering [start, end) in time order, read by id: one read per
+    hour in range.
+    """
+    refs = [bucket_ref(db, sensor_id, hour)
+            for hour in np.arange(bucket_start(start), end, BUCKET_SECONDS).tolist()]
+    snapshots = []
+    for lo in range(0, len(refs), 500):
+        snapshots.extend(s for s in db.get_all(refs[lo:lo + 500]) if s.exists)
+    # get_all returns documents in no particular order
+    snapshots.sort(key=lambda s: to_epoch(s.get('start')))
+    return snapshots, len(refs)
+
+
+def track(db, sensor_id, start, end):
+    """
+    The sensor's readings in [start, end) as [t, lat, lon] rows sorted by time.
+    """
+    snapshots, reads = read_buckets(db, sensor_id, start, end)
+    points = [bucket_points(s.to_dict()) for s in snapshots]
+    points = [p for p in points if len(p[0])]
+    if not points:
+        return [], reads
+    # buckets are whole hours sorted by start, so the concatenation stays sorted
+    t, lat, lon, _ = (np.concatenate(column) for column in zip(*points))
+    keep = (t >= start) & (t < end)
+    return np.column_stack((t[keep], lat[keep], lon[keep])).tolist(), reads
+
+
+def summarize(t, lat, lon, n):
+    count = float(n.sum())
+    return {
+        "count": int(count),
+        "first": float(t.min()),
+        "last": float(t.max()),
+        "meanLat": float((lat * n).sum() / count),
+        "meanLon": float((lon * n).sum() / count),
+        "minLat": float(lat.min()),
+        "maxLat": float(lat.max()),
+        "minLon": float(lon.min()),
+        "maxLon": float(lon.max()),
+    }
+
+
+def rollup(db, sensor_id, start, end, interval):
+    """
+    Per ``interval`` seconds (aligned to UTC): count, first/last reading time, mean position and
+    bounding box of the sensor's readings in [start, end).
+    """
+    snapshots, reads = read_buckets(db, sensor_id, start, end)
+    points = [bucket_points(s.to_dict()) for s in snapshots]
+    points = [p for p in points if len(p[0])]
+    if not points:
+        return [], reads
+    t, lat, lon, n = (np.concatenate(column) for column in zip(*points))
+    keep = (t >= start) & (t < end)
+    t, lat, lon, n = t[keep], lat[keep], lon[keep], n[keep]
+
+    periods = t - t % interval
+    rollups = []
+    for period in np.unique(periods).tolist():
+        mask = periods == period
+        rollups.append({"start": period, **summarize(t[mask], lat[mask], lon[mask], n[mask])})
+    return rollups, reads
+
+
+def sensor_rollups(db, start, end):
+    """
+    One summary per sensor with readings in [start, end), from a range query on the buckets.
+    """
+    query = db.collection(GPS_LOG_BUCKETS) \
+        .where('start', '>=', to_datetime(bucket_start(start))) \
+        .where('start', '<', to_datetime(end))
+    per_sensor, reads = {}, 0
+    for snapshot in query.stream():
+        reads += 1
+        data = snapshot.to_dict()
+        t, lat, lon, n = bucket_points(data)
+        keep = (t >= start) & (t < end)
+        if keep.any():
+            per_sensor.setdefault(data['sensor_id'], []).append((t[keep], lat[keep], lon[keep], n[keep]))
+
+    summaries = {}
+    for sensor_id, points in per_sensor.items():
+        summaries[sensor_id] = summarize(*(np.concatenate(column) for column in zip(*points)))
+    return summaries, reads
+
+
+def downsample(data):
+    """
+    The update that replaces a bucket's chunks with one point per minute (mean time and position,
+    weighted by the readings each point already stands for). It also clears 'raw', so it must only
+    be applied to the bucket as read (see compact_buckets).
+    """
+    t, lat, lon, n = bucket_points(data)
+    start = to_epoch(data['start'])
+    minutes = ((t - start) // DOWNSAMPLE_SECONDS).astype(np.int64)
+    _, inverse = np.unique(minutes, return_inverse=True)
+    weight = np.bincount(inverse, weights=n)
+
+    update = {f"chunks.{chunk_id}": DELETE_FIELD for chunk_id in (data.get('chunks') or {})}
+    if len(t):
+        update[f"chunks.m{uuid.uuid4().hex}"] = {
+            "t": np.round(np.bincount(inverse, weights=(t - start) * n) / weight, 3).tolist(),
+            "lat": (np.bincount(inverse, weights=lat * n) / weight).tolist(),
+            "lon": (np.bincount(inverse, weights=lon * n) / weight).tolist(),
+            "n": weight.astype(int).tolist(),
+        }
+    update["raw"] = False
+    return update, len(t), len(weight)
+
+
+class CompactJob:
+    def __init__(self, raw_days, retention_days):
+        self.id = uuid.uuid4().hex
+        self.description = f"compact gps logs (raw {raw_days} days, kept {retention_days} days)"
+        self.raw_days = raw_days
+        self.retention_days = retention_days
+        self.status = 'queued'  # queued -> migrating -> deleting -> compacting -> done | failed
+        self.legacy_migrated = 0
+        self.buckets_deleted = 0
+        self.buckets_compacted = 0
+        self.points_before = 0
+        self.points_after = 0
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "jobId": self.id,
+                "description": self.description,
+                "status": self.status,
+                "legacyMigrated": self.legacy_migrated,
+                "bucketsDeleted": self.buckets_deleted,
+                "bucketsCompacted": self.buckets_compacted,
+                "pointsBefore": self.points_before,
+                "pointsAfter": self.points_after,
+                "error": self.error,
+                "createdAt": self.created_at,
+                "finishedAt": self.finished_at
+            }
+
+
+def migrate_legacy(db, job):
+    """
+    Moves the flat gps_logs documents into buckets, each page's bucket writes and deletes in
+    one batch so a reading is never in both or neither.
+    """
+    while True:
+        docs = list(db.collection(LEGACY_GPS_LOGS).limit(LEGACY_PAGE).stream())
+        if not docs:
+            return
+        records = []
+        for doc in docs:
+            data = doc.to_dict()
+            if not isinstance(data.get('timestamp'), datetime.datetime):
+                continue  # unreadable, deleted below
+            records.append({"id": doc.id, "sensor_id": data.get('sensor_id'), "latitude": data.get('latitude'),
+                            "longitude": data.get('longitude'), "timestamp": to_epoch(data['timestamp'])})
+        batch = db.batch()
+        for _, ref, data in bucket_writes(db, records):
+            batch.set(ref, data, merge=True)
+        for doc in docs:
+            batch.delete(doc.reference)
+        batch.commit()
+        job.add(legacy_migrated=len(docs))
+
+
+def delete_expired(db, cutoff, job):
+    while True:
+        docs = list(db.collection(GPS_LOG_BUCKETS).where('start', '<', to_datetime(cutoff)).limit(500).stream())
+        if not docs:
+            return
+        batch = db.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+        batch.commit()
+        job.add(buckets_deleted=len(docs))
+
+
+def compact_buckets(db, cutoff, job):
+    while True:
+        docs = list(db.collection(GPS_LOG_BUCKETS).where('raw', '==', True)
+                    .where('start', '<', to_datetime(bucket_start(cutoff))).limit(COMPACT_PAGE).stream())
+        if not docs:
+            return
+        # each update only if the bucket is unchanged since it was read: clearing 'raw' would
+        # otherwise also cover a chunk the writer merged in meanwhile, which is never compacted
+        updates = [(doc, *downsample(doc.to_dict())) for doc in docs]
+        batch = db.batch()
+        for doc, update, _, _ in updates:
+            batch.update(doc.reference, update, option=db.write_option(last_update_time=doc.update_time))
+        try:
+            batch.commit()
+        except FailedPrecondition:
+            # the batch is all or nothing: the unchanged buckets one by one, the changed ones
+            # stay raw and come back in the next page
+            updates = [u for u in updates if update_unchanged(db, *u[:2])]
+        job.add(buckets_compacted=len(updates), points_before=sum(u[2] for u in updates),
+                points_after=sum(u[3] for u in updates))
+
+
+def update_unchanged(db, doc, update):
+    try:
+        doc.reference.update(update, option=db.write_option(last_update_time=doc.update_time))
+    except FailedPrecondition:
+        return False
+    return True
+
+
+def run_compaction(job, db):
+    try:
+        now = time.time()
+        job.status = 'migrating'
+        migrate_legacy(db, job)
+        job.status = 'deleting'
+        delete_expired(db, now - job.retention_days * 86400, job)
+        job.status = 'compacting'
+        compact_buckets(db, now - job.raw_days * 86400, job)
+        job.status = 'done'
+    except Exception as e:
+        print(f"Compacting gps logs failed: {e}")
+        job.status, job.error = 'failed', str(e)
+    finally:
+        job.finished_at = time.time()
+
+
+def start_compaction(db, raw_days=RAW_DAYS, retention_days=RETENTION_DAYS):
+    """
+    In the background: moves legacy gps_logs documents into buckets, deletes buckets older than
+    ``retention_days`` and downsamples those older than ``raw_days`` to one point per minute.
+
+    Returns:
+        CompactJob: pollable at /jobs/<id>.
+    """
+    job = CompactJob(raw_days, retention_days)
+    add_job(job)
+    _runner.submit(run_compaction, job, db)
+    return job
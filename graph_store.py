@@ -0,0 +1,260 @@
+import hashlib
+import json
+import struct
+import zlib
+
+import numpy as np
+from google.api_core.exceptions import FailedPrecondition
+from google.cloud.firestore import DELETE_FIELD
+
+from firestore_fanout import commit_batched
+
+# a floor's graph lives in chunk documents under the floor, the floor document only points at them
+GRAPH_CHUNKS = 'graph_chunks'
+CHUNK_BYTES = 900_000  # Firestore documents are limited to 1 MiB
+MAGIC = b'IGG1'
+
+# portalGroup column: index into the group names, or one of these
+NO_PORTAL_GROUP = -1  # "portalGroup": null
+PORTAL_GROUP_ABSENT = -2  # no portalGroup key at all
+
+# how each adjacency entry was written, so it decodes to exactly what was saved
+EDGE_WEIGHTED = 0  # {"targetNodeId", "weight"}
+EDGE_UNWEIGHTED = 1  # {"targetNodeId"}
+EDGE_TARGET_ONLY = 2  # "targetNodeId"
+
+NODE_FIELDS = ('id', 'coordinates', 'portalGroup')
+EDGE_FIELDS = ('targetNodeId', 'weight')
+
+
+def encode_graph(graph):
+    """
+    Packs a floor graph {"nodes": [...], "adjacencyList": {...}} into compact bytes: coordinates
+    as a float64 array, edges as CSR index/weight arrays, ids and anything else as a small JSON
+    header. Decoding gives back the same graph.
+    """
+    nodes = graph.get("nodes") or []
+    adjacency = graph.get("adjacencyList") or {}
+
+    ids = [node["id"] for node in nodes]
+    index = {node_id: i for i, node_id in enumerate(ids)}
+
+    def id_index(node_id):
+        # adjacency may name ids that are not in the node list; they get rows past the nodes
+        if node_id not in index:
+            index[node_id] = len(ids)
+            ids.append(node_id)
+        return index[node_id]
+
+    coordinates = np.full((len(nodes), 2), np.nan)
+    portal_group = np.full(len(nodes), PORTAL_GROUP_ABSENT, dtype=np.int32)
+    group_names, group_index = [], {}
+    node_extras = {}
+    for i, node in enumerate(nodes):
+        if isinstance(node.get("coordinates"), (list, tuple)) and len(node["coordinates"]) == 2:
+            coordinates[i] = node["coordinates"]
+        elif "coordinates" in node:
+            node_extras.setdefault(i, {})["coordinates"] = node["coordinates"]
+        if "portalGroup" in node:
+            name = node["portalGroup"]
+            if name is None:
+                portal_group[i] = NO_PORTAL_GROUP
+            else:
+                if name not in group_index:
+                    group_index[name] = len(group_names)
+                    group_names.append(name)
+                portal_group[i] = group_index[name]
+        extras = {k: v for k, v in node.items() if k not in NODE_FIELDS}
+        if extras:
+            node_extras.setdefault(i, {}).update(extras)
+
+    listed = {id_index(source): targets or [] for source, targets in adjacency.items()}
+    indptr = np.zeros(len(ids) + 1, dtype=np.uint32)
+    targets, weights, forms, edge_extras = [], [], [], {}
+    for row in range(len(ids)):
+        for edge in listed.get(row, []):
+            if isinstance(edge, dict):
+                weight = edge.get("weight")
+                forms.append(EDGE_UNWEIGHTED if weight is None else EDGE_WEIGHTED)
+                targets.append(id_index(edge.get("targetNodeId")))
+                weights.append(np.nan if weight is None else weight)
+                extras = {k: v for k, v in edge.items() if k not in EDGE_FIELDS}
+                if extras:
+                    edge_extras[len(targets) - 1] = extras
+            else:
+                forms.append(EDGE_TARGET_ONLY)
+                targets.append(id_index(edge))
+                weights.append(np.nan)
+        indptr[row + 1] = len(targets)
+    # targets may have added ids after their rows were filled
+    indptr = np.concatenate((indptr, np.full(len(ids) + 1 - len(indptr), len(targets), dtype=np.uint32)))
+    has_list = np.zeros(len(ids), dtype=bool)
+    has_list[list(listed)] = True
+
+    arrays = [
+        ("coordinates", coordinates.astype('<f8')),
+        ("portalGroup", portal_group.astype('<i4')),
+        ("listed", np.packbits(has_list)),
+        ("indptr", indptr.astype('<u4')),
+        ("indices", np.array(targets, dtype='<u4')),
+        ("weights", np.array(weights, dtype='<f8')),
+        ("forms", np.array(forms, dtype=np.uint8)),
+    ]
+    header = json.dumps({
+        "ids": ids,
+        "numNodes": len(nodes),
+        "portalGroups": group_names,
+        "nodeExtras": {str(i): v for i, v in node_extras.items()},
+        "edgeExtras": {str(i): v for i, v in edge_extras.items()},
+        "arrays": [[name, array.dtype.str, array.size] for name, array in arrays],
+    }, separators=(',', ':')).encode()
+
+    body = b''.join([struct.pack('<I', len(header)), header] + [array.tobytes() for _, array in arrays])
+    return MAGIC + zlib.compress(body, 6)
+
+
+def decode_arrays(data):
+    """
+    Returns:
+        tuple: (header dict, {name: np.ndarray})
+    """
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not an encoded floor graph.")
+    body = zlib.decompress(data[len(MAGIC):])
+    (header_length,) = struct.unpack_from('<I', body)
+    header = json.loads(body[4:4 + header_length])
+
+    arrays, offset = {}, 4 + header_length
+    for name, dtype, size in header["arrays"]:
+        array = np.frombuffer(body, dtype=dtype, count=size, offset=offset)
+        arrays[name] = array
+        offset += array.nbytes
+    arrays["coordinates"] = arrays["coordinates"].reshape(-1, 2)
+    return header, arrays
+
+
+def decode_graph(data):
+    header, arrays = decode_arrays(data)
+    ids, groups = header["ids"], header["portalGroups"]
+    node_extras, edge_extras = header["nodeExtras"], header["edgeExtras"]
+
+    nodes = []
+    coordinates = arrays["coordinates"].tolist()
+    for i, group in enumerate(arrays["portalGroup"].tolist()):
+        node = {"id": ids[i]}
+        if coordinates[i][0] == coordinates[i][0]:  # not NaN
+            node["coordinates"] = coordinates[i]
+        if group != PORTAL_GROUP_ABSENT:
+            node["portalGroup"] = None if group == NO_PORTAL_GROUP else groups[group]
+        node.update(node_extras.get(str(i), {}))
+        nodes.append(node)
+
+    listed = np.unpackbits(arrays["listed"], count=len(ids)).astype(bool)
+    indptr, indices = arrays["indptr"].tolist(), arrays["indices"].tolist()
+    weights, forms = arrays["weights"].tolist(), arrays["forms"].tolist()
+    adjacency = {}
+    for row in np.flatnonzero(listed).tolist():
+        edges = []
+        for e in range(indptr[row], indptr[row + 1]):
+            if forms[e] == EDGE_TARGET_ONLY:
+                edges.append(ids[indices[e]])
+                continue
+            edge = {"targetNodeId": ids[indices[e]]}
+            if forms[e] == EDGE_WEIGHTED:
+                edge["weight"] = weights[e]
+            edge.update(edge_extras.get(str(e), {}))
+            edges.append(edge)
+        adjacency[ids[row]] = edges
+
+    return {"nodes": nodes, "adjacencyList": adjacency}
+
+
+def load_graph(db, floor_doc):
+    """
+    The floor's graph from its chunks, given the floor document snapshot.
+
+    Returns:
+        dict: {"nodes", "adjacencyList"}, or None when the floor has no stored graph yet.
+    """
+    meta = (floor_doc.to_dict() or {}).get('graphStore')
+    if not meta:
+        return None
+    chunks = floor_doc.reference.collection(GRAPH_CHUNKS)
+    refs = [chunks.document(f"{meta['version']}-{i}") for i in range(meta['chunks'])]
+    snapshots = {s.reference.path: s for s in db.get_all(refs)}
+    data = b''.join(snapshots[ref.path].get('data') for ref in refs)
+    return decode_graph(data)
+
+
+def store_graph(db, floor_ref, graph, previous=None, last_update_time=None):
+    """
+    Writes ``graph`` as the floor's canonical graph: new chunks first, then the floor document's
+    pointer, so readers never see a half-written graph. The chunks the pointer moved away from are
+    kept until the next store, for readers that read the old pointer just before it moved; the
+    generation before those is removed.
+
+    The first store also removes the copies the graph used to have (the floor document's
+    ``graph`` field and the ``path_nodes`` documents).
+
+    Args:
+        previous (dict): the floor's current 'graphStore' field, None if it has none yet.
+        last_update_time: the floor document's update_time when ``previous`` was read; if given,
+            the pointer only moves when the floor has not been written since, otherwise the new
+            chunks are removed again and FailedPrecondition is raised.
+
+    Returns:
+        dict: the new 'graphStore' field {"version", "chunks", "bytes", "nodes", "edges",
+        "previous": {"version", "chunks"} or None}
+    """
+    data = encode_graph(graph)
+    version = hashlib.sha1(data).hexdigest()[:16]
+    meta = {
+        "version": version,
+        "chunks": max(1, -(-len(data) // CHUNK_BYTES)),
+        "bytes": len(data),
+        "nodes": len(graph.get("nodes") or []),
+        "edges": sum(len(edges or []) for edges in (graph.get("adjacencyList") or {}).values()),
+    }
+    if previous and previous.get('version') == version:
+        return previous
+    meta["previous"] = {"version": previous['version'], "chunks": previous['chunks']} if previous else None
+
+    chunks = floor_ref.collection(GRAPH_CHUNKS)
+    new = [chunks.document(f"{version}-{i}") for i in range(meta["chunks"])]
+    writes = [[('set', ref, {"data": data[i * CHUNK_BYTES:(i + 1) * CHUNK_BYTES]})] for i, ref in enumerate(new)]
+    errors = [e for e in commit_batched(db, writes) if e is not None]
+    if errors:
+        raise RuntimeError(f"Storing the graph failed: {errors[0]}")
+
+    update = {"graphStore": meta}
+    if previous is None:
+        update["graph"] = DELETE_FIELD
+    if last_update_time is None:
+        floor_ref.update(update)
+    else:
+        try:
+            floor_ref.update(update, option=db.write_option(last_update_time=last_update_time))
+        except FailedPrecondition:
+            # unless the winning write stored the very same graph, nothing points at these chunks
+            current = (floor_ref.get().to_dict() or {}).get('graphStore')
+            if version not in stored_versions(current):
+                commit_batched(db, [[('delete', ref, None)] for ref in new])
+            raise
+
+    if previous:
+        expired = previous.get('previous')
+        old = [] if not expired or expired['version'] in stored_versions(meta) else \
+            [chunks.document(f"{expired['version']}-{i}") for i in range(expired['chunks'])]
+    else:
+        old = list(floor_ref.collection('path_nodes').list_documents())
+    commit_batched(db, [[('delete', ref, None)] for ref in old])
+    return meta
+
+
+def stored_versions(meta):
+    """
+    The chunk generations a 'graphStore' field keeps: the current one and the one it replaced.
+    """
+    if not meta:
+        return set()
+    return {meta['version']} | ({meta['previous']['version']} if meta.get('previous') else set())
@@ -0,0 +1,92 @@
+"""
+gunicorn settings for production:
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Everything can be overridden from the environment. By default one server runs every blueprint
+(SERVER_POOL=all) in a single gthread worker. Behind a reverse proxy the CPU-bound inference and
+the I/O-bound Firestore endpoints can run as two servers, so that slow predictions never hold
+the threads that are waiting on Firestore and vice versa:
+
+    SERVER_POOL=model BIND=127.0.0.1:8081 gunicorn -c gunicorn.conf.py wsgi:application
+    SERVER_POOL=api   BIND=127.0.0.1:8082 gunicorn -c gunicorn.conf.py wsgi:application
+
+with /model/predictMovement and /model/predictMovementBatch proxied to the first and everything
+else to the second. The 'api' server also runs /model, so a request that reaches it anyway is
+still answered.
+
+Only the 'model' server runs several processes by default: the two prediction endpoints keep no
+state between requests, and the model routes (PUT /model/routes) are shared through
+Models/routes.json. The 'all' and 'api' servers run one process because much of their state
+lives in it: streaming and positioning sessions (/model/sessions, /position/sessions), job
+status (/jobs), the snapshot cache with the routing graphs, POI tables, spatial indexes and
+floor models derived from it, which only that process rebuilds after a write. Raising
+WEB_CONCURRENCY for them needs a proxy that sends all requests of one building to the same
+worker and all requests of one session to the same worker (sticky routing); threads are the way
+to take more concurrent requests.
+
+Environment:
+    SERVER_POOL          all | api | model
+    BIND                 address to listen on (default 0.0.0.0:8080)
+    WEB_CONCURRENCY      worker processes
+    WORKER_THREADS       threads per gthread worker
+    WORKER_CLASS         sync | gthread | gevent (gevent must be installed)
+    WORKER_CONNECTIONS   concurrent requests per gevent worker
+    WORKER_TIMEOUT       seconds a request may take before its worker is restarted
+    GRACEFUL_TIMEOUT     seconds a worker gets to finish its requests and flush queued writes
+    MAX_REQUESTS         restart a worker after this many requests (0: never; a restart drops
+                         the worker's sessions and job status)
+    TLS_CERT, TLS_KEY    serve https with this certificate and key
+"""
+import multiprocessing
+import os
+
+pool = os.environ.get('SERVER_POOL', 'all')
+cores = multiprocessing.cpu_count()
+
+POOL_DEFAULTS = {
+    # inference holds the GIL: one single-threaded process per core
+    'model': {'workers': cores, 'threads': 1, 'worker_class': 'sync', 'timeout': 30},
+    # Firestore handlers mostly wait on the network; one process, whose in-memory state they share
+    'api': {'workers': 1, 'threads': 64, 'worker_class': 'gthread', 'timeout': 120},
+    'all': {'workers': 1, 'threads': 64, 'worker_class': 'gthread', 'timeout': 120},
+}
+if pool not in POOL_DEFAULTS:
+    raise ValueError(f"SERVER_POOL must be one of {', '.join(POOL_DEFAULTS)}, not {pool!r}")
+defaults = POOL_DEFAULTS[pool]
+
+bind = os.environ.get('BIND', '0.0.0.0:8080')
+workers = int(os.environ.get('WEB_CONCURRENCY', defaults['workers']))
+worker_class = os.environ.get('WORKER_CLASS', defaults['worker_class'])
+threads = int(os.environ.get('WORKER_THREADS', defaults['threads']))
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 1000))
+timeout = int(os.environ.get('WORKER_TIMEOUT', defaults['timeout']))
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+max_requests = int(os.environ.get('MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+if workers > 1 and pool != 'model':
+    print(f"Warning: {workers} workers for SERVER_POOL={pool}. Sessions, job status and cached building "
+          f"data are per process; without sticky routing requests will miss them (see gunicorn.conf.py).")
+
+if os.environ.get('TLS_CERT'):
+    certfile = os.environ['TLS_CERT']
+    keyfile = os.environ['TLS_KEY']
+
+# import the app and unpickle the models once in the master; workers share the pages after fork
+preload_app = True
+
+# numpy and LightGBM would otherwise each start a thread per core in every worker
+for name in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+    os.environ.setdefault(name, '1')
+
+accesslog = os.environ.get('ACCESS_LOG')
+errorlog = '-'
+
+
+def worker_exit(server, worker):
+    # the worker has stopped taking requests; write out what it still holds in memory, leaving
+    # a margin before the master kills it at graceful_timeout
+    from app import shutdown
+    shutdown(max(graceful_timeout - 5, 1))
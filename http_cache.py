@@ -0,0 +1,14 @@
+from flask import request
+
+
+def conditional_get(response):
+    """
+    after_request hook for read endpoints: tags successful GET responses with an ETag of their
+    body and answers a matching If-None-Match with an empty 304. Streamed bodies are left alone.
+    """
+    if request.method != 'GET' or response.status_code != 200 or response.is_streamed:
+        return response
+    response.add_etag()
+    # clients may keep the body but must check back before using it
+    response.headers.setdefault('Cache-Control', 'no-cache')
+    return response.make_conditional(request)
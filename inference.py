@@ -0,0 +1,71 @@
+import numpy as np
+
+from preprocess import FEATURES
+
+
+class NativePredictor:
+    """
+    Scores feature matrices with the raw LightGBM booster behind a pickled LGBMClassifier.
+
+    The scikit-learn wrapper validates and converts a DataFrame on every call, which costs
+    far more than the trees themselves for a single window. Booster.predict on a contiguous
+    float64 array returns the same class probabilities without that overhead.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.booster = model.booster_
+        self.n_features = model.n_features_in_
+
+    def predict_proba(self, features):
+        """
+        Args:
+            features (array-like): (n_rows, n_features) matrix ordered as the model's features.
+
+        Returns:
+            np.ndarray: (n_rows, n_classes) class probabilities.
+        """
+        features = np.ascontiguousarray(features, dtype=np.float64).reshape(-1, self.n_features)
+        return self.booster.predict(features)
+
+    def matches_wrapper(self, rows=64, seed=0):
+        """
+        Checks the native path against the pickled wrapper's predict_proba on random rows.
+        """
+        import pandas as pd
+
+        probe = np.random.default_rng(seed).normal(0.0, 5.0, size=(rows, self.n_features))
+        columns = FEATURES if self.n_features == len(FEATURES) else None
+        expected = self.model.predict_proba(pd.DataFrame(probe, columns=columns))
+        return np.allclose(self.predict_proba(probe), expected, rtol=0, atol=1e-12)
+
+
+class WrapperPredictor:
+    """
+    Same interface as NativePredictor, going through the scikit-learn wrapper.
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict_proba(self, features):
+        import pandas as pd
+
+        features = np.asarray(features, dtype=np.float64).reshape(-1, self.model.n_features_in_)
+        columns = FEATURES if features.shape[1] == len(FEATURES) else None
+        return self.model.predict_proba(pd.DataFrame(features, columns=columns))
+
+
+def load_predictor(model):
+    """
+    Returns the native predictor for ``model`` when it reproduces the wrapper exactly,
+    otherwise a WrapperPredictor around it, so callers can always use ``.predict_proba(array)``.
+    """
+    try:
+        predictor = NativePredictor(model)
+        if predictor.matches_wrapper():
+            return predictor
+        print("Warning: native LightGBM path disagrees with the pickled model, using the wrapper.")
+    except Exception as e:
+        print(f"Warning: native LightGBM path unavailable ({e}), using the wrapper.")
+    return WrapperPredictor(model)
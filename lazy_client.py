@@ -0,0 +1,44 @@
+import os
+import threading
+
+
+class LazyClient:
+    """
+    Stands in for a client that is only built, by ``factory``, when it is first used.
+
+    Attribute access is forwarded to the client, so code holding the proxy (``from app import db``)
+    uses it as it would the client. It is built once per process under a lock: threads share one
+    instance, and a worker forked after the proxy was used builds its own, since gRPC channels and
+    sockets must not be shared across a fork.
+    """
+
+    def __init__(self, factory, name):
+        self._factory = factory
+        self._name = name
+        self._lock = threading.Lock()
+        self._client = None
+        self._pid = None
+
+    def get(self):
+        """
+        The client itself, built if needed.
+        """
+        client, pid = self._client, self._pid
+        if client is not None and pid == os.getpid():
+            return client
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                self._client = self._factory()
+                self._pid = os.getpid()
+            return self._client
+
+    @property
+    def loaded(self):
+        return self._client is not None and self._pid == os.getpid()
+
+    def __getattr__(self, name):
+        # only reached for names the proxy does not have itself
+        return getattr(self.get(), name)
+
+    def __repr__(self):
+        return f"<LazyClient {self._name} ({'loaded' if self.loaded else 'not loaded'})>"
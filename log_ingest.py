@@ -0,0 +1,259 @@
+import atexit
+import glob
+import json
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+import uuid
+
+from firestore_fanout import BATCH_LIMIT
+
+# readings waiting in memory for the writer; beyond this, requests spill to disk
+QUEUE_LIMIT = 20_000
+# a batch is committed when it is full or its oldest reading has waited this long
+FLUSH_INTERVAL = 1.0
+# readings spilled to local disk while Firestore is slow or failing, per process
+SPILL_DIR = os.path.join(tempfile.gettempdir(), 'gps_log_spill')
+SPILL_LIMIT_BYTES = 256 * 1024 * 1024
+# after a failed commit the writer waits before the next, doubling up to the maximum
+RETRY_DELAY = 0.5
+MAX_RETRY_DELAY = 30.0
+
+SPILL_FILE = re.compile(r"(spill|replay)-(\d+)(?:-\w+)?\.ndjson$")
+
+
+class QueueFull(Exception):
+    """Raised when neither the queue nor the spill directory can take more readings."""
+
+
+class LogWriter:
+    """
+    Writes log readings to Firestore off the request path: handlers ``submit()`` readings into a
+    bounded queue and return, and one background thread commits them in batches of up to
+    ``batch_limit`` readings, as the writes ``writes_for(records)`` returns for them: ('set' |
+    'merge' | 'update' | 'delete', ref, data), 500 writes per Firestore batch. When the queue is
+    full (Firestore slower than the incoming rate) or a commit fails, readings are appended to a
+    local spill file and written later, once the queue drains.
+
+    Every reading gets an 'id' when it is submitted; ``writes_for`` must derive what it writes from
+    the ids, so a batch that is written again after a failure or from a spill file overwrites what
+    it wrote before instead of duplicating it.
+    """
+
+    def __init__(self, db, writes_for, queue_limit=QUEUE_LIMIT, flush_interval=FLUSH_INTERVAL,
+                 spill_dir=SPILL_DIR, spill_limit_bytes=SPILL_LIMIT_BYTES, batch_limit=BATCH_LIMIT):
+        self.db = db
+        self.writes_for = writes_for
+        self.flush_interval = flush_interval
+        self.batch_limit = batch_limit
+        self.spill_dir = spill_dir
+        self.spill_limit_bytes = spill_limit_bytes
+        self._queue = queue.Queue(maxsize=queue_limit)
+        self._spill_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopping = threading.Event()
+        self._retry_delay = 0
+        self._counts_lock = threading.Lock()
+        self.counts = {"written": 0, "spilled": 0, "replayed": 0, "rejected": 0, "failedCommits": 0}
+
+    def _count(self, **counts):
+        with self._counts_lock:
+            for name, value in counts.items():
+                self.counts[name] += value
+
+    def stats(self):
+        with self._counts_lock:
+            counts = dict(self.counts)
+        counts["queued"] = self._queue.qsize()
+        counts["spillBytes"] = sum(os.path.getsize(path) for path in self._spill_files())
+        return counts
+
+    # --- request side ---
+
+    def submit(self, readings):
+        """
+        Queues readings (dicts that serialize to JSON) for writing.
+        Returns at once; raises QueueFull when the queue and the spill directory are both full.
+        """
+        self._ensure_started()
+        records = [dict(reading, id=uuid.uuid4().hex) for reading in readings]
+        for i, record in enumerate(records):
+            try:
+                self._queue.put_nowait(record)
+            except queue.Full:
+                if not self._spill(records[i:]):
+                    self._count(rejected=len(records) - i)
+                    raise QueueFull(f"{len(records) - i} of {len(records)} readings could not be queued.")
+                break
+        return len(records)
+
+    def _ensure_started(self):
+        # started on first use, so a forking server starts one writer in each worker
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def stop(self, timeout=10.0):
+        """
+        Flushes what is queued; anything not written within ``timeout`` goes to the spill file.
+        """
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        remaining = []
+        while True:
+            try:
+                remaining.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if remaining:
+            self._spill(remaining)
+
+    # --- spill files ---
+
+    def _spill_path(self):
+        return os.path.join(self.spill_dir, f"spill-{os.getpid()}.ndjson")
+
+    def _spill_files(self):
+        return [path for path in glob.glob(os.path.join(self.spill_dir, '*.ndjson'))
+                if SPILL_FILE.search(path)]
+
+    def _spill(self, records):
+        lines = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records)
+        with self._spill_lock:
+            try:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                path = self._spill_path()
+                size = os.path.getsize(path) if os.path.exists(path) else 0
+                if size + len(lines) > self.spill_limit_bytes:
+                    return False
+                with open(path, 'a') as f:
+                    f.write(lines)
+            except OSError as e:
+                print(f"Could not spill {len(records)} log readings to disk: {e}")
+                return False
+        self._count(spilled=len(records))
+        return True
+
+    def _claim_spill_files(self):
+        """
+        This process's spill file, renamed so new spills start a fresh one, plus the files left
+        by processes that have exited.
+        """
+        with self._spill_lock:
+            path = self._spill_path()
+            if os.path.exists(path):
+                os.replace(path, os.path.join(self.spill_dir, f"replay-{os.getpid()}-{uuid.uuid4().hex}.ndjson"))
+
+        claimed = []
+        for path in self._spill_files():
+            kind, pid = SPILL_FILE.search(path).groups()
+            pid = int(pid)
+            if pid == os.getpid():
+                if kind == 'replay':
+                    claimed.append(path)
+            elif not _process_alive(pid):
+                mine = os.path.join(self.spill_dir, f"replay-{os.getpid()}-{uuid.uuid4().hex}.ndjson")
+                try:
+                    os.replace(path, mine)
+                except OSError:
+                    continue  # another worker claimed it first
+                claimed.append(mine)
+        return sorted(claimed, key=os.path.getmtime)
+
+    def _replay_spill(self):
+        for path in self._claim_spill_files():
+            batch = []
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        batch.append(json.loads(line))
+                    if len(batch) == self.batch_limit:
+                        if not self._commit(batch, replay=True):
+                            return  # the file stays and is written again later; ids make that harmless
+                        batch = []
+            if batch and not self._commit(batch, replay=True):
+                return
+            os.remove(path)
+            if self._stopping.is_set() or self._queue.qsize() >= self.batch_limit:
+                return  # live readings first
+
+    # --- writer thread ---
+
+    def _take_batch(self):
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=self.flush_interval))
+        except queue.Empty:
+            return batch
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_limit:
+            timeout = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get_nowait() if timeout <= 0 or self._stopping.is_set()
+                             else self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _commit(self, records, replay=False):
+        if self._retry_delay:
+            self._stopping.wait(self._retry_delay)
+        try:
+            writes = list(self.writes_for(records))
+            # ids make a retry after a partly committed set of batches harmless
+            for lo in range(0, len(writes), BATCH_LIMIT):
+                batch = self.db.batch()
+                for method, ref, data in writes[lo:lo + BATCH_LIMIT]:
+                    if method == 'delete':
+                        batch.delete(ref)
+                    elif method == 'merge':
+                        batch.set(ref, data, merge=True)
+                    else:
+                        getattr(batch, method)(ref, data)
+                batch.commit()
+        except Exception as e:
+            self._retry_delay = min(max(self._retry_delay * 2, RETRY_DELAY), MAX_RETRY_DELAY)
+            self._count(failedCommits=1)
+            print(f"Writing {len(records)} log readings failed ({e}), retrying in {self._retry_delay:.1f}s")
+            return False
+        self._retry_delay = 0
+        self._count(**{"replayed" if replay else "written": len(records)})
+        return True
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch and not self._commit(batch) and not self._spill(batch):
+                self._count(rejected=len(batch))
+                print(f"Dropped {len(batch)} log readings: the spill directory is full")
+            if self._stopping.is_set() and self._queue.empty():
+                return
+            # _commit() waits out the retry delay, so a failing Firestore is not hammered by replays
+            if self._queue.qsize() < self.batch_limit and not self._stopping.is_set():
+                try:
+                    self._replay_spill()
+                except OSError as e:
+                    print(f"Replaying spilled log readings failed: {e}")
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
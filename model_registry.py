@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import pickle
+import random
+import re
+import threading
+from collections import OrderedDict
+
+from inference import load_predictor
+from preprocess import FEATURES
+
+
+class ModelNotAvailable(Exception):
+    pass
+
+
+class ModelEntry:
+    def __init__(self, version, path, model, predictor, stat):
+        self.version = version
+        self.path = path
+        self.model = model
+        self.predictor = predictor
+        self.mtime = stat.st_mtime_ns
+        self.size = stat.st_size
+
+    def is_stale(self, stat):
+        return stat.st_mtime_ns != self.mtime or stat.st_size != self.size
+
+
+class ModelRegistry:
+    """
+    Lazily loads the versioned LightGBM pickles in ``model_dir`` and routes requests between them.
+
+    Loaded versions are kept in an LRU bounded by ``max_bytes`` (estimated from the pickle
+    size on disk). Every lookup stats the file and reloads it when it changed, so a new
+    pickle can be dropped in place without restarting; in-flight requests keep the entry
+    they already hold. Traffic is split between versions with ``set_routes``, which stores the
+    split in ``routes.json`` next to the pickles so that every worker process follows it.
+    """
+
+    FILE_PATTERN = re.compile(r'^lightGBM-model_v(\d+)\.pkl$')
+
+    def __init__(self, model_dir='Models', max_bytes=64 * 1024 * 1024):
+        self.model_dir = model_dir
+        self.max_bytes = max_bytes
+        self._loaded = OrderedDict()  # version -> ModelEntry, least recently used first
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._routes = None  # {version: weight}; None routes everything to the latest version
+        self._routes_stat = None  # routes.json as last read: (inode, mtime, size)
+
+    def path_for(self, version):
+        return os.path.join(self.model_dir, f'lightGBM-model_v{version}.pkl')
+
+    def versions(self):
+        try:
+            names = os.listdir(self.model_dir)
+        except FileNotFoundError:
+            return []
+        return sorted(int(m.group(1)) for m in map(self.FILE_PATTERN.match, names) if m)
+
+    def loaded_versions(self):
+        with self._lock:
+            return list(self._loaded)
+
+    @property
+    def routes_path(self):
+        return os.path.join(self.model_dir, 'routes.json')
+
+    def _stored_routes(self):
+        # re-read only when another process (or this one) replaced the file
+        try:
+            stat = os.stat(self.routes_path)
+        except FileNotFoundError:
+            with self._lock:
+                self._routes, self._routes_stat = None, None
+            return None
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if key == self._routes_stat:
+                return self._routes
+        try:
+            with open(self.routes_path) as f:
+                routes = {int(v): float(w) for v, w in json.load(f).items()}
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"Error reading {self.routes_path}, routing to the latest version: {e}")
+            routes = None
+        with self._lock:
+            self._routes, self._routes_stat = routes, key
+        return routes
+
+    def routes(self):
+        routes = self._stored_routes()
+        if routes is not None:
+            return dict(routes)
+        versions = self.versions()
+        return {versions[-1]: 1.0} if versions else {}
+
+    def set_routes(self, weights):
+        """
+        Args:
+            weights (dict | None): {version: weight}; weights are normalised. None restores
+                the default of sending everything to the latest version.
+        """
+        if weights is None:
+            try:
+                os.remove(self.routes_path)
+            except FileNotFoundError:
+                pass
+            return
+
+        weights = {int(v): float(w) for v, w in weights.items()}
+        if not weights or any(w < 0 for w in weights.values()) or sum(weights.values()) <= 0:
+            raise ValueError("Routes need non-negative weights with a positive total.")
+        for version in weights:
+            self.get(version)  # surfaces missing or incompatible versions before routing to them
+
+        total = sum(weights.values())
+        routes = {str(v): w / total for v, w in weights.items() if w > 0}
+        # written aside and renamed, so no process ever reads half a file
+        temporary = f"{self.routes_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump(routes, f)
+        os.replace(temporary, self.routes_path)
+
+    def choose(self, routing_key=None):
+        """
+        Picks a version according to the routes. The same ``routing_key`` (e.g. a device id)
+        always lands on the same version while the routes stay unchanged.
+        """
+        routes = self.routes()
+        if not routes:
+            raise ModelNotAvailable("No model files found.")
+
+        if routing_key is None:
+            point = random.random()
+        else:
+            digest = hashlib.blake2b(str(routing_key).encode(), digest_size=8).digest()
+            point = int.from_bytes(digest, 'big') / 2 ** 64
+
+        cumulative = 0.0
+        for version, weight in sorted(routes.items()):
+            cumulative += weight
+            if point < cumulative:
+                return version
+        return max(routes)
+
+    def get(self, version=None, routing_key=None):
+        """
+        Returns the ModelEntry for ``version``, or for a routed version when it is None,
+        loading or reloading the pickle if needed.
+        """
+        if version is None:
+            version = self.choose(routing_key)
+        try:
+            version = int(version)
+        except (TypeError, ValueError):
+            raise ModelNotAvailable(f"Invalid model version {version!r}.")
+        path = self.path_for(version)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            raise ModelNotAvailable(f"Model version {version} not found.")
+
+        with self._lock:
+            entry = self._loaded.get(version)
+            if entry is not None and not entry.is_stale(stat):
+                self._loaded.move_to_end(version)
+                return entry
+            load_lock = self._load_locks.setdefault(version, threading.Lock())
+
+        with load_lock:
+            # another request may have finished the same load while we waited
+            with self._lock:
+                entry = self._loaded.get(version)
+            stat = os.stat(path)
+            if entry is None or entry.is_stale(stat):
+                entry = self._load(version, path, stat)
+                with self._lock:
+                    self._loaded[version] = entry
+                    self._loaded.move_to_end(version)
+                    self._evict()
+            return entry
+
+    def preload(self):
+        """
+        Loads every version the routes send traffic to, e.g. before a server forks its workers.
+        """
+        for version in self.routes():
+            self.get(version)
+
+    def _load(self, version, path, stat):
+        with open(path, 'rb') as f:
+            model = pickle.load(f)
+        if getattr(model, 'n_features_in_', len(FEATURES)) != len(FEATURES):
+            raise ModelNotAvailable(
+                f"Model version {version} expects {model.n_features_in_} features, "
+                f"the server extracts {len(FEATURES)}.")
+        return ModelEntry(version, path, model, load_predictor(model), stat)
+
+    def _evict(self):
+        # always keep the most recently used entry, even if it alone exceeds the cap
+        while len(self._loaded) > 1 and sum(e.size for e in self._loaded.values()) > self.max_bytes:
+            self._loaded.popitem(last=False)
@@ -0,0 +1,214 @@
+import threading
+import time
+
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+
+from spatial_index import PointIndex
+
+# POI fields that name its category ("restroom", "cafe", ...), first one present wins
+POI_CATEGORY_FIELDS = ('category', 'type')
+
+UNSNAPPED = -1
+
+
+def poi_category(poi):
+    for field in POI_CATEGORY_FIELDS:
+        if poi.get(field):
+            return str(poi[field])
+    return None
+
+
+def snap_pois(graph, pois):
+    """
+    Index of the nearest node on the POI's own floor for every POI, UNSNAPPED when it has no
+    location or its floor has no graph.
+    """
+    floors = np.array(graph.floors[:graph.num_nodes], dtype=object)
+    lat, lon = graph.lat.tolist(), graph.lon.tolist()
+    on_floor = {}
+    nodes = np.full(len(pois), UNSNAPPED, dtype=np.int32)
+
+    for p, poi in enumerate(pois):
+        location = poi.get('location')
+        if not isinstance(location, (list, tuple)) or len(location) != 2:
+            continue
+        floor = poi.get('floor')
+        if floor not in on_floor:
+            on_floor[floor] = PointIndex(np.flatnonzero(floors == floor).tolist(), lambda i: [lat[i], lon[i]])
+        nearest = on_floor[floor].nearest(location[0], location[1])
+        if nearest:
+            nodes[p] = nearest[0][0]
+
+    return nodes
+
+
+class PoiTable:
+    """
+    Precomputed POI distances of one building over its RoutingGraph.
+
+    - ``distances[p, q]``: shortest path weight from POI p to POI q (float32, inf if unreachable).
+    - ``nearest_distance[c, n]`` / ``nearest_poi[c, n]``: from graph node n, the weight to and
+      row of the closest POI of category ``categories[c]`` (-1 if none is reachable).
+
+    POIs are attached to the nearest graph node on their floor.
+    """
+
+    def __init__(self, graph, pois, previous=None):
+        self.graph = graph
+        self.poi_ids = [poi['id'] for poi in pois]
+        self.poi_index = {poi_id: p for p, poi_id in enumerate(self.poi_ids)}
+        self.poi_categories = [poi_category(poi) for poi in pois]
+        self.poi_nodes = snap_pois(graph, pois)
+        self.categories = sorted({c for c in self.poi_categories if c is not None})
+
+        self._csr = graph.to_csr()
+        self._csr_reversed = self._csr.T.tocsr()
+
+        if previous is not None and previous.graph.same_as(graph):
+            self._update_from(previous)
+        else:
+            self._build()
+
+    def _members(self, category):
+        return [p for p, c in enumerate(self.poi_categories) if c == category and self.poi_nodes[p] != UNSNAPPED]
+
+    def _build(self):
+        self.distances = self._distances_between(np.arange(len(self.poi_ids)))
+        self.nearest_distance = np.full((len(self.categories), len(self.graph.ids)), np.inf, dtype=np.float32)
+        self.nearest_poi = np.full((len(self.categories), len(self.graph.ids)), UNSNAPPED, dtype=np.int32)
+        for c, category in enumerate(self.categories):
+            self._build_category(c, self._members(category))
+
+    def _update_from(self, previous):
+        """
+        Same graph, different POIs: keep every distance between POIs that stayed on the same
+        node and only search from the ones that were added or moved.
+        """
+        old_rows = np.array([previous.poi_index.get(poi_id, -1) for poi_id in self.poi_ids], dtype=np.int64)
+        kept = old_rows >= 0
+        kept[kept] = previous.poi_nodes[old_rows[kept]] == self.poi_nodes[kept]
+        changed = np.flatnonzero(~kept)
+
+        self.distances = np.full((len(self.poi_ids), len(self.poi_ids)), np.inf, dtype=np.float32)
+        rows = np.flatnonzero(kept)
+        self.distances[np.ix_(rows, rows)] = previous.distances[np.ix_(old_rows[rows], old_rows[rows])]
+        if len(changed):
+            self._fill_changed(changed)
+
+        self.nearest_distance = np.empty((len(self.categories), len(self.graph.ids)), dtype=np.float32)
+        self.nearest_poi = np.empty((len(self.categories), len(self.graph.ids)), dtype=np.int32)
+        for c, category in enumerate(self.categories):
+            members = self._members(category)
+            before = previous._category_row(category)
+            if before is not None and [self.poi_ids[p] for p in members] == previous._member_ids(category) \
+                    and not np.isin(members, changed).any():
+                self.nearest_distance[c] = previous.nearest_distance[before]
+                self.nearest_poi[c] = self._remap(previous, previous.nearest_poi[before])
+            else:
+                self._build_category(c, members)
+
+    def _remap(self, previous, old_nearest):
+        # previous rows -> current rows; the extra last slot maps UNSNAPPED (-1) to itself
+        lookup = np.full(len(previous.poi_ids) + 1, UNSNAPPED, dtype=np.int32)
+        for p, poi_id in enumerate(previous.poi_ids):
+            lookup[p] = self.poi_index.get(poi_id, UNSNAPPED)
+        return lookup[old_nearest]
+
+    def _category_row(self, category):
+        return self.categories.index(category) if category in self.categories else None
+
+    def _member_ids(self, category):
+        return [self.poi_ids[p] for p in self._members(category)]
+
+    def _distances_between(self, rows):
+        distances = np.full((len(self.poi_ids), len(self.poi_ids)), np.inf, dtype=np.float32)
+        snapped = self.poi_nodes != UNSNAPPED
+        sources = rows[snapped[rows]]
+        if len(sources) and snapped.any():
+            from_sources = dijkstra(self._csr, indices=self.poi_nodes[sources])
+            distances[np.ix_(sources, np.flatnonzero(snapped))] = from_sources[:, self.poi_nodes[snapped]]
+        return distances
+
+    def _fill_changed(self, changed):
+        snapped = np.flatnonzero(self.poi_nodes != UNSNAPPED)
+        sources = changed[self.poi_nodes[changed] != UNSNAPPED]
+        if not len(sources) or not len(snapped):
+            return
+        nodes = self.poi_nodes[sources]
+        # rows: from each changed POI to all; columns: from all to each changed POI (reversed edges)
+        self.distances[np.ix_(sources, snapped)] = dijkstra(self._csr, indices=nodes)[:, self.poi_nodes[snapped]]
+        self.distances[np.ix_(snapped, sources)] = \
+            dijkstra(self._csr_reversed, indices=nodes)[:, self.poi_nodes[snapped]].T
+
+    def _build_category(self, c, members):
+        self.nearest_distance[c] = np.inf
+        self.nearest_poi[c] = UNSNAPPED
+        if not members:
+            return
+        # one search over the reversed edges from every POI of the category at once
+        distance, _, source_nodes = dijkstra(self._csr_reversed, indices=self.poi_nodes[members],
+                                             min_only=True, return_predecessors=True)
+        # several POIs on one node: the first one listed answers for it
+        members = np.array(members)
+        poi_at_node = np.full(len(self.graph.ids), UNSNAPPED, dtype=np.int32)
+        poi_at_node[self.poi_nodes[members[::-1]]] = members[::-1]
+        self.nearest_distance[c] = distance
+        self.nearest_poi[c] = np.where(source_nodes >= 0, poi_at_node[source_nodes], UNSNAPPED)
+
+    def nearest(self, node_id, category):
+        """
+        Returns:
+            tuple: (poi_id, distance) of the closest POI of ``category`` from ``node_id``, or None.
+        """
+        if category not in self.categories or node_id not in self.graph.index:
+            return None
+        c, n = self.categories.index(category), self.graph.index[node_id]
+        p = self.nearest_poi[c, n]
+        if p == UNSNAPPED:
+            return None
+        return self.poi_ids[p], float(self.nearest_distance[c, n])
+
+    def distances_from(self, poi_id):
+        """
+        Returns:
+            dict: {other_poi_id: distance} for every POI reachable from ``poi_id``, or None if unknown.
+        """
+        if poi_id not in self.poi_index:
+            return None
+        row = self.distances[self.poi_index[poi_id]]
+        return {self.poi_ids[q]: float(row[q]) for q in np.flatnonzero(np.isfinite(row))}
+
+
+class PoiTableCache:
+    """
+    One PoiTable per building. Invalidation only marks the table stale: the next lookup
+    rebuilds it from the previous one, so a POI write re-searches just the POIs it touched.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._tables = {}  # building_id -> (expires_at, table)
+        self._generations = {}  # building_id -> invalidation count
+        self._lock = threading.Lock()
+
+    def get_or_build(self, building_id, graph, load_pois):
+        with self._lock:
+            item = self._tables.get(building_id)
+            generation = self._generations.get(building_id, 0)
+        if item is not None and item[0] > time.monotonic() and item[1].graph is graph:
+            return item[1]
+
+        table = PoiTable(graph, load_pois(), previous=item[1] if item else None)
+        with self._lock:
+            # invalidated while building: the POIs may predate the write, so the stale mark stays
+            if self._generations.get(building_id, 0) == generation:
+                self._tables[building_id] = (time.monotonic() + self.ttl, table)
+        return table
+
+    def invalidate(self, building_id):
+        with self._lock:
+            item = self._tables.get(building_id)
+            if item is not None:
+                self._tables[building_id] = (0, item[1])
+            self._generations[building_id] = self._generations.get(building_id, 0) + 1
@@ -0,0 +1,264 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+from spatial_index import LocalProjection
+
+# walking speed (mean, std) in m/s per predicted movement class; None when no prediction yet
+MOTION = {
+    'Halt': (0.0, 0.1),
+    'Forward': (1.2, 0.3),
+    'Turn': (0.5, 0.3),
+    None: (0.6, 0.6),
+}
+# chance per update that a particle reverses along its edge while the user is turning
+TURN_REVERSE_PROBABILITY = 0.2
+
+# log-distance path loss: rssi = txPower - 10 * n * log10(distance_m)
+DEFAULT_TX_POWER = -59  # RSSI at 1 m
+PATH_LOSS_EXPONENT = 2.0
+RSSI_SIGMA_DB = 6.0
+
+SNAP_RESOLUTION = 0.5  # metres between the points that particles are snapped to
+
+
+def rssi_to_distance(rssi, tx_power=DEFAULT_TX_POWER):
+    return 10 ** ((np.asarray(tx_power, dtype=np.float64) - rssi) / (10 * PATH_LOSS_EXPONENT))
+
+
+def trilaterate(beacon_xy, distances):
+    """
+    Least-squares position from three or more beacon ranges, falling back to the centroid
+    weighted by 1/d^2 when there are fewer or they are (nearly) collinear.
+
+    Args:
+        beacon_xy (np.ndarray): (k, 2) beacon positions in metres.
+        distances (np.ndarray): (k,) estimated ranges in metres.
+    """
+    weights = 1.0 / np.maximum(distances, 0.5) ** 2
+    centroid = (beacon_xy * weights[:, None]).sum(axis=0) / weights.sum()
+    if len(beacon_xy) < 3:
+        return centroid
+
+    # subtracting the last range equation from the others linearises the system
+    a = 2 * (beacon_xy[-1] - beacon_xy[:-1])
+    b = (distances[:-1] ** 2 - distances[-1] ** 2
+         - (beacon_xy[:-1] ** 2).sum(axis=1) + (beacon_xy[-1] ** 2).sum())
+    solution, _, rank, _ = np.linalg.lstsq(a, b, rcond=None)
+    return solution if rank == 2 else centroid
+
+
+class PathGeometry:
+    """
+    A floor's path graph as straight segments in metres. A point on the graph is an
+    (edge, offset) pair, the offset running from the edge's ``start`` node to its ``end`` node.
+    """
+
+    def __init__(self, nodes, adjacency):
+        """
+        Args:
+            nodes (list): [{"id", "coordinates": [lat, lng]}] as served by /paths.
+            adjacency (dict): {node_id: [{"targetNodeId", ...} | node_id, ...]}
+        """
+        nodes = [n for n in nodes if isinstance(n.get('coordinates'), (list, tuple))]
+        self.node_ids = [n['id'] for n in nodes]
+        index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        latlng = np.array([n['coordinates'] for n in nodes], dtype=np.float64).reshape(-1, 2)
+        self.projection = LocalProjection(latlng.mean(axis=0) if len(latlng) else np.zeros(2))
+        self.node_xy = self.projection.forward(latlng)
+
+        pairs = set()
+        for source, targets in adjacency.items():
+            for target in targets or []:
+                target = target.get('targetNodeId') if isinstance(target, dict) else target
+                if source in index and target in index and source != target:
+                    pairs.add((min(index[source], index[target]), max(index[source], index[target])))
+        pairs = np.array(sorted(pairs), dtype=np.int64).reshape(-1, 2)
+
+        self.start, self.end = pairs[:, 0], pairs[:, 1]
+        self.start_xy, self.end_xy = self.node_xy[self.start], self.node_xy[self.end]
+        self.length = np.linalg.norm(self.end_xy - self.start_xy, axis=1)
+        self._unit = np.divide(self.end_xy - self.start_xy, self.length[:, None],
+                               out=np.zeros_like(self.start_xy), where=self.length[:, None] > 0)
+
+        # incident edges per node, CSR style
+        incident_nodes = np.concatenate((self.start, self.end))
+        order = np.argsort(incident_nodes, kind='stable')
+        self.incident = np.concatenate((np.arange(len(pairs)), np.arange(len(pairs))))[order]
+        self.incident_ptr = np.zeros(len(self.node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(incident_nodes, minlength=len(self.node_ids)), out=self.incident_ptr[1:])
+
+        self._snap_tree = None
+        total = self.length.sum()
+        self._edge_cdf = np.cumsum(self.length) / total if total > 0 else None
+
+    def __len__(self):
+        return len(self.length)
+
+    def positions(self, edge, offset):
+        return self.start_xy[edge] + self._unit[edge] * offset[:, None]
+
+    def uniform(self, count, rng):
+        """
+        ``count`` points spread uniformly along the whole graph.
+        """
+        edge = np.minimum(np.searchsorted(self._edge_cdf, rng.random(count)), len(self) - 1)
+        return edge, rng.random(count) * self.length[edge]
+
+    def snap(self, xy):
+        """
+        Closest point on the graph for each row of ``xy``, to within SNAP_RESOLUTION / 2.
+        """
+        if self._snap_tree is None:
+            # sample every edge densely once; a snap is then one KD-tree query
+            count = np.maximum(np.ceil(self.length / SNAP_RESOLUTION).astype(np.int64), 1) + 1
+            edge = np.repeat(np.arange(len(self)), count)
+            fraction = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+            fraction = fraction / np.repeat(count - 1, count)
+            self._snap_edge, self._snap_offset = edge, fraction * self.length[edge]
+            self._snap_tree = cKDTree(self.positions(edge, self._snap_offset))
+        _, nearest = self._snap_tree.query(xy)
+        return self._snap_edge[nearest], self._snap_offset[nearest]
+
+    def walk(self, edge, offset, heading, step, rng, max_hops=8):
+        """
+        Moves every point ``step`` metres along the graph in its ``heading`` (+1 towards the
+        edge's end node, -1 towards its start), picking a random other edge at each node.
+        Points that reach a dead end stop there and turn around.
+        """
+        offset = offset + heading * step
+        for _ in range(max_hops):
+            past_end = offset > self.length[edge]
+            past_start = offset < 0
+            over = past_end | past_start
+            if not over.any():
+                break
+
+            idx = np.flatnonzero(over)
+            at_end = past_end[idx]
+            node = np.where(at_end, self.end[edge[idx]], self.start[edge[idx]])
+            left = np.where(at_end, offset[idx] - self.length[edge[idx]], -offset[idx])
+
+            degree = self.incident_ptr[node + 1] - self.incident_ptr[node]
+            pick = (rng.random(len(idx)) * degree).astype(np.int64)
+            chosen = self.incident[self.incident_ptr[node] + pick]
+            # avoid going straight back where another edge exists
+            back = (chosen == edge[idx]) & (degree > 1)
+            chosen[back] = self.incident[self.incident_ptr[node[back]] + (pick[back] + 1) % degree[back]]
+
+            dead_end = chosen == edge[idx]
+            leaves_start = self.start[chosen] == node
+            new_heading = np.where(dead_end, -heading[idx], np.where(leaves_start, 1, -1))
+            new_offset = np.where(new_heading > 0, left, self.length[chosen] - left)
+            new_offset = np.where(dead_end, np.where(at_end, self.length[chosen], 0.0), new_offset)
+
+            edge[idx], offset[idx], heading[idx] = chosen, new_offset, new_heading
+
+        return edge, np.clip(offset, 0.0, self.length[edge]), heading
+
+
+class ParticleFilter:
+    """
+    Position of one user on one floor: particles on the path graph, moved by the predicted
+    movement class and weighted by how well each explains the latest beacon RSSI scan.
+
+    Args:
+        geometry (PathGeometry): the floor's path graph.
+        beacons (dict): {beaconId: {"xy": [x, y] in the geometry's metres, "txPower": dBm}}
+        num_particles (int): particles for this session.
+    """
+
+    def __init__(self, geometry, beacons, num_particles=500, seed=None):
+        self.geometry = geometry
+        self.beacons = beacons
+        self.num_particles = num_particles
+        self.rng = np.random.default_rng(seed)
+        self.edge = self.offset = self.heading = self.weights = None
+
+    @property
+    def initialised(self):
+        return self.edge is not None
+
+    def _scan_arrays(self, scan):
+        known = [(self.beacons[b]['xy'], self.beacons[b].get('txPower', DEFAULT_TX_POWER), rssi)
+                 for b, rssi in scan.items() if b in self.beacons]
+        if not known:
+            return None
+        xy, tx_power, rssi = zip(*known)
+        return np.array(xy, dtype=np.float64), np.array(tx_power, dtype=np.float64), np.array(rssi, dtype=np.float64)
+
+    def _seed(self, measured):
+        if measured is None:
+            edge, offset = self.geometry.uniform(self.num_particles, self.rng)
+        else:
+            xy, tx_power, rssi = measured
+            distances = rssi_to_distance(rssi, tx_power)
+            center = trilaterate(xy, distances)
+            spread = max(3.0, float(np.median(distances)) * 0.5)
+            samples = center + self.rng.normal(0.0, spread, (self.num_particles, 2))
+            edge, offset = self.geometry.snap(samples)
+        self.edge, self.offset = edge, offset
+        self.heading = self.rng.choice(np.array([-1.0, 1.0]), self.num_particles)
+        self.weights = np.full(self.num_particles, 1.0 / self.num_particles)
+
+    def _predict(self, movement, dt):
+        mean, std = MOTION.get(movement, MOTION[None])
+        step = np.maximum(self.rng.normal(mean, std, self.num_particles), 0.0) * dt
+        if movement == 'Turn':
+            reverse = self.rng.random(self.num_particles) < TURN_REVERSE_PROBABILITY
+            self.heading[reverse] *= -1
+        self.edge, self.offset, self.heading = self.geometry.walk(self.edge, self.offset, self.heading, step, self.rng)
+
+    def _update(self, measured):
+        xy, tx_power, rssi = measured
+        particles = self.geometry.positions(self.edge, self.offset)
+        dx = particles[:, 0, None] - xy[None, :, 0]
+        dy = particles[:, 1, None] - xy[None, :, 1]
+        # 10 * n * log10(d) == 5 * n * log10(d^2), no square root needed
+        expected = tx_power[None] - 5 * PATH_LOSS_EXPONENT * np.log10(np.maximum(dx * dx + dy * dy, 0.25))
+        log_likelihood = -0.5 * (((rssi[None] - expected) / RSSI_SIGMA_DB) ** 2).sum(axis=1)
+
+        weights = self.weights * np.exp(log_likelihood - log_likelihood.max())
+        total = weights.sum()
+        if not np.isfinite(total) or total <= 0:
+            self._seed(measured)
+            return
+        self.weights = weights / total
+
+        if 1.0 / (self.weights ** 2).sum() < self.num_particles / 2:
+            self._resample()
+
+    def _resample(self):
+        # systematic resampling
+        positions = (self.rng.random() + np.arange(self.num_particles)) / self.num_particles
+        chosen = np.minimum(np.searchsorted(np.cumsum(self.weights), positions), self.num_particles - 1)
+        self.edge, self.offset, self.heading = self.edge[chosen], self.offset[chosen], self.heading[chosen]
+        self.weights = np.full(self.num_particles, 1.0 / self.num_particles)
+
+    def step(self, scan=None, movement=None, dt=0.0):
+        """
+        Advances the filter by one update.
+
+        Args:
+            scan (dict): {beaconId: rssi} heard since the last update (may be empty).
+            movement (str): 'Halt' / 'Forward' / 'Turn', or None if unknown.
+            dt (float): seconds since the last update.
+
+        Returns:
+            dict: {"lat", "lng", "accuracy" (metres, 1 sigma), "beaconsUsed"}
+        """
+        measured = self._scan_arrays(scan or {})
+        if not self.initialised:
+            self._seed(measured)
+        else:
+            if dt > 0:
+                self._predict(movement, dt)
+            if measured is not None:
+                self._update(measured)
+        return self.estimate(0 if measured is None else len(measured[0]))
+
+    def estimate(self, beacons_used=0):
+        particles = self.geometry.positions(self.edge, self.offset)
+        mean = (particles * self.weights[:, None]).sum(axis=0)
+        spread = np.sqrt((self.weights * ((particles - mean) ** 2).sum(axis=1)).sum())
+        lat, lng = self.geometry.projection.inverse(mean)[0]
+        return {"lat": float(lat), "lng": float(lng), "accuracy": float(spread), "beaconsUsed": beacons_used}
@@ -1,34 +1,85 @@
-import pandas as pd
+import sys
+
 import numpy as np
-from scipy.spatial.transform import Rotation as R
-from scipy.fft import fft, fftfreq
 
 
-def rotate_accelerometer_to_world_frame(sensor_df):
-    acc_data = sensor_df[['acc_x', 'acc_y', 'acc_z']].copy()
-    acc_gravity = sensor_df[['acc_gx', 'acc_gy', 'acc_gz']].copy()
-    orientation = sensor_df[['gyro_x', 'gyro_y', 'gyro_z']].copy()  # temporary
+ACC_COLUMNS = ['acc_x', 'acc_y', 'acc_z']
+GRAVITY_COLUMNS = ['acc_gx', 'acc_gy', 'acc_gz']
+ORIENTATION_COLUMNS = ['gyro_x', 'gyro_y', 'gyro_z']  # temporary: carries alpha/beta/gamma
+GPS_COLUMNS = ['gps_lat', 'gps_lon']
+
+# channel layout of the (n_samples, n_channels) arrays fed to extract_features
+SENSOR_CHANNELS = ACC_COLUMNS + GRAVITY_COLUMNS + ORIENTATION_COLUMNS + GPS_COLUMNS
+ACC_SLICE = slice(0, 3)
+GRAVITY_SLICE = slice(3, 6)
+ORIENTATION_SLICE = slice(6, 9)
+GYRO_Z = 8
+GPS_SLICE = slice(9, 11)
+
+# column order the LightGBM models were trained on
+FEATURES = [
+    'avg_acc_x', 'median_acc_x', 'std_acc_x', 'min_x', 'max_x', 'mean_abs_x',
+    'avg_acc_y', 'median_acc_y', 'std_acc_y', 'min_y', 'max_y', 'mean_abs_y',
+    'avg_acc_z', 'median_acc_z', 'std_acc_z', 'min_z', 'max_z', 'mean_abs_z',
+    'avg_acc_gx', 'avg_acc_gy', 'avg_acc_gz',
+    'gyro_z_mean', 'gyro_z_std', 'gyro_z_max', 'gyro_z_min',
+    'mean_magnitude', 'signal_magnitude_area',
+    'mean_freq_x', 'dominant_freq_x',
+    'mean_freq_y', 'dominant_freq_y',
+    'mean_freq_z', 'dominant_freq_z',
+    'lat_diff', 'lon_diff'
+]
+
+
+def rotate_to_world_frame(acc, acc_gravity, orientation):
+    """
+    Rotates a whole window of accelerometer readings into the world frame at once.
+    Inputs with extra leading dimensions (e.g. a stack of windows) are flattened to n samples.
+
+    Args:
+        acc (array-like): (n, 3) linear acceleration in the device frame.
+        acc_gravity (array-like): (n, 3) acceleration including gravity in the device frame.
+        orientation (array-like): (n, 3) yaw/pitch/roll in degrees.
 
-    columns = ['acc_x', 'acc_y', 'acc_z', 'acc_gx', 'acc_gy', 'acc_gz', 'mean_magnitude']
-    result_df = pd.DataFrame(columns=columns)
+    Returns:
+        tuple: (acc_world, gravity_world, magnitude) as float64 arrays of shape
+        (n, 3), (n, 3) and (n,).
+    """
+    from scipy.spatial.transform import Rotation as R
 
-    for acc, acc_g, ori in zip(acc_data.itertuples(index=False), acc_gravity.itertuples(index=False), orientation.itertuples(index=False)):
-        yaw = np.deg2rad(ori.gyro_x)  # was orientation_alpha
-        pitch = np.deg2rad(ori.gyro_y)  # was orientation_beta
-        roll = np.deg2rad(ori.gyro_z)  # was orientation_gamma
+    # copies on purpose: Rotation.apply rejects the read-only views pandas hands out
+    acc = np.array(acc, dtype=np.float64).reshape(-1, 3)
+    acc_gravity = np.array(acc_gravity, dtype=np.float64).reshape(-1, 3)
+    orientation = np.asarray(orientation, dtype=np.float64).reshape(-1, 3)
 
-        r = R.from_euler('zyx', [yaw, pitch, roll])
-        acc_world = r.apply([acc.acc_x, acc.acc_y, acc.acc_z])
-        gravity_world = r.apply([acc_g.acc_gx, acc_g.acc_gy, acc_g.acc_gz])
-        mean_magnitude = np.linalg.norm(acc_world)
+    if len(acc) == 0:
+        return np.empty((0, 3)), np.empty((0, 3)), np.empty(0)
 
-        result = pd.DataFrame([list(acc_world) + list(gravity_world) + [mean_magnitude]], columns=columns)
-        result_df = pd.concat([result_df, result], ignore_index=True)
+    # one Rotation object holding every sample's yaw/pitch/roll
+    r = R.from_euler('zyx', np.deg2rad(orientation))
+    acc_world = r.apply(acc)
+    gravity_world = r.apply(acc_gravity)
+    magnitude = np.linalg.norm(acc_world, axis=1)
 
-    return result_df
+    return acc_world, gravity_world, magnitude
+
+
+def rotate_accelerometer_to_world_frame(sensor_df):
+    import pandas as pd
+
+    acc_world, gravity_world, magnitude = rotate_to_world_frame(
+        sensor_df[ACC_COLUMNS].to_numpy(dtype=np.float64),
+        sensor_df[GRAVITY_COLUMNS].to_numpy(dtype=np.float64),
+        sensor_df[ORIENTATION_COLUMNS].to_numpy(dtype=np.float64),
+    )
+
+    columns = ACC_COLUMNS + GRAVITY_COLUMNS + ['mean_magnitude']
+    return pd.DataFrame(np.column_stack([acc_world, gravity_world, magnitude]), columns=columns)
 
 
 def compute_frequency_domain(signal, interval):
+    from scipy.fft import fft, fftfreq
+
     N = len(signal)
     fs = 1000 / interval
     frequencies = fftfreq(N, d=1 / fs)
@@ -46,82 +97,162 @@ def compute_frequency_domain(signal, interval):
     return np.sum(frequencies * power) / np.sum(power), frequencies[np.argmax(fft_values)]
 
 
+def frequency_features(signals, interval):
+    """
+    Mean and dominant frequency of every signal in ``signals`` from a single rfft call.
+
+    Matches compute_frequency_domain signal by signal: only strictly positive
+    frequencies below Nyquist are considered, and an all-zero spectrum yields (0.0, 0.0).
+
+    Args:
+        signals (np.ndarray): (..., n, k) array with time along the second-to-last axis,
+            one signal per column.
+        interval (float): Sampling interval in milliseconds.
+
+    Returns:
+        tuple: (mean_freq, dominant_freq), each a float64 array of shape (..., k).
+    """
+    from scipy.fft import rfft
+
+    n = signals.shape[-2]
+
+    # fftfreq marks bins 1..(n-1)//2 as positive; the even-n Nyquist bin counts as negative
+    n_positive = (n - 1) // 2
+    fft_values = np.abs(rfft(signals, axis=-2))[..., 1:n_positive + 1, :]
+    return spectrum_frequencies(fft_values, n, interval)
+
+
+def spectrum_frequencies(fft_values, n, interval):
+    """
+    Mean and dominant frequency from the magnitudes of the positive DFT bins 1..(n-1)//2.
+
+    Args:
+        fft_values (np.ndarray): (..., (n-1)//2, k) magnitudes, one signal per column.
+        n (int): Window length the spectrum was taken over.
+        interval (float): Sampling interval in milliseconds.
+
+    Returns:
+        tuple: (mean_freq, dominant_freq), each a float64 array of shape (..., k).
+    """
+    n_positive = fft_values.shape[-2]
+    if n_positive == 0:
+        zeros = np.zeros(fft_values.shape[:-2] + fft_values.shape[-1:])
+        return zeros, zeros.copy()
+
+    fs = 1000 / interval
+    frequencies = np.arange(1, n_positive + 1) * (fs / n)
+
+    power = fft_values ** 2
+    total_power = power.sum(axis=-2)
+    nonzero = total_power != 0  # <- guard against all zeros
+
+    weighted = np.einsum('f,...fk->...k', frequencies, power)
+    mean_freq = np.divide(weighted, total_power, out=np.zeros_like(weighted), where=nonzero)
+    dominant_freq = np.where(nonzero, frequencies[np.argmax(fft_values, axis=-2)], 0.0)
+
+    return mean_freq, dominant_freq
+
+
+def is_dataframe(data):
+    # pandas is imported on first use only (it is slow to import); no DataFrame exists before that
+    pd = sys.modules.get('pandas')
+    return pd is not None and isinstance(data, pd.DataFrame)
+
+
+def window_to_array(data):
+    """
+    Packs a sensor window into the contiguous (n_samples, n_channels) layout used by extract_features.
+
+    Args:
+        data (pd.DataFrame | list): The window as a DataFrame or as the list of sample dicts
+            sent to /model/predictMovement.
+
+    Returns:
+        np.ndarray: float64 array with the channels ordered as SENSOR_CHANNELS.
+    """
+    if is_dataframe(data):
+        return np.ascontiguousarray(data[SENSOR_CHANNELS].to_numpy(dtype=np.float64))
+    rows = [[sample[c] for c in SENSOR_CHANNELS] for sample in data]
+    return np.array(rows, dtype=np.float64).reshape(-1, len(SENSOR_CHANNELS))
+
+
+def extract_features_batch(windows, data_interval=500):
+    """
+    Computes the model's feature vectors for a stack of equally long windows at once.
+
+    Args:
+        windows (np.ndarray): (n_windows, n_samples, n_channels) float array laid out as SENSOR_CHANNELS.
+        data_interval (float): Sampling interval in milliseconds.
+
+    Returns:
+        np.ndarray: (n_windows, len(FEATURES)) float64 matrix, columns ordered as FEATURES.
+    """
+    m, n, _ = windows.shape
+    acc_world, gravity_world, magnitude = rotate_to_world_frame(
+        windows[:, :, ACC_SLICE], windows[:, :, GRAVITY_SLICE], windows[:, :, ORIENTATION_SLICE])
+    acc_world = acc_world.reshape(m, n, 3)
+    gravity_world = gravity_world.reshape(m, n, 3)
+    magnitude = magnitude.reshape(m, n)
+    gyro_z = windows[:, :, GYRO_Z]
+
+    # fused per-axis reductions over the rotated accelerometer, one block per statistic
+    acc_mean = acc_world.mean(axis=1)
+    acc_stats = np.stack([
+        acc_mean,
+        np.median(acc_world, axis=1),
+        acc_world.std(axis=1, ddof=1),
+        acc_world.min(axis=1),
+        acc_world.max(axis=1),
+        np.abs(acc_world).mean(axis=1),
+    ], axis=2)  # (m, axis, statistic)
+    mean_freq, dominant_freq = frequency_features(acc_world, data_interval)
+
+    return np.column_stack([
+        acc_stats.reshape(m, -1),  # avg, median, std, min, max, mean_abs for x, then y, then z
+        gravity_world.mean(axis=1),
+        gyro_z.mean(axis=1), gyro_z.std(axis=1, ddof=1), gyro_z.max(axis=1), gyro_z.min(axis=1),
+        magnitude.mean(axis=1), np.abs(acc_mean).sum(axis=1),
+        np.stack([mean_freq, dominant_freq], axis=2).reshape(m, -1),
+        windows[:, 0, GPS_SLICE] - windows[:, -1, GPS_SLICE],
+    ])
+
+
+def extract_features(window, data_interval=500):
+    """
+    Computes the model's feature vector for one window in a single pass over a NumPy array.
+
+    Args:
+        window (np.ndarray): (n_samples, n_channels) float array laid out as SENSOR_CHANNELS.
+        data_interval (float): Sampling interval in milliseconds.
+
+    Returns:
+        np.ndarray: float64 vector ordered as FEATURES.
+    """
+    return extract_features_batch(window[np.newaxis], data_interval)[0]
+
+
+def sliding_windows(stream, window_size, stride):
+    """
+    Cuts a long (n_samples, n_channels) recording into overlapping windows without copying.
+
+    Args:
+        stream (np.ndarray): The recording laid out as SENSOR_CHANNELS.
+        window_size (int): Samples per window.
+        stride (int): Samples between the starts of consecutive windows.
+
+    Returns:
+        np.ndarray: Read-only (n_windows, window_size, n_channels) view into ``stream``.
+    """
+    if window_size <= 0 or stride <= 0:
+        raise ValueError("window_size and stride must be positive.")
+    if len(stream) < window_size:
+        return np.empty((0, window_size, stream.shape[1]))
+    view = np.lib.stride_tricks.sliding_window_view(stream, window_size, axis=0)  # (w, c, size)
+    return view[::stride].transpose(0, 2, 1)
+
 
 def preprocess(data, data_interval=500):
+    import pandas as pd
 
-    features = [
-        'avg_acc_x', 'median_acc_x', 'std_acc_x', 'min_x', 'max_x', 'mean_abs_x',
-        'avg_acc_y', 'median_acc_y', 'std_acc_y', 'min_y', 'max_y', 'mean_abs_y',
-        'avg_acc_z', 'median_acc_z', 'std_acc_z', 'min_z', 'max_z', 'mean_abs_z',
-        'avg_acc_gx', 'avg_acc_gy', 'avg_acc_gz',
-        'gyro_z_mean', 'gyro_z_std', 'gyro_z_max', 'gyro_z_min',
-        'mean_magnitude', 'signal_magnitude_area',
-        'mean_freq_x', 'dominant_freq_x',
-        'mean_freq_y', 'dominant_freq_y',
-        'mean_freq_z', 'dominant_freq_z',
-        'lat_diff', 'lon_diff'
-    ]
-    result_df = pd.DataFrame(columns=features)
-
-    rotated_df = rotate_accelerometer_to_world_frame(data)
-
-    # accelerometer of this window frame
-    mean_acc_x = rotated_df['acc_x'].mean()
-    median_acc_x = rotated_df['acc_x'].median()
-    std_acc_x = rotated_df['acc_x'].std()
-    min_acc_x = rotated_df['acc_x'].min()
-    max_acc_x = rotated_df['acc_x'].max()
-    mean_abs_x = rotated_df['acc_x'].abs().mean()
-    # ------------------------------------
-    mean_acc_y = rotated_df['acc_y'].mean()
-    median_acc_y = rotated_df['acc_y'].median()
-    std_acc_y = rotated_df['acc_y'].std()
-    min_acc_y = rotated_df['acc_y'].min()
-    max_acc_y = rotated_df['acc_y'].max()
-    mean_abs_y = rotated_df['acc_y'].abs().mean()
-    # ------------------------------------
-    mean_acc_z = rotated_df['acc_z'].mean()
-    median_acc_z = rotated_df['acc_z'].median()
-    std_acc_z = rotated_df['acc_z'].std()
-    min_acc_z = rotated_df['acc_z'].min()
-    max_acc_z = rotated_df['acc_z'].max()
-    mean_abs_z = rotated_df['acc_z'].abs().mean()
-
-    # accelerometer (including gravity) of this window frame
-    mean_acc_gx = rotated_df['acc_gx'].mean()
-    mean_acc_gy = rotated_df['acc_gy'].mean()
-    mean_acc_gz = rotated_df['acc_gz'].mean()
-
-    # new: gyro_z stats
-    gyro_z = data['gyro_z']
-    gyro_z_mean = gyro_z.mean()
-    gyro_z_std = gyro_z.std()
-    gyro_z_max = gyro_z.max()
-    gyro_z_min = gyro_z.min()
-
-    # other features
-    mean_magnitude = rotated_df['mean_magnitude'].mean()
-    signal_magnitude_area = np.sum(np.abs([mean_acc_x, mean_acc_y, mean_acc_z]))
-    mean_freq_x, dominant_freq_x = compute_frequency_domain(rotated_df['acc_x'], data_interval)
-    mean_freq_y, dominant_freq_y = compute_frequency_domain(rotated_df['acc_y'], data_interval)
-    mean_freq_z, dominant_freq_z = compute_frequency_domain(rotated_df['acc_z'], data_interval)
-
-    lats = list(data['gps_lat'])
-    lons = list(data['gps_lon'])
-    diff_lat = lats[0] - lats[-1]
-    diff_lon = lons[0] - lons[-1]
-
-    row = pd.DataFrame([[mean_acc_x, median_acc_x, std_acc_x, min_acc_x, max_acc_x, mean_abs_x,
-                         mean_acc_y, median_acc_y, std_acc_y, min_acc_y, max_acc_y, mean_abs_y,
-                         mean_acc_z, median_acc_z, std_acc_z, min_acc_z, max_acc_z, mean_abs_z,
-                         mean_acc_gx, mean_acc_gy, mean_acc_gz,
-                         gyro_z_mean, gyro_z_std, gyro_z_max, gyro_z_min,
-                         mean_magnitude, signal_magnitude_area,
-                         mean_freq_x, dominant_freq_x,
-                         mean_freq_y, dominant_freq_y,
-                         mean_freq_z, dominant_freq_z,
-                         diff_lat, diff_lon]], columns=features)
-
-    result_df = pd.concat([result_df, row], ignore_index=True)
-
-    return result_df
+    window = data if isinstance(data, np.ndarray) else window_to_array(data)
+    return pd.DataFrame([extract_features(window, data_interval)], columns=FEATURES)
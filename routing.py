@@ -0,0 +1,387 @@
+import heapq
+import math
+import threading
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+EARTH_RADIUS_M = 6371000.0
+
+# Cost of a portal ride from floor a to floor b:
+#   board + (up if b > a else down) * |b - a|
+# in the same unit as the floor graph weights. One flight of stairs up keeps the old flat cost of 30.
+PORTAL_COSTS = {
+    "stairs": {"board": 0, "up": 30, "down": 20},
+    "escalator": {"board": 0, "up": 15, "down": 15},
+    "elevator": {"board": 45, "up": 5, "down": 5},
+}
+DEFAULT_PORTAL_TYPE = "stairs"
+
+
+def portal_type(group_name, nodes):
+    """
+    A node's explicit ``portalType`` wins; otherwise it is guessed from the group name
+    ("Lift A" -> elevator), defaulting to stairs.
+    """
+    for node in nodes:
+        if node.get("portalType") in PORTAL_COSTS:
+            return node["portalType"]
+    name = group_name.lower()
+    if "elevator" in name or "lift" in name:
+        return "elevator"
+    if "escalator" in name:
+        return "escalator"
+    return DEFAULT_PORTAL_TYPE
+
+
+def floor_gap(from_floor, to_floor):
+    # floors without a number count as one floor apart
+    if from_floor is None or to_floor is None:
+        return 1
+    return abs(to_floor - from_floor)
+
+
+def portal_cost(cost, from_floor, to_floor):
+    going_up = from_floor is None or to_floor is None or to_floor > from_floor
+    return cost["board"] + (cost["up"] if going_up else cost["down"]) * floor_gap(from_floor, to_floor)
+
+
+def build_portals(floor_graphs):
+    """
+    Groups the portal nodes of every floor graph by ``portalGroup``.
+
+    Returns:
+        dict: {"Main Stairs": {"type": "stairs", "cost": {"board", "up", "down"},
+               "nodes": [{"id": node_id, "floor": floor_number}, ...]}, ...}
+    """
+    members = {}
+    for floor in floor_graphs:
+        graph = floor.get("graph")
+        if not graph or not graph.get("nodes") or not graph.get("adjacencyList"):
+            continue
+        for node in graph["nodes"]:
+            if node.get("portalGroup"):
+                members.setdefault(node["portalGroup"], []).append((node, floor.get("floor")))
+
+    portals = {}
+    for group_name, nodes in members.items():
+        kind = portal_type(group_name, [node for node, _ in nodes])
+        portals[group_name] = {
+            "type": kind,
+            "cost": dict(PORTAL_COSTS[kind]),
+            "nodes": [{"id": node["id"], "floor": floor} for node, floor in nodes]
+        }
+    return portals
+
+
+def portal_edges(portals):
+    """
+    Yields (node_a, node_b, weight) between every pair of nodes of each portal group, both
+    directions. Quadratic in the group size; only for clients that want explicit edges.
+    """
+    for portal in portals.values():
+        nodes = portal["nodes"]
+        for i in range(len(nodes)):
+            for j in range(i + 1, len(nodes)):
+                a, b = nodes[i], nodes[j]
+                yield a["id"], b["id"], portal_cost(portal["cost"], a["floor"], b["floor"])
+                yield b["id"], a["id"], portal_cost(portal["cost"], b["floor"], a["floor"])
+
+
+def portal_hub_edges(portals):
+    """
+    Linear-size equivalent of ``portal_edges`` for the router: each group becomes a shaft of
+    virtual stops, one per floor, chained in floor order.
+
+    node -> stop costs ``board``, stop -> node is free and moving one stop up or down costs
+    ``up``/``down`` times the floor difference, so every node-to-node ride costs exactly
+    ``portal_cost``. Members on a floor without a number have no place in the shaft and get
+    ``portal_edges``' explicit edges to every other member instead.
+
+    Returns:
+        tuple: ([(stop_id, floor, member_node_id)], [(from_id, to_id, weight)])
+    """
+    stops, edges = [], []
+    for group_name, portal in portals.items():
+        cost = portal["cost"]
+        by_floor = {}
+        for node in portal["nodes"]:
+            if node["floor"] is not None:
+                by_floor.setdefault(node["floor"], []).append(node["id"])
+
+        nodes = portal["nodes"]
+        for i, a in enumerate(nodes):
+            if a["floor"] is not None:
+                continue
+            for j, b in enumerate(nodes):
+                # a pair of unnumbered members is linked once, from the first of them
+                if j == i or (b["floor"] is None and j < i):
+                    continue
+                edges.append((a["id"], b["id"], portal_cost(cost, a["floor"], b["floor"])))
+                edges.append((b["id"], a["id"], portal_cost(cost, b["floor"], a["floor"])))
+
+        previous = None
+        for floor in sorted(by_floor):
+            stop_id = f"portal:{group_name}:{floor}"
+            stops.append((stop_id, floor, by_floor[floor][0]))
+            for node_id in by_floor[floor]:
+                edges.append((node_id, stop_id, cost["board"]))
+                edges.append((stop_id, node_id, 0))
+            if previous is not None:
+                gap = floor_gap(previous[1], floor)
+                edges.append((previous[0], stop_id, cost["up"] * gap))
+                edges.append((stop_id, previous[0], cost["down"] * gap))
+            previous = (stop_id, floor)
+    return stops, edges
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in metres; inputs in degrees, broadcasts over NumPy arrays.
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class RoutingGraph:
+    """
+    A building's merged navigation graph in compressed sparse row form, for server-side A*.
+
+    Node ``i`` has id ``ids[i]``, coordinates ``lat[i], lon[i]`` and floor ``floors[i]``; its
+    outgoing edges are ``indices[indptr[i]:indptr[i + 1]]`` with matching ``weights``.
+    Nodes from ``num_nodes`` on are the virtual portal stops of ``portal_hub_edges``.
+    """
+
+    def __init__(self, ids, lat, lon, floors, portal_groups, indptr, indices, weights, num_nodes=None):
+        self.ids = ids
+        self.num_nodes = len(ids) if num_nodes is None else num_nodes
+        self.index = {node_id: i for i, node_id in enumerate(ids)}
+        self.lat = lat
+        self.lon = lon
+        self.floors = floors
+        self.portal_groups = portal_groups
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.heuristic_scale = self._heuristic_scale()
+
+        # plain lists: per-element access from the Python search loop is much faster than on arrays
+        self._indptr = indptr.tolist()
+        self._indices = indices.tolist()
+        self._weights = weights.tolist()
+
+    @classmethod
+    def from_floor_graphs(cls, floor_graphs):
+        """
+        Args:
+            floor_graphs (list): [{"id": floor_id, "floor": number, "graph": {"nodes", "adjacencyList"}}]
+                as loaded by the nav_graph blueprint.
+        """
+        ids, lat, lon, floors, portal_groups = [], [], [], [], []
+        edges = []
+
+        for floor in floor_graphs:
+            graph = floor.get("graph")
+            if not graph or not graph.get("nodes") or not graph.get("adjacencyList"):
+                continue
+            for node in graph["nodes"]:
+                coordinates = node.get("coordinates") or [np.nan, np.nan]
+                ids.append(node["id"])
+                lat.append(coordinates[0])
+                lon.append(coordinates[1])
+                floors.append(floor.get("floor"))
+                portal_groups.append(node.get("portalGroup"))
+            for source, targets in graph["adjacencyList"].items():
+                for edge in targets:
+                    # graphs saved by the path editor may carry bare target ids without weights
+                    if isinstance(edge, dict):
+                        edges.append((source, edge.get("targetNodeId"), edge.get("weight")))
+                    else:
+                        edges.append((source, edge, None))
+
+        num_nodes = len(ids)
+        index = {node_id: i for i, node_id in enumerate(ids)}
+
+        stops, hub_edges = portal_hub_edges(build_portals(floor_graphs))
+        for stop_id, floor, member_id in stops:
+            # a stop sits exactly on a member node so the heuristic stays consistent across it
+            ids.append(stop_id)
+            lat.append(lat[index[member_id]])
+            lon.append(lon[index[member_id]])
+            floors.append(floor)
+            portal_groups.append(None)
+            index[stop_id] = len(ids) - 1
+        edges.extend(hub_edges)
+
+        known = [(index[a], index[b], np.nan if w is None else float(w))
+                 for a, b, w in edges if a in index and b in index]
+        sources = np.array([e[0] for e in known], dtype=np.int64)
+        targets = np.array([e[1] for e in known], dtype=np.int64)
+        weights = np.array([e[2] for e in known], dtype=np.float64)
+        lat, lon = np.array(lat, dtype=np.float64), np.array(lon, dtype=np.float64)
+        missing = np.isnan(weights)
+        weights[missing] = haversine_m(lat[sources[missing]], lon[sources[missing]],
+                                       lat[targets[missing]], lon[targets[missing]])
+        # unweighted edges between nodes without coordinates cannot be measured
+        usable = np.isfinite(weights)
+        sources, targets, weights = sources[usable], targets[usable], weights[usable]
+        order = np.argsort(sources, kind='stable')
+        indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(ids)), out=indptr[1:])
+
+        return cls(
+            ids=ids,
+            lat=lat,
+            lon=lon,
+            floors=floors,
+            portal_groups=portal_groups,
+            indptr=indptr,
+            indices=targets[order],
+            weights=weights[order],
+            num_nodes=num_nodes,
+        )
+
+    def __len__(self):
+        return self.num_nodes
+
+    def same_as(self, other):
+        """
+        True when ``other`` has the same nodes, coordinates and edges, e.g. after a rebuild
+        triggered by a write that did not touch any graph.
+        """
+        return (other is not None and self.ids == other.ids and self.floors == other.floors
+                and np.array_equal(self.lat, other.lat, equal_nan=True)
+                and np.array_equal(self.lon, other.lon, equal_nan=True)
+                and np.array_equal(self.indptr, other.indptr)
+                and np.array_equal(self.indices, other.indices)
+                and np.array_equal(self.weights, other.weights))
+
+    def to_csr(self):
+        # duplicate edges keep their minimum in scipy's shortest path routines
+        return csr_matrix((self.weights, self.indices, self.indptr), shape=(len(self.ids), len(self.ids)))
+
+    def has_node(self, node_id):
+        return self.index.get(node_id, self.num_nodes) < self.num_nodes
+
+    def _heuristic_scale(self):
+        # Edge weights are whatever the map editor stored (metres, seconds, ...). Scaling the
+        # straight-line distance by the smallest weight-per-metre of any edge keeps the
+        # heuristic admissible whatever the unit; 0 falls back to plain Dijkstra.
+        # The portal stops' edges are left out: a free stop -> node edge to another member on the
+        # floor has a length but no weight and would force the scale to 0.
+        if len(self.indices) == 0:
+            return 0.0
+        sources = np.repeat(np.arange(len(self.ids)), np.diff(self.indptr))
+        length = haversine_m(self.lat[sources], self.lon[sources], self.lat[self.indices], self.lon[self.indices])
+        real = (sources < self.num_nodes) & (self.indices < self.num_nodes)
+        usable = real & np.isfinite(length) & (length > 1e-6)
+        if not usable.any():
+            return 0.0
+        scale = float(np.min(self.weights[usable] / length[usable]))
+        return scale if scale > 0 else 0.0
+
+    def shortest_path(self, source_id, target_id):
+        """
+        A* from ``source_id`` to ``target_id``.
+
+        Returns:
+            tuple: (list of node indices, total weight), or (None, inf) when unreachable.
+        """
+        source, target = self.index[source_id], self.index[target_id]
+
+        if self.heuristic_scale > 0 and np.isfinite(self.lat[target]) and np.isfinite(self.lon[target]):
+            h = haversine_m(self.lat, self.lon, self.lat[target], self.lon[target]) * self.heuristic_scale
+            heuristic = np.nan_to_num(h, nan=0.0).tolist()
+        else:
+            heuristic = None
+
+        indptr, indices, weights = self._indptr, self._indices, self._weights
+        dist = {source: 0.0}
+        parent = {source: -1}
+        closed = set()
+        heap = [(heuristic[source] if heuristic else 0.0, source)]
+
+        while heap:
+            _, node = heapq.heappop(heap)
+            if node in closed:
+                continue
+            if node == target:
+                break
+            closed.add(node)
+            base = dist[node]
+            for k in range(indptr[node], indptr[node + 1]):
+                neighbour = indices[k]
+                candidate = base + weights[k]
+                if candidate < dist.get(neighbour, math.inf):
+                    dist[neighbour] = candidate
+                    parent[neighbour] = node
+                    heapq.heappush(heap, (candidate + (heuristic[neighbour] if heuristic else 0.0), neighbour))
+
+        if target not in dist:
+            return None, math.inf
+
+        path = []
+        node = target
+        while node != -1:
+            path.append(node)
+            node = parent[node]
+        return path[::-1], dist[target]
+
+    def route(self, source_id, target_id):
+        """
+        Returns the JSON-ready route: node ids, total distance and every floor change on the way.
+        """
+        path, distance = self.shortest_path(source_id, target_id)
+        if path is None:
+            return None
+        path = [i for i in path if i < self.num_nodes]
+
+        transitions = []
+        for a, b in zip(path, path[1:]):
+            if self.floors[a] != self.floors[b]:
+                transitions.append({
+                    "fromNodeId": self.ids[a],
+                    "toNodeId": self.ids[b],
+                    "fromFloor": self.floors[a],
+                    "toFloor": self.floors[b],
+                    "portalGroup": self.portal_groups[a]
+                })
+
+        return {
+            "path": [self.ids[i] for i in path],
+            "distance": distance,
+            "floorTransitions": transitions
+        }
+
+
+class RoutingGraphCache:
+    """
+    Built RoutingGraphs per building, dropped after ``ttl`` seconds or on invalidation.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._graphs = {}
+        self._generations = {}  # building_id -> invalidation count
+        self._lock = threading.Lock()
+
+    def get_or_build(self, building_id, load_floor_graphs):
+        with self._lock:
+            item = self._graphs.get(building_id)
+            generation = self._generations.get(building_id, 0)
+        if item is not None and item[0] > time.monotonic():
+            return item[1]
+
+        graph = RoutingGraph.from_floor_graphs(load_floor_graphs())
+        with self._lock:
+            # invalidated while building: the floor graphs may predate the write
+            if self._generations.get(building_id, 0) == generation:
+                self._graphs[building_id] = (time.monotonic() + self.ttl, graph)
+        return graph
+
+    def invalidate(self, building_id):
+        with self._lock:
+            self._graphs.pop(building_id, None)
+            self._generations[building_id] = self._generations.get(building_id, 0) + 1
@@ -0,0 +1,179 @@
+import json
+import os
+import threading
+import time
+
+# key space for data that spans every building (e.g. the building list)
+ALL_BUILDINGS = '*'
+
+
+class MemoryBackend:
+    """
+    Per-process storage: {building_id: {key: (expires_at, value)}}, plus a generation counter
+    per building that invalidating bumps.
+    """
+
+    def __init__(self):
+        self._buildings = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generation(self, building_id):
+        with self._lock:
+            return self._generations.get(building_id, 0)
+
+    def get(self, building_id, key):
+        with self._lock:
+            item = self._buildings.get(building_id, {}).get(key)
+        if item is None or item[0] < time.monotonic():
+            return None
+        return item[1]
+
+    def set(self, building_id, key, value, ttl, generation):
+        with self._lock:
+            # invalidated while the value was being loaded: it may predate the write
+            if self._generations.get(building_id, 0) != generation:
+                return
+            self._buildings.setdefault(building_id, {})[key] = (time.monotonic() + ttl, value)
+
+    def invalidate(self, building_id):
+        with self._lock:
+            self._buildings.pop(building_id, None)
+            self._generations[building_id] = self._generations.get(building_id, 0) + 1
+
+    def size(self):
+        with self._lock:
+            return sum(len(keys) for keys in self._buildings.values())
+
+
+class RedisBackend:
+    """
+    Shared storage so every worker process reads the same snapshot. Each building has a
+    generation counter that is part of every key; invalidating bumps it, which orphans the
+    old keys until their TTL runs out.
+    """
+
+    def __init__(self, url, prefix='inguide:snapshot'):
+        import redis  # optional dependency, only needed when a shared cache is configured
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def generation(self, building_id):
+        return int(self._redis.get(f"{self._prefix}:{building_id}:gen") or 0)
+
+    def _key(self, building_id, generation, key):
+        return f"{self._prefix}:{building_id}:{generation}:{key}"
+
+    def get(self, building_id, key):
+        raw = self._redis.get(self._key(building_id, self.generation(building_id), key))
+        return None if raw is None else json.loads(raw)
+
+    def set(self, building_id, key, value, ttl, generation):
+        # stored under the generation read before loading, so a value loaded across an
+        # invalidation lands under the orphaned generation and is never read
+        self._redis.setex(self._key(building_id, generation, key), int(ttl), json.dumps(value))
+
+    def invalidate(self, building_id):
+        self._redis.incr(f"{self._prefix}:{building_id}:gen")
+
+    def size(self):
+        return None
+
+
+class SnapshotCache:
+    """
+    Read-through cache of per-building Firestore snapshots (building doc, floors, POIs,
+    beacons, graphs) for the GET endpoints.
+
+    Entries expire after ``ttl`` seconds and are dropped as soon as a write handler calls
+    ``invalidate`` for their building. A value whose load overlapped an invalidation is returned
+    but not cached. Loaders that return None (not found) are not cached.
+    """
+
+    def __init__(self, backend=None, ttl=300):
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'errors': 0}
+        self._stats_lock = threading.Lock()
+        self._listeners = []
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def get_or_load(self, building_id, key, loader):
+        try:
+            value = self.backend.get(building_id, key)
+        except Exception as e:
+            # a broken shared backend must not take the read endpoints down with it
+            print(f"Snapshot cache read failed: {e}")
+            self._count('errors')
+            value = None
+
+        if value is not None:
+            self._count('hits')
+            return value
+
+        self._count('misses')
+        try:
+            generation = self.backend.generation(building_id)
+        except Exception as e:
+            print(f"Snapshot cache read failed: {e}")
+            self._count('errors')
+            return loader()
+
+        value = loader()
+        if value is not None and self.ttl > 0:
+            try:
+                self.backend.set(building_id, key, value, self.ttl, generation)
+            except Exception as e:
+                print(f"Snapshot cache write failed: {e}")
+                self._count('errors')
+        return value
+
+    def on_invalidate(self, callback):
+        """
+        Registers ``callback(building_id)`` for derived in-process state built from the snapshots.
+        """
+        self._listeners.append(callback)
+
+    def invalidate(self, building_id):
+        """
+        Drops every snapshot of ``building_id`` and the cross-building listings that embed it.
+        """
+        self._count('invalidations')
+        try:
+            self.backend.invalidate(building_id)
+            self.backend.invalidate(ALL_BUILDINGS)
+        except Exception as e:
+            print(f"Snapshot cache invalidation failed: {e}")
+            self._count('errors')
+        # after the snapshots, so derived state rebuilt in between is built from fresh data
+        for callback in self._listeners:
+            callback(building_id)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['entries'] = self.backend.size()
+        stats['backend'] = type(self.backend).__name__
+        stats['ttl'] = self.ttl
+        return stats
+
+
+def create_snapshot_cache():
+    """
+    Builds the cache from the environment: SNAPSHOT_CACHE_REDIS_URL switches to the shared
+    backend, SNAPSHOT_CACHE_TTL sets the TTL in seconds (0 disables caching).
+    """
+    ttl = float(os.environ.get('SNAPSHOT_CACHE_TTL', 300))
+    redis_url = os.environ.get('SNAPSHOT_CACHE_REDIS_URL')
+    backend = None
+    if redis_url:
+        try:
+            backend = RedisBackend(redis_url)
+        except Exception as e:
+            print(f"Error connecting the shared snapshot cache, using the in-process one: {e}")
+    return SnapshotCache(backend, ttl)
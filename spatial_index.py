@@ -0,0 +1,141 @@
+import math
+import threading
+import time
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from routing import EARTH_RADIUS_M
+
+
+class LocalProjection:
+    """
+    Equirectangular projection to metres on a plane tangent at ``origin`` ([lat, lng]); exact to
+    well under a centimetre across a building.
+    """
+
+    def __init__(self, origin):
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self._cos_lat = math.cos(math.radians(self.origin[0]))
+
+    def forward(self, points):
+        """
+        [lat, lng] rows -> [x, y] rows in metres east/north of the origin.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        y = np.radians(points[:, 0] - self.origin[0]) * EARTH_RADIUS_M
+        x = np.radians(points[:, 1] - self.origin[1]) * EARTH_RADIUS_M * self._cos_lat
+        return np.column_stack((x, y))
+
+    def inverse(self, xy):
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        lat = self.origin[0] + np.degrees(xy[:, 1] / EARTH_RADIUS_M)
+        lng = self.origin[1] + np.degrees(xy[:, 0] / (EARTH_RADIUS_M * self._cos_lat))
+        return np.column_stack((lat, lng))
+
+
+class PointIndex:
+    """
+    KD-tree over the [lat, lng] of a floor's features (POIs, beacons, path nodes).
+
+    Coordinates are projected to metres around the features' centroid (LocalProjection), so
+    query distances are in metres.
+    Features without a usable location are left out.
+    """
+
+    def __init__(self, features, location):
+        """
+        Args:
+            features (list): the features (dicts, ids, ...), returned as-is by the queries.
+            location (callable): feature -> [lat, lng] (or None).
+        """
+        self.features = []
+        points = []
+        for feature in features:
+            latlng = location(feature)
+            if isinstance(latlng, (list, tuple)) and len(latlng) == 2 \
+                    and all(isinstance(v, (int, float)) and math.isfinite(v) for v in latlng):
+                self.features.append(feature)
+                points.append(latlng)
+
+        points = np.array(points, dtype=np.float64).reshape(-1, 2)
+        self.projection = LocalProjection(points.mean(axis=0) if len(points) else np.zeros(2))
+        self.tree = cKDTree(self.project(points)) if len(points) else None
+
+    def __len__(self):
+        return len(self.features)
+
+    def project(self, points):
+        return self.projection.forward(points)
+
+    def nearest_indices(self, lat, lng, k=1, max_distance=np.inf):
+        """
+        Returns:
+            tuple: (positions in ``features``, distances in metres), closest first.
+        """
+        if self.tree is None or k < 1:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        k = min(k, len(self.features))
+        distance, position = self.tree.query(self.project([lat, lng])[0], k=k, distance_upper_bound=max_distance)
+        distance, position = np.atleast_1d(distance), np.atleast_1d(position)
+        found = np.isfinite(distance)
+        return position[found], distance[found]
+
+    def nearest(self, lat, lng, k=1, max_distance=np.inf):
+        """
+        Returns:
+            list: [(feature, distance_m)] for the ``k`` closest features.
+        """
+        positions, distances = self.nearest_indices(lat, lng, k, max_distance)
+        return [(self.features[p], float(d)) for p, d in zip(positions, distances)]
+
+    def within(self, lat, lng, radius):
+        """
+        Returns:
+            list: [(feature, distance_m)] for every feature within ``radius`` metres, closest first.
+        """
+        if self.tree is None:
+            return []
+        center = self.project([lat, lng])[0]
+        positions = np.array(self.tree.query_ball_point(center, radius), dtype=np.int64)
+        if not len(positions):
+            return []
+        distances = np.hypot(*(self.tree.data[positions] - center).T)
+        order = np.argsort(distances, kind='stable')
+        return [(self.features[p], float(d)) for p, d in zip(positions[order], distances[order])]
+
+
+class SpatialIndexCache:
+    """
+    Per-floor structures derived from the snapshots (PointIndexes, path geometry), keyed by
+    (building, floor, kind), built on first use and dropped after ``ttl`` seconds or when the
+    building is invalidated.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._indexes = {}  # (building_id, floor_id, kind) -> (expires_at, index)
+        self._generations = {}  # building_id -> invalidation count
+        self._lock = threading.Lock()
+
+    def get_or_build(self, building_id, floor_id, kind, build):
+        key = (building_id, floor_id, kind)
+        with self._lock:
+            item = self._indexes.get(key)
+            generation = self._generations.get(building_id, 0)
+        if item is not None and item[0] > time.monotonic():
+            return item[1]
+
+        index = build()
+        if index is not None:
+            with self._lock:
+                # invalidated while building: the snapshots it was built from may predate the write
+                if self._generations.get(building_id, 0) == generation:
+                    self._indexes[key] = (time.monotonic() + self.ttl, index)
+        return index
+
+    def invalidate(self, building_id):
+        with self._lock:
+            for key in [key for key in self._indexes if key[0] == building_id]:
+                del self._indexes[key]
+            self._generations[building_id] = self._generations.get(building_id, 0) + 1
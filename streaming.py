@@ -0,0 +1,162 @@
+import numpy as np
+
+from preprocess import ACC_SLICE, FEATURES, GPS_SLICE, GRAVITY_SLICE, GYRO_Z, ORIENTATION_SLICE, SENSOR_CHANNELS, \
+    rotate_to_world_frame, spectrum_frequencies
+
+# column layout of the per-sample cache kept next to the raw ring buffer
+_ACC = slice(0, 3)
+_GRAVITY = slice(3, 6)
+_MAGNITUDE = 6
+_GYRO_Z = 7
+
+
+class StreamingFeatureExtractor:
+    """
+    Keeps the model's features for a sliding window up to date as samples arrive.
+
+    Every sample is rotated to the world frame once, when it is pushed, and stored in a
+    ring buffer. Means, standard deviations and the DFT bins behind the frequency features
+    are maintained incrementally (running sums and a sliding DFT); median, min and max are
+    reduced over the cached ring when a stride completes. All running state is recomputed
+    exactly every ``refresh_every`` strides so floating-point drift stays bounded.
+    """
+
+    def __init__(self, window_size, stride, data_interval=500, refresh_every=64):
+        if window_size <= 0 or stride <= 0:
+            raise ValueError("window_size and stride must be positive.")
+
+        self.window_size = window_size
+        self.stride = stride
+        self.data_interval = data_interval
+        self.refresh_every = refresh_every
+
+        self._raw = np.zeros((window_size, len(SENSOR_CHANNELS)))
+        self._cache = np.zeros((window_size, 8))  # acc_world, gravity_world, magnitude, gyro_z
+        self._head = 0  # ring index of the oldest sample once the window is full
+        self._filled = 0
+        self._since_emit = 0
+        self._strides_since_refresh = 0
+
+        n_positive = (window_size - 1) // 2
+        bins = np.arange(1, n_positive + 1)
+        # e^{-2πi·k·m/N} for every in-window offset m and positive bin k
+        self._twiddle = np.exp(-2j * np.pi * np.outer(np.arange(window_size), bins) / window_size)
+        self._bins = bins
+        self._spectrum = np.zeros((n_positive, 3), dtype=np.complex128)
+        self._sums = None
+
+    @property
+    def samples_until_next(self):
+        if self._filled < self.window_size:
+            return self.window_size - self._filled
+        return self.stride - self._since_emit
+
+    def push(self, samples):
+        """
+        Appends new samples and returns the feature vectors of every stride they complete.
+
+        Args:
+            samples (np.ndarray): (n, n_channels) array laid out as SENSOR_CHANNELS.
+
+        Returns:
+            np.ndarray: (n_emitted, len(FEATURES)) matrix, oldest window first.
+        """
+        samples = np.asarray(samples, dtype=np.float64).reshape(-1, len(SENSOR_CHANNELS))
+        acc_world, gravity_world, magnitude = rotate_to_world_frame(
+            samples[:, ACC_SLICE], samples[:, GRAVITY_SLICE], samples[:, ORIENTATION_SLICE])
+        cached = np.column_stack([acc_world, gravity_world, magnitude, samples[:, GYRO_Z]])
+
+        emitted = []
+        pos = 0
+        while pos < len(samples):
+            take = min(self.samples_until_next, self.window_size, len(samples) - pos)
+            self._append(samples[pos:pos + take], cached[pos:pos + take])
+            pos += take
+
+            if self._filled == self.window_size and (self._since_emit == 0 or self._since_emit >= self.stride):
+                emitted.append(self._features())
+                self._since_emit = 0
+
+        return np.array(emitted).reshape(-1, len(FEATURES))
+
+    def _append(self, raw, cached):
+        n = self.window_size
+        count = len(raw)
+
+        if self._filled < n:
+            end = self._filled + count
+            self._raw[self._filled:end] = raw
+            self._cache[self._filled:end] = cached
+            self._filled = end
+            if self._filled == n:
+                self._refresh()
+            return
+
+        slots = (self._head + np.arange(count)) % n
+        old = self._cache[slots]
+        self._raw[slots] = raw
+        self._cache[slots] = cached
+        self._head = (self._head + count) % n
+        self._since_emit += count
+
+        if count == n or self._strides_since_refresh >= self.refresh_every:
+            self._refresh()
+            return
+
+        self._sums += _moments(cached) - _moments(old)
+        # sliding DFT: add the new-minus-old contribution, then rotate the window start forward
+        delta = cached[:, _ACC] - old[:, _ACC]
+        self._spectrum += self._twiddle[:count].T @ delta
+        self._spectrum *= np.exp(2j * np.pi * self._bins * count / n)[:, np.newaxis]
+
+    def _refresh(self):
+        ordered = np.roll(self._cache, -self._head, axis=0)
+        self._sums = _moments(ordered)
+        self._spectrum = self._twiddle.T @ ordered[:, _ACC]
+        self._strides_since_refresh = 0
+
+    def _features(self):
+        n = self.window_size
+        self._strides_since_refresh += 1
+        cache = self._cache
+        acc = cache[:, _ACC]
+
+        acc_sum, acc_sq, acc_abs, gravity_sum, magnitude_sum, gyro_sum, gyro_sq = np.split(
+            self._sums, [3, 6, 9, 12, 13, 14])
+        acc_mean = acc_sum / n
+        acc_std = np.sqrt(np.maximum(acc_sq - acc_sum * acc_mean, 0.0) / (n - 1))
+        gyro_mean = gyro_sum[0] / n
+        gyro_std = np.sqrt(max(gyro_sq[0] - gyro_sum[0] * gyro_mean, 0.0) / (n - 1))
+
+        acc_stats = np.stack([
+            acc_mean,
+            np.median(acc, axis=0),
+            acc_std,
+            acc.min(axis=0),
+            acc.max(axis=0),
+            acc_abs / n,
+        ], axis=1)
+        mean_freq, dominant_freq = spectrum_frequencies(np.abs(self._spectrum), n, self.data_interval)
+
+        first = self._raw[self._head]
+        last = self._raw[self._head - 1]
+        gyro_z = cache[:, _GYRO_Z]
+
+        return np.concatenate([
+            acc_stats.ravel(),
+            gravity_sum / n,
+            [gyro_mean, gyro_std, gyro_z.max(), gyro_z.min()],
+            [magnitude_sum[0] / n, np.abs(acc_mean).sum()],
+            np.column_stack([mean_freq, dominant_freq]).ravel(),
+            first[GPS_SLICE] - last[GPS_SLICE],
+        ])
+
+
+def _moments(cached):
+    acc = cached[:, _ACC]
+    gyro_z = cached[:, _GYRO_Z]
+    return np.concatenate([
+        acc.sum(axis=0), (acc ** 2).sum(axis=0), np.abs(acc).sum(axis=0),
+        cached[:, _GRAVITY].sum(axis=0),
+        [cached[:, _MAGNITUDE].sum(), gyro_z.sum(), (gyro_z ** 2).sum()],
+    ])
@@ -0,0 +1,73 @@
+import time
+
+from google.api_core.exceptions import AlreadyExists
+from google.cloud import firestore
+
+# buildings/{buildingId}/sync_log/{version}: one entry per write, versions counting up from 1
+SYNC_LOG = 'sync_log'
+MAX_ATTEMPTS = 10
+
+# what a change entry can refer to; floor-level entities carry their floorId
+KINDS = ('building', 'floor', 'poi', 'beacon', 'graph')
+
+
+# entity id of a change that covers every POI / beacon of its floor
+ALL = '*'
+
+
+def change(kind, entity_id, floor_id=None, deleted=False):
+    return {"kind": kind, "id": entity_id, "floorId": floor_id, "deleted": deleted}
+
+
+def log_ref(db, building_id):
+    return db.collection('buildings').document(building_id).collection(SYNC_LOG)
+
+
+def current_version(db, building_id):
+    latest = list(log_ref(db, building_id).order_by('version', direction=firestore.Query.DESCENDING)
+                  .limit(1).stream())
+    return latest[0].get('version') if latest else 0
+
+
+def record_changes(db, building_id, changes):
+    """
+    Appends one entry listing ``changes`` to the building's sync log and returns its version.
+
+    The next version is claimed with create(), which fails if another writer took it first, so
+    versions have no gaps and an entry is visible before any later one. A failure is logged and
+    not raised: the write it describes has already happened.
+    """
+    if not changes:
+        return None
+    try:
+        log = log_ref(db, building_id)
+        version = current_version(db, building_id)
+        for _ in range(MAX_ATTEMPTS):
+            version += 1
+            try:
+                log.document(f"{version:012d}").create({
+                    "version": version,
+                    "changes": changes,
+                    "recordedAt": time.time()
+                })
+                return version
+            except AlreadyExists:
+                continue
+        print(f"Sync log of {building_id}: no free version after {MAX_ATTEMPTS} attempts")
+    except Exception as e:
+        print(f"Sync log write failed for {building_id}: {e}")
+    return None
+
+
+def changes_since(db, building_id, since):
+    """
+    Returns:
+        tuple: (latest version, [change]) with only the last change of each entity after ``since``.
+    """
+    version, latest = since, {}
+    for entry in log_ref(db, building_id).where('version', '>', since).order_by('version').stream():
+        entry = entry.to_dict()
+        version = max(version, entry['version'])
+        for item in entry['changes']:
+            latest[(item['kind'], item['id'], item['floorId'] if item['id'] == ALL else None)] = item
+    return version, list(latest.values())
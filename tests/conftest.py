@@ -0,0 +1,20 @@
+import pytest
+
+from benchmarks import fake_firestore
+
+# the app's blueprints are imported once per test session, against this in-memory Firestore
+fake_db, fake_bucket = fake_firestore.install()
+
+
+@pytest.fixture
+def db():
+    fake_db.docs = fake_firestore.Documents()
+    return fake_db
+
+
+@pytest.fixture
+def client(db):
+    import app
+    from snapshot_cache import MemoryBackend
+    app.cache.backend = MemoryBackend()  # nothing cached survives from an earlier test
+    return app.get_app().test_client()
@@ -0,0 +1,43 @@
+def add_beacon(client, floor_id, beacon_id):
+    response = client.post(f'/beacon/b1/{floor_id}', json={'beaconId': beacon_id, 'name': beacon_id,
+                                                            'latLng': [18.79, 98.95]})
+    assert response.status_code == 201, response.json
+
+
+def index_entry(db, beacon_id):
+    snapshot = db.collection('beacon_index').document(beacon_id).get()
+    return snapshot.to_dict() if snapshot.exists else None
+
+
+def test_deleting_a_moved_beacon_keeps_the_new_index_entry(client, db):
+    add_beacon(client, 'f1', 'x')
+    add_beacon(client, 'f2', 'x')  # the same hardware re-registered on another floor
+    assert client.delete('/beacon/b1/f1/x').status_code == 200
+    assert index_entry(db, 'x') == {'buildingId': 'b1', 'floorId': 'f2'}
+
+    add_beacon(client, 'f1', 'y')
+    add_beacon(client, 'f2', 'y')
+    assert client.post('/beacon/b1/f1/bulk', json={'delete': ['y']}).status_code == 200
+    assert index_entry(db, 'y') == {'buildingId': 'b1', 'floorId': 'f2'}
+
+    assert client.delete('/beacon/b1/f2/x').status_code == 200
+    assert index_entry(db, 'x') is None
+
+
+def test_rebuild_index_removes_entries_without_a_beacon(client, db):
+    add_beacon(client, 'f1', 'x')
+    db.collection('beacon_index').document('gone').set({'buildingId': 'b1', 'floorId': 'f1'})
+    response = client.post('/beacon/rebuild_index')
+    assert response.json == {'status': 'success', 'indexed': 1, 'removed': 1}
+    assert index_entry(db, 'gone') is None
+    assert index_entry(db, 'x') == {'buildingId': 'b1', 'floorId': 'f1'}
+
+
+def test_lookup_finds_and_indexes_a_beacon_stored_before_the_index(client, db):
+    db.collection('buildings').document('b1').collection('floors').document('f1') \
+        .collection('beacons').document('old').set({'name': 'old'})
+    response = client.get('/beacon/old/get_buildingId')
+    assert response.status_code == 200, response.json
+    assert response.json == {'buildingId': 'b1'}
+    assert index_entry(db, 'old') == {'buildingId': 'b1', 'floorId': 'f1'}
+    assert client.get('/beacon/unknown/get_buildingId').status_code == 404
@@ -0,0 +1,53 @@
+import gps_log_store
+from gps_log_store import CompactJob, bucket_ref, bucket_writes, compact_buckets, downsample, track
+from log_ingest import LogWriter
+
+HOUR = 3600.0
+START = 1_700_000_000 - 1_700_000_000 % 3600
+
+
+def test_track_is_in_time_order_whatever_order_get_all_returns(db, monkeypatch):
+    records = [{'id': f'r{i}', 'sensor_id': 's1', 'latitude': 18.79, 'longitude': 98.95 + i * 1e-5,
+                'timestamp': START + i * HOUR / 2} for i in range(6)]
+    for method, ref, data in bucket_writes(db, records):
+        ref.set(data, merge=True)
+
+    get_all = db.get_all
+    monkeypatch.setattr(db, 'get_all', lambda refs: list(reversed(get_all(refs))))
+    points, reads = track(db, 's1', START, START + 3 * HOUR)
+    assert [p[0] for p in points] == [r['timestamp'] for r in records]
+    assert reads == 3
+
+
+def test_compaction_also_compacts_a_chunk_that_arrives_meanwhile(db, monkeypatch):
+    records = [{'id': f'r{i}', 'sensor_id': 's1', 'latitude': 18.79, 'longitude': 98.95,
+                'timestamp': START + i * 10} for i in range(6)]
+    late = [{'id': 'late', 'sensor_id': 's1', 'latitude': 18.79, 'longitude': 98.95, 'timestamp': START + 600}]
+    for method, ref, data in bucket_writes(db, records):
+        ref.set(data, merge=True)
+
+    pending = [late]
+
+    def downsample_then_write(data):
+        # the writer merges another chunk between the compaction's read and its update
+        if pending:
+            for method, ref, chunk in bucket_writes(db, pending.pop()):
+                ref.set(chunk, merge=True)
+        return downsample(data)
+
+    monkeypatch.setattr(gps_log_store, 'downsample', downsample_then_write)
+    job = CompactJob(0, 365)
+    compact_buckets(db, START + 2 * HOUR, job)
+
+    data = bucket_ref(db, 's1', START).get().to_dict()
+    assert data['raw'] is False
+    assert all(chunk_id.startswith('m') for chunk_id in data['chunks'])
+    assert sum(sum(chunk['n']) for chunk in data['chunks'].values()) == 7
+    assert job.buckets_compacted == 1
+
+
+def test_writer_commits_more_writes_than_one_batch_holds(db):
+    writer = LogWriter(db, lambda records: [('set', db.collection('w').document(r['id']), {}) for r in records],
+                       batch_limit=1200)
+    assert writer._commit([{'id': str(i)} for i in range(1200)])
+    assert len(list(db.collection('w').stream())) == 1200
@@ -0,0 +1,21 @@
+from graph_store import GRAPH_CHUNKS, load_graph, store_graph
+
+
+def graph(n):
+    return {"nodes": [{"id": f"n{i}", "coordinates": [18.79, 98.95 + i * 1e-5]} for i in range(n)],
+            "adjacencyList": {"n0": [{"targetNodeId": "n1", "weight": 1.0}]}}
+
+
+def test_reader_of_the_previous_pointer_can_still_load(db):
+    floor_ref = db.collection('buildings').document('b1').collection('floors').document('f1')
+    floor_ref.set({'floor': 1})
+    first = store_graph(db, floor_ref, graph(2))
+    stale = floor_ref.get()  # a reader reads the pointer ...
+
+    second = store_graph(db, floor_ref, graph(3), first)
+    assert load_graph(db, stale) == graph(2)  # ... and loads the chunks after it moved
+
+    store_graph(db, floor_ref, graph(4), second)
+    chunks = {ref.id.split('-')[0] for ref in floor_ref.collection(GRAPH_CHUNKS).list_documents()}
+    assert chunks == {second['version'], floor_ref.get().get('graphStore')['version']}
+    assert load_graph(db, floor_ref.get()) == graph(4)
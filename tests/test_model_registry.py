@@ -0,0 +1,19 @@
+import os
+import shutil
+
+from model_registry import ModelRegistry
+
+MODELS = os.path.join(os.path.dirname(__file__), '..', 'Models')
+
+
+def test_routes_set_in_one_process_are_followed_by_the_others(tmp_path):
+    for version in (3, 4):
+        shutil.copy(os.path.join(MODELS, f'lightGBM-model_v{version}.pkl'), tmp_path)
+    worker_a, worker_b = ModelRegistry(str(tmp_path)), ModelRegistry(str(tmp_path))
+    assert worker_b.routes() == {4: 1.0}
+
+    worker_a.set_routes({'3': 1, '4': 3})
+    assert worker_b.routes() == {3: 0.25, 4: 0.75}
+
+    worker_a.set_routes(None)
+    assert worker_b.routes() == {4: 1.0}
@@ -0,0 +1,45 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks import random_sensor_window
+from benchmarks.bench_features import preprocess_pandas
+from benchmarks.bench_rotation import rotate_per_row
+from inference import NativePredictor, load_predictor
+from preprocess import FEATURES, extract_features_batch, preprocess, rotate_accelerometer_to_world_frame, \
+    sliding_windows, window_to_array
+
+
+@pytest.fixture(scope='module')
+def model():
+    with open(os.path.join(os.path.dirname(__file__), '..', 'Models', 'lightGBM-model_v4.pkl'), 'rb') as f:
+        return pickle.load(f)
+
+
+@pytest.mark.parametrize('n', [10, 100])
+def test_rotation_matches_per_row(n):
+    window = random_sensor_window(n)
+    expected = rotate_per_row(window)
+    actual = rotate_accelerometer_to_world_frame(window)
+    assert np.allclose(expected.to_numpy(dtype=float), actual.to_numpy())
+
+
+@pytest.mark.parametrize('n', [10, 100, 1000])
+def test_features_match_pandas(model, n):
+    window = random_sensor_window(n)
+    expected = preprocess_pandas(window)
+    actual = preprocess(window_to_array(window.to_dict('records')))
+    assert np.allclose(expected.to_numpy(), actual.to_numpy())
+    assert np.array_equal(model.predict_proba(expected), model.predict_proba(actual))
+
+
+def test_native_predictor_matches_pickle(model):
+    predictor = NativePredictor(model)
+    features = extract_features_batch(sliding_windows(window_to_array(random_sensor_window(1000)), 20, 5))
+    expected = model.predict_proba(pd.DataFrame(features, columns=FEATURES))
+    assert np.array_equal(predictor.predict_proba(features), expected)
+    assert predictor.matches_wrapper()
+    assert isinstance(load_predictor(model), NativePredictor)
@@ -0,0 +1,20 @@
+from poi_table import PoiTableCache
+from routing import RoutingGraph
+
+
+def test_build_overlapping_an_invalidation_is_not_cached():
+    cache = PoiTableCache()
+    graph = RoutingGraph.from_floor_graphs([])
+    loads = []
+
+    def stale_pois():
+        # a POI write lands and invalidates while the POIs are being read
+        loads.append('stale')
+        cache.invalidate('b1')
+        return []
+
+    stale = cache.get_or_build('b1', graph, stale_pois)
+    fresh = cache.get_or_build('b1', graph, lambda: loads.append('fresh') or [])
+    assert fresh is not stale
+    assert cache.get_or_build('b1', graph, lambda: loads.append('not read') or []) is fresh
+    assert loads == ['stale', 'fresh']
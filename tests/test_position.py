@@ -0,0 +1,31 @@
+import pytest
+
+
+@pytest.fixture
+def session_id(client, db):
+    db.collection('buildings').document('b1').collection('floors').document('f1').set({'floor': 1})
+    response = client.post('/paths/save/b1/f1', json={
+        'nodes': [{'id': 'a', 'coordinates': [18.7950, 98.9520]}, {'id': 'b', 'coordinates': [18.7951, 98.9520]}],
+        'adjacencyList': {'a': [{'targetNodeId': 'b'}], 'b': [{'targetNodeId': 'a'}]}})
+    assert response.status_code == 200, response.json
+    response = client.post('/position/sessions', json={'buildingId': 'b1', 'floorId': 'f1', 'particles': 50})
+    assert response.status_code == 201, response.json
+    return response.json['sessionId']
+
+
+@pytest.mark.parametrize('rssi', [
+    [{'beaconId': 'x'}],
+    [{'beaconId': 'x', 'rssi': 'loud'}],
+    {'x': None},
+    'x',
+])
+def test_malformed_scan_is_rejected(client, session_id, rssi):
+    response = client.post(f'/position/sessions/{session_id}/update', json={'rssi': rssi})
+    assert response.status_code == 400, response.json
+
+
+def test_update_returns_an_estimate(client, session_id):
+    response = client.post(f'/position/sessions/{session_id}/update',
+                           json={'rssi': [{'beaconId': 'x', 'rssi': -70}], 'movement': 'Halt', 'dt': 0.5})
+    assert response.status_code == 200, response.json
+    assert response.json['movement'] == 'Halt'
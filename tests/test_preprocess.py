@@ -0,0 +1,10 @@
+import os
+import subprocess
+import sys
+
+
+def test_importing_preprocess_loads_neither_scipy_nor_pandas():
+    code = "import sys, preprocess; print(sorted({'scipy', 'pandas'} & set(sys.modules)))"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert result.stdout.strip() == '[]'
@@ -0,0 +1,48 @@
+import itertools
+
+from scipy.sparse.csgraph import dijkstra
+
+from routing import RoutingGraph, RoutingGraphCache, build_portals, portal_cost
+
+
+def test_build_overlapping_an_invalidation_is_not_cached():
+    cache = RoutingGraphCache()
+    loads = []
+
+    def stale_load():
+        # a save lands and invalidates while the floor graphs are being read
+        loads.append('stale')
+        cache.invalidate('b1')
+        return []
+
+    stale = cache.get_or_build('b1', stale_load)
+    fresh = cache.get_or_build('b1', lambda: loads.append('fresh') or [])
+    assert fresh is not stale
+    assert cache.get_or_build('b1', lambda: loads.append('not read') or []) is fresh
+    assert loads == ['stale', 'fresh']
+
+
+def floor_graph(floor, nodes):
+    """
+    One floor with a corridor per node, so each node has an edge of weight = its length in metres.
+    """
+    graph = {"nodes": [], "adjacencyList": {}}
+    for node_id, lat, portal_group in nodes:
+        graph["nodes"] += [{"id": node_id, "coordinates": [lat, 98.95], "portalGroup": portal_group},
+                           {"id": f"{node_id}-door", "coordinates": [lat, 98.9501]}]
+        graph["adjacencyList"][node_id] = [{"targetNodeId": f"{node_id}-door", "weight": 11}]
+    return {"id": f"f{floor}", "floor": floor, "graph": graph}
+
+
+def test_hub_rides_cost_what_portal_cost_says_and_keep_the_heuristic():
+    floors = [floor_graph(1, [("s1a", 18.7950, "Stairs"), ("s1b", 18.7960, "Stairs")]),
+              floor_graph(3, [("s3", 18.7950, "Stairs")]),
+              floor_graph(None, [("sxa", 18.7950, "Stairs"), ("sxb", 18.7955, "Stairs")])]
+    graph = RoutingGraph.from_floor_graphs(floors)
+    assert graph.heuristic_scale > 0
+
+    portal = build_portals(floors)["Stairs"]
+    csr = graph.to_csr()
+    for a, b in itertools.permutations(portal["nodes"], 2):
+        ride = dijkstra(csr, indices=graph.index[a["id"]])[graph.index[b["id"]]]
+        assert ride == portal_cost(portal["cost"], a["floor"], b["floor"]), (a, b)
@@ -0,0 +1,58 @@
+import pytest
+
+import blueprints.paths as paths
+
+NODES = [{'id': 'a', 'coordinates': [18.7950, 98.9520]}, {'id': 'b', 'coordinates': [18.7951, 98.9520]}]
+
+
+@pytest.fixture
+def floor(client, db):
+    db.collection('buildings').document('b1').collection('floors').document('f1').set({'floor': 1})
+    response = client.post('/paths/save/b1/f1', json={'nodes': NODES, 'adjacencyList': {'a': ['b']}})
+    return response.json['version']
+
+
+def racing_save(monkeypatch, client, body):
+    """
+    Makes ``body`` land between the next save's read and write.
+    """
+    merge_path = paths.merge_path
+    pending = [body]
+
+    def merge_then_race(*args):
+        merged = merge_path(*args)
+        if pending:
+            response = client.post('/paths/save/b1/f1', json=pending.pop())
+            assert response.status_code == 200, response.json
+        return merged
+
+    monkeypatch.setattr(paths, 'merge_path', merge_then_race)
+
+
+def test_concurrent_save_with_the_same_version_gets_409(client, monkeypatch, floor):
+    racing_save(monkeypatch, client, {'nodes': NODES, 'adjacencyList': {'a': ['b'], 'b': ['a']}, 'version': floor})
+    response = client.post('/paths/save/b1/f1', json={'nodes': NODES[:1], 'adjacencyList': {}, 'version': floor})
+    assert response.status_code == 409, response.json
+    assert client.get('/paths/b1/f1').json['adjacencyList'] == {'a': ['b'], 'b': ['a']}
+
+
+def test_concurrent_save_without_a_version_merges_again(client, monkeypatch, floor):
+    racing_save(monkeypatch, client, {'nodes': NODES, 'adjacencyList': {'a': ['b'], 'b': ['a']}})
+    response = client.post('/paths/save/b1/f1', json={'nodes': NODES[:1], 'adjacencyList': {}})
+    assert response.status_code == 200, response.json
+    assert [node['id'] for node in client.get('/paths/b1/f1').json['nodes']] == ['a']
+
+
+def test_the_returned_version_is_accepted_by_the_next_save(client, db):
+    db.collection('buildings').document('b1').collection('floors').document('f1').set({'floor': 1})
+    adjacency = {'a': [{'targetNodeId': 'b', 'weight': 11}], 'b': [{'targetNodeId': 'a', 'weight': 11}]}
+    version = client.post('/paths/save/b1/f1', json={'nodes': NODES, 'adjacencyList': adjacency}).json['version']
+    assert client.get('/paths/b1/f1').json['version'] == version
+
+    adjacency['b'] = [{'targetNodeId': 'a', 'weight': 12}]
+    response = client.post('/paths/save/b1/f1', json={'nodes': NODES, 'adjacencyList': adjacency, 'version': version})
+    assert response.status_code == 200, response.json
+    assert response.json['changed'] == 1
+    response = client.post('/paths/save/b1/f1',
+                           json={'nodes': NODES, 'adjacencyList': adjacency, 'version': response.json['version']})
+    assert response.status_code == 200, response.json
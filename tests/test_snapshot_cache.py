@@ -0,0 +1,21 @@
+from snapshot_cache import SnapshotCache
+
+
+def test_load_overlapping_an_invalidation_is_not_cached():
+    cache = SnapshotCache()
+
+    def stale_loader():
+        # a write lands and invalidates while this read is still in flight
+        cache.invalidate('b1')
+        return {'name': 'before the write'}
+
+    assert cache.get_or_load('b1', 'building', stale_loader) == {'name': 'before the write'}
+    assert cache.get_or_load('b1', 'building', lambda: {'name': 'after the write'}) == {'name': 'after the write'}
+    assert cache.get_or_load('b1', 'building', lambda: {'name': 'not read'}) == {'name': 'after the write'}
+
+
+def test_invalidate_drops_cross_building_listings():
+    cache = SnapshotCache()
+    cache.get_or_load('*', 'buildings', lambda: ['b1'])
+    cache.invalidate('b2')
+    assert cache.get_or_load('*', 'buildings', lambda: ['b1', 'b2']) == ['b1', 'b2']
@@ -0,0 +1,14 @@
+from spatial_index import SpatialIndexCache
+
+
+def test_build_overlapping_an_invalidation_is_not_cached():
+    cache = SpatialIndexCache()
+
+    def stale_build():
+        # a write lands and invalidates while the floor's snapshots are being read
+        cache.invalidate('b1')
+        return 'before the write'
+
+    assert cache.get_or_build('b1', 'f1', 'pois', stale_build) == 'before the write'
+    assert cache.get_or_build('b1', 'f1', 'pois', lambda: 'after the write') == 'after the write'
+    assert cache.get_or_build('b1', 'f1', 'pois', lambda: 'not built') == 'after the write'
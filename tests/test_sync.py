@@ -0,0 +1,23 @@
+import app
+
+
+def add_poi(client, poi_id):
+    response = client.post('/POIs/b1/f1/bulk', json={'create': [
+        {'id': poi_id, 'name': poi_id, 'category': 'shop', 'location': [18.79, 98.95]}]})
+    assert response.status_code == 200, response.json
+
+
+def test_delta_sees_writes_another_worker_made(client, db, monkeypatch):
+    db.collection('buildings').document('b1').set({'name': 'b1'})
+    assert client.post('/buildings/b1/floors', json={'id': 'f1', 'floor': 1}).status_code in (200, 201)
+    add_poi(client, 'p1')
+    full = client.get('/sync/b1').json
+    assert [poi['id'] for poi in full['pois']['updated']] == ['p1']
+
+    # another worker writes: the sync log moves on, this worker's cache is not invalidated
+    monkeypatch.setattr(app.cache, 'invalidate', lambda building_id: None)
+    add_poi(client, 'p2')
+
+    delta = client.get(f"/sync/b1?since={full['version']}").json
+    assert [poi['id'] for poi in delta['pois']['updated']] == ['p2']
+    assert delta['pois']['deleted'] == []
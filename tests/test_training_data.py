@@ -0,0 +1,39 @@
+import numpy as np
+
+from benchmarks import random_sensor_window
+from training_data import build, load_columns
+
+
+def test_stride_longer_than_the_window_with_many_sessions(tmp_path):
+    # 10 sessions of 12 rows: one window each, where the whole file would allow (120 - 10) // 15 + 1 = 8
+    frame = random_sensor_window(120)
+    frame['session'] = np.repeat(np.arange(10), 12)
+    path = tmp_path / 'recording.csv'
+    frame.to_csv(path, index=False)
+
+    build([str(path)], str(tmp_path / 'out'), 10, 15, session_column='session', workers=0)
+    columns, manifest = load_columns(str(tmp_path / 'out'))
+    assert manifest['rows'] == 10
+    assert columns['session'].tolist() == list(range(10))
+
+
+def test_chunked_reads_match_one_chunk_with_stride_longer_than_the_window(tmp_path):
+    frame = random_sensor_window(100)
+    frame['session'] = np.repeat([0, 1], [61, 39])
+    frame.iloc[80, 0] = np.nan
+    path = tmp_path / 'recording.csv'
+    frame.to_csv(path, index=False)
+
+    def windows(chunk_rows):
+        out = str(tmp_path / f'out{chunk_rows}')
+        build([str(path)], out, 4, 7, session_column='session', workers=0, chunk_rows=chunk_rows, segment_windows=2)
+        return load_columns(out)[0]
+
+    whole = windows(100)
+    # session 0: rows 0-60, session 1: rows 61-79 and 81-99 around the incomplete row
+    assert whole['first_row'].tolist() == list(range(0, 57, 7)) + [61, 68, 75] + [81, 88, 95]
+    for chunk_rows in (5, 12):
+        chunked = windows(chunk_rows)
+        assert chunked.keys() == whole.keys()
+        for name in whole:
+            np.testing.assert_array_equal(chunked[name], whole[name])
@@ -0,0 +1,363 @@
+"""
+Turns recorded sensor sessions into a feature matrix for training the next lightGBM-model_vN.
+
+    python training_data.py sessions/*.csv -o features/ --window 20 --stride 5 --label-column action
+
+The recordings (CSV, or Parquet with pyarrow installed) are read in chunks, never whole. Every
+session is cut into windows of --window samples every --stride samples. A window never spans two
+files, two sessions or a row with missing values. The features are computed with
+preprocess.extract_features_batch, the function /model serves with, in a pool of processes.
+
+The output directory holds one raw little-endian column per feature (plus label, session and
+first row) and a manifest.json; load_columns() maps them back without reading them into memory.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from preprocess import FEATURES, SENSOR_CHANNELS, extract_features_batch, sliding_windows
+
+try:
+    import pyarrow.parquet as pq  # optional: only needed for Parquet recordings
+except ImportError:
+    pq = None
+
+# the classes /model reports (ACTION_LABEL in blueprints/model.py)
+LABEL_CODES = {'Halt': 0, 'Forward': 1, 'Turn': 2}
+NO_LABEL = -1
+
+CHUNK_ROWS = 200_000  # rows read from a recording at a time
+SEGMENT_WINDOWS = 4096  # windows per task sent to a worker
+MANIFEST = 'manifest.json'
+
+# column name -> dtype of the non-feature columns written next to the features
+EXTRA_COLUMNS = {'label': '<i2', 'session': '<i4', 'first_row': '<i8'}
+
+
+def is_parquet(path):
+    return path.lower().endswith(('.parquet', '.pq'))
+
+
+def count_rows(path):
+    if is_parquet(path):
+        return pq.ParquetFile(path).metadata.num_rows
+    lines, last = 0, b'\n'
+    with open(path, 'rb') as f:
+        while block := f.read(1 << 24):
+            lines += block.count(b'\n')
+            last = block[-1:]
+    if last != b'\n':
+        lines += 1  # unterminated last line
+    return max(lines - 1, 0)  # minus the header; an upper bound when quoted fields hold newlines
+
+
+def read_chunks(path, columns, chunk_rows=CHUNK_ROWS):
+    if is_parquet(path):
+        if pq is None:
+            raise RuntimeError(f"Reading {path} needs pyarrow (pip install pyarrow).")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows)
+
+
+def label_codes(values):
+    """
+    Integer class codes of a label column holding class names ('Halt', ...) or codes.
+    Missing labels come back as NaN.
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        unknown = set(values.dropna().unique()) - set(LABEL_CODES.values())
+        if unknown:
+            raise ValueError(f"Unknown label codes {sorted(unknown)[:5]}; expected one of {list(LABEL_CODES.values())}.")
+        return values.to_numpy(dtype=np.float64)
+    unknown = set(values.dropna().unique()) - set(LABEL_CODES)
+    if unknown:
+        raise ValueError(f"Unknown labels {sorted(unknown)[:5]}; expected one of {list(LABEL_CODES)}.")
+    return values.map(LABEL_CODES).to_numpy(dtype=np.float64)
+
+
+class Segmenter:
+    """
+    Collects the rows of one recording into runs of consecutive, complete samples of one session
+    and cuts them into segments of at most ``segment_windows`` windows. Consecutive segments
+    overlap by the samples their windows share, so segments featurize to exactly the windows of
+    the whole run.
+    """
+
+    def __init__(self, window_size, stride, segment_windows=SEGMENT_WINDOWS):
+        self.window_size = window_size
+        self.stride = stride
+        self.segment_rows = (segment_windows - 1) * stride + window_size
+        self.advance = segment_windows * stride
+        self._samples, self._labels = [], []
+        self._length = 0
+        # rows between segments still to drop when stride > window_size and a segment ended early
+        self._skip = 0
+        self._session = None
+        self._first_row = 0
+
+    def push(self, samples, labels, sessions, first_row):
+        """
+        Adds a chunk of rows and returns the full segments: (samples, labels, session, first_row).
+        """
+        valid = ~(np.isnan(samples).any(axis=1) | np.isnan(labels))
+        # a run ends where the session changes or a row is incomplete
+        cuts = np.flatnonzero((sessions[1:] != sessions[:-1]) | (valid[1:] != valid[:-1])) + 1
+        segments = []
+        for start, end in zip(np.r_[0, cuts], np.r_[cuts, len(samples)]):
+            if not valid[start]:
+                segments += self.flush()
+                continue
+            if (self._length or self._skip) and (sessions[start] != self._session or
+                                                 self._first_row + self._length - self._skip != first_row + start):
+                segments += self.flush()
+            if self._skip:
+                dropped = min(self._skip, end - start)
+                start += dropped
+                self._skip -= dropped
+                if start == end:
+                    continue
+            if not self._length:
+                self._session, self._first_row = sessions[start], first_row + start
+            self._samples.append(samples[start:end])
+            self._labels.append(labels[start:end])
+            self._length += end - start
+            segments += self._full_segments()
+        return segments
+
+    def _full_segments(self):
+        segments = []
+        if self._length < self.segment_rows:
+            return segments
+        samples, labels = np.concatenate(self._samples), np.concatenate(self._labels)
+        offset = 0
+        while self._length - offset >= self.segment_rows:
+            segments.append((samples[offset:offset + self.segment_rows], labels[offset:offset + self.segment_rows],
+                             self._session, self._first_row + offset))
+            offset += self.advance
+        self._samples, self._labels = [samples[offset:]], [labels[offset:]]
+        self._skip = max(offset - self._length, 0)
+        self._length = max(self._length - offset, 0)
+        self._first_row += offset
+        return segments
+
+    def flush(self):
+        """
+        Ends the current run: its remaining windows as a last segment, if it has any.
+        """
+        segments = []
+        if self._length >= self.window_size:
+            segments.append((np.concatenate(self._samples), np.concatenate(self._labels),
+                             self._session, self._first_row))
+        self._samples, self._labels, self._length, self._skip = [], [], 0, 0
+        return segments
+
+
+def window_labels(labels, window_size, stride):
+    """
+    Each window's majority label (ties go to the lower code), NO_LABEL for unlabelled data.
+    """
+    n_windows = (len(labels) - window_size) // stride + 1
+    if np.all(labels == NO_LABEL):
+        return np.full(n_windows, NO_LABEL, dtype=np.int16)
+    starts = np.arange(n_windows) * stride
+    counts = []
+    for code in range(len(LABEL_CODES)):
+        running = np.concatenate(([0], np.cumsum(labels == code)))
+        counts.append(running[starts + window_size] - running[starts])
+    return np.argmax(np.stack(counts), axis=0).astype(np.int16)
+
+
+def featurize_segment(samples, labels, window_size, stride, data_interval):
+    """
+    Worker task: the features and labels of every window of one segment.
+    """
+    windows = sliding_windows(samples, window_size, stride)
+    return extract_features_batch(windows, data_interval), window_labels(labels, window_size, stride)
+
+
+class ColumnWriter:
+    """
+    One memory-mapped file per column, sized for ``capacity`` rows up front and truncated to the
+    rows written on close().
+    """
+
+    def __init__(self, out_dir, capacity):
+        self.out_dir = out_dir
+        self.rows = 0
+        self.capacity = max(capacity, 1)
+        self.dtypes = {name: '<f8' for name in FEATURES}
+        self.dtypes.update(EXTRA_COLUMNS)
+        os.makedirs(out_dir, exist_ok=True)
+        self.columns = {name: np.memmap(self.path(name), dtype=dtype, mode='w+', shape=(self.capacity,))
+                        for name, dtype in self.dtypes.items()}
+
+    def path(self, name):
+        return os.path.join(self.out_dir, f"{name}.bin")
+
+    def append(self, features, labels, session, first_row, stride):
+        n = len(features)
+        if self.rows + n > self.capacity:
+            raise RuntimeError("More windows than the row count allowed for; was a recording modified while read?")
+        rows = slice(self.rows, self.rows + n)
+        for i, name in enumerate(FEATURES):
+            self.columns[name][rows] = features[:, i]
+        self.columns['label'][rows] = labels
+        self.columns['session'][rows] = session
+        self.columns['first_row'][rows] = first_row + np.arange(n) * stride
+        self.rows += n
+
+    def close(self, manifest):
+        for column in self.columns.values():
+            column.flush()
+        self.columns = {}  # unmapped before the files are truncated
+        for name, dtype in self.dtypes.items():
+            os.truncate(self.path(name), self.rows * np.dtype(dtype).itemsize)
+        manifest = dict(manifest, rows=self.rows, features=FEATURES,
+                        columns={name: {"file": f"{name}.bin", "dtype": dtype} for name, dtype in self.dtypes.items()})
+        with open(os.path.join(self.out_dir, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+
+def load_columns(out_dir):
+    """
+    The columns written by build(), memory-mapped read-only.
+
+    Returns:
+        tuple: ({column name: np.memmap}, manifest dict)
+    """
+    with open(os.path.join(out_dir, MANIFEST)) as f:
+        manifest = json.load(f)
+    columns = {}
+    for name, column in manifest['columns'].items():
+        path = os.path.join(out_dir, column['file'])
+        columns[name] = np.memmap(path, dtype=column['dtype'], mode='r', shape=(manifest['rows'],)) \
+            if manifest['rows'] else np.empty(0, dtype=column['dtype'])
+    return columns, manifest
+
+
+def max_windows(rows, window_size, stride):
+    """
+    The most windows ``rows`` samples can give, however sessions and incomplete rows split them.
+    """
+    if rows < window_size:
+        return 0
+    if stride > window_size:
+        # windows do not overlap, so each one has rows of its own, and a split can add a window
+        # where one long run would have skipped those rows
+        return rows // window_size
+    return (rows - window_size) // stride + 1
+
+
+def build(paths, out_dir, window_size, stride, data_interval=500, label_column=None, session_column=None,
+          workers=None, chunk_rows=CHUNK_ROWS, segment_windows=SEGMENT_WINDOWS, progress=None):
+    """
+    Featurizes every window of the recordings in ``paths`` into ``out_dir``.
+
+    Args:
+        label_column (str): column with each sample's class, by name or code; None for unlabelled data.
+        session_column (str): column identifying the session of each row; None when every file
+            is one session.
+        workers (int): processes computing features; 0 computes them in this process.
+        progress (callable): called with (rows read, windows written, seconds) after each chunk.
+
+    Returns:
+        dict: the manifest, with the run's "seconds" and "windowsPerSecond".
+    """
+    if window_size < 2 or stride <= 0:
+        raise ValueError("window_size must be at least 2 and stride positive.")
+    columns = SENSOR_CHANNELS + [c for c in (label_column, session_column) if c]
+    capacity = sum(max_windows(count_rows(path), window_size, stride) for path in paths)
+    writer = ColumnWriter(out_dir, capacity)
+    pool = ProcessPoolExecutor(max_workers=workers) if workers != 0 else None
+    max_pending = 2 * (workers or os.cpu_count())
+    pending = deque()
+    sessions = {}  # (file index, session value) -> session number
+    rows_read = 0
+    start = time.perf_counter()
+
+    def submit(segments, file_index):
+        for samples, labels, session, first_row in segments:
+            args = (samples, labels, window_size, stride, data_interval)
+            result = pool.submit(featurize_segment, *args) if pool else featurize_segment(*args)
+            pending.append((result, sessions.setdefault((file_index, session), len(sessions)), first_row))
+        # results are written in submission order; keep a bounded number in flight
+        while pending and (len(pending) > max_pending or not pool):
+            collect()
+
+    def collect():
+        result, session, first_row = pending.popleft()
+        features, labels = result.result() if pool else result
+        writer.append(features, labels, session, first_row, stride)
+
+    try:
+        for file_index, path in enumerate(paths):
+            segmenter = Segmenter(window_size, stride, segment_windows)
+            first_row = 0
+            for chunk in read_chunks(path, columns, chunk_rows):
+                samples = np.ascontiguousarray(chunk[SENSOR_CHANNELS].to_numpy(dtype=np.float64))
+                labels = label_codes(chunk[label_column]) if label_column else np.full(len(chunk), float(NO_LABEL))
+                session_values = chunk[session_column].to_numpy() if session_column else np.zeros(len(chunk))
+                submit(segmenter.push(samples, labels, session_values, first_row), file_index)
+                first_row += len(chunk)
+                rows_read += len(chunk)
+                if progress:
+                    progress(rows_read, writer.rows, time.perf_counter() - start)
+            submit(segmenter.flush(), file_index)
+        while pending:
+            collect()
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+    seconds = time.perf_counter() - start
+    return writer.close({
+        "sources": [os.path.abspath(path) for path in paths],
+        "windowSize": window_size,
+        "stride": stride,
+        "dataInterval": data_interval,
+        "labelColumn": label_column,
+        "labels": LABEL_CODES if label_column else None,
+        "sessions": [{"file": paths[f], "session": str(s) if session_column else None} for (f, s), _ in sorted(sessions.items(), key=lambda x: x[1])],
+        "rowsRead": rows_read,
+        "seconds": round(seconds, 3),
+        "windowsPerSecond": round(writer.rows / seconds, 1) if seconds else None,
+    })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a training feature matrix from recorded sensor sessions.")
+    parser.add_argument('paths', nargs='+', help="CSV or Parquet recordings with the columns " + ", ".join(SENSOR_CHANNELS))
+    parser.add_argument('-o', '--out', required=True, help="output directory")
+    parser.add_argument('--window', type=int, required=True, help="samples per window")
+    parser.add_argument('--stride', type=int, help="samples between window starts (default: --window)")
+    parser.add_argument('--interval', type=float, default=500, help="sampling interval in ms (default: 500)")
+    parser.add_argument('--label-column', help="column with each sample's class (Halt/Forward/Turn or 0/1/2)")
+    parser.add_argument('--session-column', help="column identifying sessions within a file")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="feature processes, 0 for none (default: one per core)")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help="rows read at a time")
+    args = parser.parse_args(argv)
+
+    def progress(rows, windows, seconds):
+        print(f"\r{rows:,} rows, {windows:,} windows, {windows / max(seconds, 1e-9):,.0f} windows/s",
+              end='', file=sys.stderr, flush=True)
+
+    manifest = build(args.paths, args.out, args.window, args.stride or args.window, args.interval,
+                     args.label_column, args.session_column, args.workers, args.chunk_rows, progress=progress)
+    print(file=sys.stderr)
+    print(f"{manifest['rows']:,} windows from {manifest['rowsRead']:,} rows in {manifest['seconds']:.1f} s "
+          f"({manifest['windowsPerSecond']:,.0f} windows/s) -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+"""
+Entry point for production WSGI servers:
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+SERVER_POOL picks the blueprints this server runs ('all', 'api' or 'model'; see gunicorn.conf.py).
+"""
+import os
+
+from app import preload
+
+application = preload(os.environ.get('SERVER_POOL', 'all'))